@@ -1,6 +1,48 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import Department, User, Patient, ConsultRequest, ConsultComment
+from django.core.paginator import Paginator
+from django.db import IntegrityError, connections, transaction
+from django.utils.functional import cached_property
+from .cache import bump_generation_on_commit
+from .models import Department, User, Patient, ConsultRequest, ConsultComment, Notification, Task
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reads the planner's row estimate for unfiltered PostgreSQL
+    tables instead of running COUNT(*), which scans the whole table. Small
+    tables, filtered lists and other databases are counted exactly.
+    """
+    # Below this many rows an exact count is cheap enough.
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self._estimate(queryset)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def _estimate(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)', [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return row[0] if row and row[0] > 0 else None
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """ModelAdmin defaults for tables with millions of rows"""
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) behind "x results (y total)".
+    show_full_result_count = False
 
 
 @admin.register(Department)
@@ -13,32 +55,95 @@ class DepartmentAdmin(admin.ModelAdmin):
 class UserAdmin(BaseUserAdmin):
     list_display = ['username', 'full_name', 'email', 'department', 'role', 'is_staff']
     list_filter = ['role', 'department', 'is_staff', 'is_superuser']
+    list_select_related = ['department']
     fieldsets = BaseUserAdmin.fieldsets + (
         ('Additional Info', {'fields': ('full_name', 'department', 'role')}),
     )
     add_fieldsets = BaseUserAdmin.add_fieldsets + (
         ('Additional Info', {'fields': ('full_name', 'department', 'role')}),
     )
+    
+    def get_queryset(self, request):
+        # User.__str__ includes the department, e.g. in autocomplete results.
+        return super().get_queryset(request).select_related('department')
 
 
 @admin.register(Patient)
-class PatientAdmin(admin.ModelAdmin):
+class PatientAdmin(ScalableAdmin):
     list_display = ['hospital_id', 'name', 'age', 'gender', 'created_at']
-    search_fields = ['hospital_id', 'name']
+    search_fields = ['=hospital_id', 'name']
     list_filter = ['gender']
+    date_hierarchy = 'created_at'
 
 
 @admin.register(ConsultRequest)
-class ConsultRequestAdmin(admin.ModelAdmin):
+class ConsultRequestAdmin(ScalableAdmin):
     list_display = ['id', 'patient', 'from_department', 'to_department', 'priority', 'status', 'created_at']
     list_filter = ['status', 'priority', 'from_department', 'to_department']
-    search_fields = ['patient__name', 'patient__hospital_id']
-    readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ['patient', 'from_department', 'to_department']
+    search_fields = ['=patient__hospital_id', 'patient__name']
+    autocomplete_fields = ['patient', 'from_department', 'to_department', 'requested_by']
+    readonly_fields = ['created_at', 'updated_at', 'escalated_at']
+    date_hierarchy = 'created_at'
+    actions = ['mark_in_progress', 'mark_completed', 'mark_cancelled']
+    
+    def _set_status(self, request, queryset, status):
+        # One UPDATE for the whole selection instead of a save() per consult.
+        departments = set()
+        for pair in queryset.values_list('from_department_id', 'to_department_id').distinct():
+            departments.update(pair)
+        try:
+            with transaction.atomic():
+                updated = queryset.set_status(status)
+        except IntegrityError:
+            self.message_user(
+                request,
+                'Nothing was changed: a patient would have two open consults with the same department.',
+                messages.ERROR
+            )
+            return
+        bump_generation_on_commit(*departments)
+        label = dict(ConsultRequest.STATUS_CHOICES)[status]
+        self.message_user(request, f'{updated} consult(s) marked as {label}.', messages.SUCCESS)
+    
+    @admin.action(description='Mark selected consults as In Progress')
+    def mark_in_progress(self, request, queryset):
+        self._set_status(request, queryset, 'in_progress')
+    
+    @admin.action(description='Mark selected consults as Completed')
+    def mark_completed(self, request, queryset):
+        self._set_status(request, queryset, 'completed')
+    
+    @admin.action(description='Mark selected consults as Cancelled')
+    def mark_cancelled(self, request, queryset):
+        self._set_status(request, queryset, 'cancelled')
 
 
 @admin.register(ConsultComment)
-class ConsultCommentAdmin(admin.ModelAdmin):
+class ConsultCommentAdmin(ScalableAdmin):
     list_display = ['id', 'consult', 'author', 'created_at']
     list_filter = ['created_at']
+    list_select_related = ['consult__patient', 'consult__from_department', 'consult__to_department', 'author__department']
     search_fields = ['message', 'author__username']
+    raw_id_fields = ['consult']
+    autocomplete_fields = ['author']
     readonly_fields = ['created_at']
+    date_hierarchy = 'created_at'
+
+
+@admin.register(Notification)
+class NotificationAdmin(ScalableAdmin):
+    list_display = ['id', 'recipient', 'consult', 'event', 'urgent', 'created_at', 'sent_at']
+    list_filter = ['event', 'urgent']
+    list_select_related = ['recipient__department', 'consult__patient', 'consult__from_department', 'consult__to_department']
+    search_fields = ['recipient__username', 'message']
+    raw_id_fields = ['recipient', 'consult']
+    readonly_fields = ['created_at', 'sent_at']
+
+
+@admin.register(Task)
+class TaskAdmin(ScalableAdmin):
+    list_display = ['id', 'name', 'queue', 'priority', 'status', 'attempts', 'run_at', 'finished_at']
+    list_filter = ['status', 'queue', 'name']
+    search_fields = ['name', 'last_error']
+    readonly_fields = ['attempts', 'locked_by', 'locked_at', 'last_error', 'created_at', 'finished_at']
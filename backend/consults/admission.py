@@ -0,0 +1,250 @@
+"""
+Priority-aware admission control for the API.
+
+Under overload every request costs the same worker time, so dashboards
+reloading their lists would otherwise crowd out a STAT consult being created.
+Each /api/ request is put in a class:
+
+- `critical`: writes, sign-in and token refresh, and the STAT-first worklist.
+  Never shed here.
+- `read`: single consults, patients and other detail reads, and searches.
+- `poll`: other list reads, which dashboards reload over and over.
+
+Lower classes are admitted only while fewer requests than their
+ADMISSION_CONCURRENCY limit are in flight in this process. Capacity above
+that limit is reserved for the classes above them. Authenticated `read` and
+`poll` requests also take a token from the user's and the department's token
+bucket (ADMISSION_USER_RATE/BURST and ADMISSION_DEPARTMENT_RATE/BURST).
+`poll` requests are refused once a bucket is half empty, keeping the rest
+for reads. Refused requests get 429 with Retry-After.
+
+Buckets live in this process by default. With ADMISSION_SHARED they are kept
+in the shared cache instead, as fixed windows of BURST requests every
+BURST / RATE seconds, so every worker draws from the same allowance.
+Concurrency is always per process.
+"""
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import User
+
+
+CRITICAL = 'critical'
+READ = 'read'
+POLL = 'poll'
+
+# Share of a bucket `poll` requests may not use.
+POLL_RESERVE = 0.5
+
+CRITICAL_PATHS = ('/api/auth/', '/api/consults/worklist/')
+EXEMPT_PATHS = ('/api/health/',)
+
+# Seconds a user's department is remembered for bucket lookups.
+DEPARTMENT_TTL = 60
+
+# Users whose department (and buckets) are remembered per process; past
+# this, expired departments and refilled buckets are dropped.
+MAX_TRACKED = 10000
+
+
+def classify(request):
+    """Return the admission class of a request"""
+    if request.method not in SAFE_METHODS or request.path.startswith(CRITICAL_PATHS):
+        return CRITICAL
+    if request.GET.get(api_settings.SEARCH_PARAM):
+        return READ
+    # /api/<collection>/ is a list; anything deeper is an object or one of its actions.
+    if len(request.path.strip('/').split('/')) > 2:
+        return READ
+    return POLL
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class LocalLimiter:
+    """Token buckets held in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def acquire(self, scopes, reserve):
+        """
+        Take a token from every (key, rate, burst) bucket, leaving `reserve`
+        of each untouched. Returns 0, or the seconds to wait if refused.
+        """
+        now = time.monotonic()
+        with self._lock:
+            buckets = []
+            for key, rate, burst in scopes:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    if len(self._buckets) >= MAX_TRACKED:
+                        self._evict(now)
+                    bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+                bucket.refill(now)
+                needed = reserve * burst + 1
+                if bucket.tokens < needed:
+                    return math.ceil((needed - bucket.tokens) / rate)
+                buckets.append(bucket)
+            for bucket in buckets:
+                bucket.tokens -= 1
+        return 0
+
+    def _evict(self, now):
+        # A bucket that has refilled is the same as a new one.
+        for key, bucket in list(self._buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self._buckets[key]
+        if len(self._buckets) >= MAX_TRACKED:
+            del self._buckets[next(iter(self._buckets))]
+
+
+class SharedLimiter:
+    """Fixed-window approximation of the buckets, counted in the shared cache"""
+
+    def acquire(self, scopes, reserve):
+        now = time.time()
+        for key, rate, burst in scopes:
+            window = burst / rate
+            slot = int(now // window)
+            cache_key = f'consults:admission:{key}:{slot}'
+            cache.add(cache_key, 0, math.ceil(window) + 1)
+            try:
+                count = cache.incr(cache_key)
+            except ValueError:
+                # Expired between add and incr.
+                cache.set(cache_key, 1, math.ceil(window) + 1)
+                count = 1
+            if count > burst * (1 - reserve):
+                return max(math.ceil((slot + 1) * window - now), 1)
+        return 0
+
+
+local_limiter = LocalLimiter()
+shared_limiter = SharedLimiter()
+
+
+def get_limiter():
+    return shared_limiter if settings.ADMISSION_SHARED else local_limiter
+
+
+_lock = threading.Lock()
+_in_flight = 0
+_counters = {'admitted': Counter(), 'shed': Counter()}
+_departments = {}
+
+
+def admission_stats():
+    """Return requests in flight, admitted and shed (per class and reason) for this worker process"""
+    with _lock:
+        return {
+            'in_flight': _in_flight,
+            'admitted': dict(_counters['admitted']),
+            'shed': dict(_counters['shed']),
+        }
+
+
+def _user_id(request):
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None
+    try:
+        return AccessToken(header[len('Bearer '):])[jwt_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        # Left to the view to refuse.
+        return None
+
+
+def _department_id(user_id):
+    now = time.monotonic()
+    cached = _departments.get(user_id)
+    if cached is None or cached[1] < now:
+        department_id = User.objects.filter(pk=user_id).values_list('department_id', flat=True).first()
+        with _lock:
+            if len(_departments) >= MAX_TRACKED:
+                for key, (_, expires) in list(_departments.items()):
+                    if expires < now:
+                        del _departments[key]
+                if len(_departments) >= MAX_TRACKED:
+                    # All still fresh: forget the oldest.
+                    del _departments[next(iter(_departments))]
+            cached = _departments[user_id] = (department_id, now + DEPARTMENT_TTL)
+    return cached[0]
+
+
+def _scopes(request):
+    user_id = _user_id(request)
+    if user_id is None:
+        return []
+    scopes = [(f'user:{user_id}', settings.ADMISSION_USER_RATE, settings.ADMISSION_USER_BURST)]
+    department_id = _department_id(user_id)
+    if department_id is not None:
+        scopes.append(
+            (f'department:{department_id}', settings.ADMISSION_DEPARTMENT_RATE, settings.ADMISSION_DEPARTMENT_BURST)
+        )
+    return scopes
+
+
+def _shed(request_class, reason, retry_after):
+    with _lock:
+        _counters['shed'][f'{request_class}:{reason}'] += 1
+    response = JsonResponse({'error': 'The server is busy; try again shortly'}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+class AdmissionControlMiddleware:
+    """Shed low-priority API requests first when a worker or a user's allowance is exhausted"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        global _in_flight
+        if (not settings.ADMISSION_CONTROL or not request.path.startswith('/api/')
+                or request.path.startswith(EXEMPT_PATHS)):
+            return self.get_response(request)
+
+        request_class = classify(request)
+        limit = settings.ADMISSION_CONCURRENCY.get(request_class) if request_class != CRITICAL else None
+        with _lock:
+            busy = bool(limit) and _in_flight >= limit
+            if not busy:
+                _in_flight += 1
+        if busy:
+            return _shed(request_class, 'concurrency', 1)
+
+        try:
+            if request_class != CRITICAL:
+                retry_after = get_limiter().acquire(_scopes(request), POLL_RESERVE if request_class == POLL else 0)
+                if retry_after:
+                    return _shed(request_class, 'rate', retry_after)
+            with _lock:
+                _counters['admitted'][request_class] += 1
+            return self.get_response(request)
+        finally:
+            with _lock:
+                _in_flight -= 1
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ConsultsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'consults'
+
+    def ready(self):
+        from . import dbpool, cache, bus, tasks  # noqa: F401  (registers signal receivers and tasks)
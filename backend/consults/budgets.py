@@ -0,0 +1,137 @@
+"""
+Per-action latency budgets for the API, enforced by the database.
+
+Each viewset action has a budget in milliseconds. On PostgreSQL it is set
+as `statement_timeout` on the connection the request uses (the read replica
+or the primary) once the request has been authenticated, and reset when the
+request ends, so pooled and persistent connections never carry it over; if
+the reset fails, the connection is closed instead. Requests don't run in one
+transaction (ATOMIC_REQUESTS is off), so `SET LOCAL` couldn't cover them.
+Any statement that runs past the budget, inside a transaction or not, is
+cancelled by the server. A pathological search then fails fast with 504
+instead of holding a connection that the STAT inbox is waiting for. If no
+connection can be had from the pool in time, the request fails with 503 and
+Retry-After.
+
+Budgets come from the viewset's `latency_budgets` and may be overridden per
+`<basename>.<action>` in the LATENCY_BUDGETS setting; 0 means no limit. List
+requests with a search term use the `search` budget. Timeouts are counted per
+action for this worker process (see `timeout_stats()`, reported by
+/api/health/). Other databases have no statement timeout, so budgets are
+ignored there.
+"""
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, connections
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .routers import current_read_alias
+
+
+# SQLSTATE of a statement cancelled by statement_timeout.
+QUERY_CANCELED = '57014'
+
+_lock = threading.Lock()
+_counters = {
+    'statement_timeouts': Counter(),
+    'pool_timeouts': Counter(),
+}
+
+
+def _count(kind, name):
+    with _lock:
+        _counters[kind][name] += 1
+
+
+def timeout_stats():
+    """Return the requests failed by their budget, per action, for this worker process"""
+    with _lock:
+        return {kind: dict(counter) for kind, counter in _counters.items()}
+
+
+def classify(exc):
+    """Return 'statement' or 'pool' if a database error is a timeout, else None"""
+    cause = exc.__cause__
+    if getattr(cause, 'sqlstate', None) == QUERY_CANCELED or getattr(cause, 'pgcode', None) == QUERY_CANCELED:
+        return 'statement'
+    if type(cause).__name__ == 'PoolTimeout':
+        return 'pool'
+    return None
+
+
+def supports_statement_timeout(alias):
+    return connections[alias].vendor == 'postgresql'
+
+
+def set_statement_timeout(alias, milliseconds):
+    with connections[alias].cursor() as cursor:
+        # set_config() rather than SET, which can't take a bound parameter.
+        cursor.execute("SELECT set_config('statement_timeout', %s, false)", [str(milliseconds)])
+
+
+def reset_statement_timeout(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute('RESET statement_timeout')
+
+
+class LatencyBudgetMixin:
+    """Viewset mixin bounding each action's database statements by its latency budget"""
+    latency_budgets = {}
+
+    def get_budget_action(self):
+        # Searches can be far slower than the plain list, so they have their own budget.
+        if self.action == 'list' and self.request.query_params.get(api_settings.SEARCH_PARAM):
+            return 'search'
+        return self.action
+
+    def get_latency_budget(self):
+        action = self.get_budget_action()
+        name = f'{self.basename}.{action}'
+        if name in settings.LATENCY_BUDGETS:
+            return settings.LATENCY_BUDGETS[name]
+        return self.latency_budgets.get(action, settings.LATENCY_BUDGET_DEFAULT_MS)
+
+    def dispatch(self, request, *args, **kwargs):
+        self._budget_alias = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._budget_alias is not None:
+                try:
+                    reset_statement_timeout(self._budget_alias)
+                except DatabaseError:
+                    # A persistent connection that kept the budget would
+                    # impose it on later requests; drop it instead.
+                    connections[self._budget_alias].close()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        budget = self.get_latency_budget()
+        alias = current_read_alias() or 'default'
+        if budget and supports_statement_timeout(alias):
+            set_statement_timeout(alias, budget)
+            self._budget_alias = alias
+
+    def handle_exception(self, exc):
+        kind = classify(exc) if isinstance(exc, OperationalError) else None
+        if kind is None:
+            return super().handle_exception(exc)
+
+        name = f'{self.basename}.{self.get_budget_action()}'
+        if kind == 'statement':
+            _count('statement_timeouts', name)
+            return Response(
+                {'error': f'The request took longer than its {self.get_latency_budget()} ms budget'},
+                status=status.HTTP_504_GATEWAY_TIMEOUT
+            )
+        _count('pool_timeouts', name)
+        response = Response(
+            {'error': 'The database is busy; try again shortly'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        response['Retry-After'] = '1'
+        return response
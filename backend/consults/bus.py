@@ -0,0 +1,230 @@
+"""
+Cache invalidation bus shared by every worker.
+
+Saving or deleting a Department, User, Patient, ConsultRequest or
+ConsultComment publishes a compact message naming the model, the primary key
+and the departments affected. On PostgreSQL messages travel over
+LISTEN/NOTIFY: NOTIFY is transactional, so listeners only hear about committed
+changes, and a background thread in each worker applies them. On SQLite (and
+in tests) messages are delivered in-process once the transaction commits.
+
+Per-process caches subscribe with `subscribe(handler)`, or use `LocalCache`,
+which drops entries depending on the changed model.
+"""
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections, transaction
+from django.db.models.signals import post_save, post_delete
+from rest_framework.response import Response
+
+from .models import Department, User, Patient, ConsultRequest, ConsultComment
+from .routers import current_read_alias
+
+
+logger = logging.getLogger(__name__)
+
+_handlers = []
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+# Seconds to wait before reconnecting after the listening connection fails.
+RECONNECT_SECONDS = 1.0
+
+
+def subscribe(handler):
+    """Call handler(message) for every invalidation message, including this process's own"""
+    _handlers.append(handler)
+    return handler
+
+
+def deliver(message):
+    for handler in list(_handlers):
+        try:
+            handler(message)
+        except Exception:
+            logger.exception('Invalidation handler %r failed', handler)
+
+
+def uses_postgres(using='default'):
+    backend = settings.INVALIDATION_BUS
+    if backend == 'auto':
+        return connections[using].vendor == 'postgresql'
+    return backend == 'postgres'
+
+
+def publish(model, pk, departments=(), using='default'):
+    """Publish an invalidation message once the current transaction commits"""
+    message = {
+        'm': model._meta.label_lower,
+        'pk': pk,
+        'd': sorted({department for department in departments if department is not None}),
+        'p': os.getpid(),
+    }
+    # Apply locally both now and after commit, so entries recomputed while the
+    # transaction was open are dropped too; other workers hear it over NOTIFY.
+    deliver(message)
+    transaction.on_commit(lambda: deliver(message), using=using)
+    if uses_postgres(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [settings.INVALIDATION_CHANNEL, json.dumps(message)])
+
+
+def _listen_forever(alias, channel):
+    from django.db.backends.postgresql.base import Database
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+    wrapper = connections[alias]
+    pid = os.getpid()
+    while True:
+        try:
+            # A dedicated connection, outside Django's connection handling and
+            # any pool, that does nothing but wait for notifications.
+            conn = Database.connect(**wrapper.get_connection_params())
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN "{channel}"')
+            for payload in _notifications(conn, is_psycopg3):
+                message = json.loads(payload)
+                if message.get('p') != pid:
+                    deliver(message)
+        except Exception:
+            logger.exception('Invalidation listener lost its connection; reconnecting')
+            time.sleep(RECONNECT_SECONDS)
+
+
+def _notifications(conn, is_psycopg3):
+    if is_psycopg3:
+        for notify in conn.notifies():
+            yield notify.payload
+        return
+    while True:
+        if select.select([conn], [], [], 60)[0]:
+            conn.poll()
+            while conn.notifies:
+                yield conn.notifies.pop(0).payload
+
+
+def start_listener(alias='default'):
+    """Start this process's listener thread (once per process, so forked workers get their own)"""
+    global _listener_pid
+    if _listener_pid == os.getpid() or not uses_postgres(alias):
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+        threading.Thread(
+            target=_listen_forever, args=(alias, settings.INVALIDATION_CHANNEL),
+            name='consults-invalidation-listener', daemon=True
+        ).start()
+
+
+class LocalCache:
+    """Per-process cache whose entries are dropped when a model they depend on changes"""
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._version = 0
+        subscribe(self.invalidate)
+
+    def get_or_set(self, key, func, depends_on, timeout=None):
+        """Return the cached value for key, computing it with func() on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            version = self._version
+        if entry is not None and entry[0] > now:
+            return entry[2]
+        value = func()
+        if timeout is None:
+            timeout = settings.LOCAL_CACHE_TIMEOUT if self.timeout is None else self.timeout
+        with self._lock:
+            # Don't store a value computed across an invalidation.
+            if version == self._version:
+                self._entries[key] = (now + timeout, frozenset(model._meta.label_lower for model in depends_on), value)
+        return value
+
+    def invalidate(self, message):
+        with self._lock:
+            self._version += 1
+            self._entries = {
+                key: entry for key, entry in self._entries.items() if message['m'] not in entry[1]
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalCache()
+
+
+class LocalCachedListMixin:
+    """Viewset mixin caching `list` responses in process memory until a model in `local_cache_depends_on` changes"""
+    local_cache_depends_on = ()
+
+    def list(self, request, *args, **kwargs):
+        timeout = None
+        if current_read_alias() is not None:
+            # Replica reads may trail the change notifications.
+            timeout = min(settings.LOCAL_CACHE_TIMEOUT, settings.REPLICA_STICKY_SECONDS)
+        data = local_cache.get_or_set(
+            (type(self).__name__, request.get_host(), request.get_full_path()),
+            lambda: super(LocalCachedListMixin, self).list(request, *args, **kwargs).data,
+            self.local_cache_depends_on,
+            timeout
+        )
+        return Response(data)
+
+
+def _departments(consult):
+    # Read loaded values only; touching a deferred field would query (or fail
+    # after a delete).
+    return consult.__dict__.get('from_department_id'), consult.__dict__.get('to_department_id')
+
+
+def _consult_changed(sender, instance, using, **kwargs):
+    publish(sender, instance.pk, _departments(instance), using)
+
+
+def _comment_changed(sender, instance, using, **kwargs):
+    departments = ()
+    if ConsultComment.consult.is_cached(instance):
+        departments = _departments(instance.consult)
+    publish(sender, instance.pk, departments, using)
+
+
+def _department_changed(sender, instance, using, **kwargs):
+    publish(sender, instance.pk, (instance.pk,), using)
+
+
+def _user_changed(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    publish(sender, instance.pk, (instance.__dict__.get('department_id'),), using)
+
+
+def _patient_changed(sender, instance, using, **kwargs):
+    publish(sender, instance.pk, (), using)
+
+
+for name, signal in (('save', post_save), ('delete', post_delete)):
+    for model, receiver in (
+        (ConsultRequest, _consult_changed),
+        (ConsultComment, _comment_changed),
+        (Department, _department_changed),
+        (User, _user_changed),
+        (Patient, _patient_changed),
+    ):
+        signal.connect(receiver, sender=model, dispatch_uid=f'consults.bus.{model.__name__}.{name}')
+
+request_started.connect(lambda **kwargs: start_listener(), weak=False, dispatch_uid='consults.bus.listener')
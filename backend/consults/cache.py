@@ -0,0 +1,126 @@
+"""
+Department-scoped result cache for the consult list.
+
+Cached pages are keyed by the requesting user's department, that department's
+generation token and the request's query string. Any write touching a
+consult bumps the generation of both departments involved, so cached pages are
+never served after a change; patients, departments and users appear inside
+every page, so changes to those bump a global generation instead.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from rest_framework.response import Response
+
+from .models import Department, User, Patient, ConsultRequest, ConsultComment
+from .routers import current_read_alias
+
+
+GLOBAL = 'all'
+
+
+def _generation_key(scope):
+    return f'consults:list-gen:{scope}'
+
+
+def get_generations(department_id):
+    """Return the (global, department) generation tokens"""
+    keys = [_generation_key(GLOBAL), _generation_key(department_id)]
+    values = cache.get_many(keys)
+    return tuple(values.get(key, '0') for key in keys)
+
+
+def bump_generation(*scopes):
+    """Invalidate every cached page for the given departments (or GLOBAL)"""
+    # A fresh random token per bump (rather than incr) means concurrent bumps
+    # can never collapse into one another.
+    cache.set_many(
+        {_generation_key(scope): uuid.uuid4().hex for scope in set(scopes) if scope is not None},
+        timeout=None
+    )
+
+
+def bump_generation_on_commit(*scopes):
+    """Bump once the current transaction commits, so readers never cache pre-commit data"""
+    transaction.on_commit(lambda: bump_generation(*scopes))
+
+
+def list_cache_key(request, department_id):
+    params = sorted(request.query_params.lists())
+    digest = hashlib.sha256(repr((request.get_host(), request.path, params)).encode()).hexdigest()[:32]
+    global_gen, department_gen = get_generations(department_id)
+    return f'consults:list:{department_id}:{global_gen}:{department_gen}:{digest}'
+
+
+class CachedListMixin:
+    """Viewset mixin caching `list` responses per department"""
+
+    def list(self, request, *args, **kwargs):
+        timeout = settings.CONSULT_LIST_CACHE_TIMEOUT
+        if not timeout:
+            return super().list(request, *args, **kwargs)
+
+        key = list_cache_key(request, request.user.department_id)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            if current_read_alias() is not None:
+                # Replica reads may trail the primary; don't let them linger.
+                timeout = min(timeout, settings.REPLICA_STICKY_SECONDS)
+            cache.set(key, response.data, timeout)
+        return response
+
+
+# Fields of User rendered inside consult pages; saves touching only other
+# fields (e.g. last_login on every login) leave cached pages valid.
+USER_RENDERED_FIELDS = {'username', 'full_name', 'department'}
+
+
+def _loaded_departments(consult):
+    """Department ids already loaded on a consult instance, without querying deferred fields"""
+    departments = (consult.__dict__.get('from_department_id'), consult.__dict__.get('to_department_id'))
+    return departments if None not in departments else None
+
+
+def _consult_loaded(sender, instance, **kwargs):
+    # Remember the departments as loaded, so moving a consult to another
+    # department also invalidates the pages it used to appear on.
+    instance._cached_departments = _loaded_departments(instance) or ()
+
+
+def _consult_changed(sender, instance, **kwargs):
+    bump_generation_on_commit(*instance._cached_departments, *(_loaded_departments(instance) or ()))
+    instance._cached_departments = _loaded_departments(instance) or ()
+
+
+def _comment_changed(sender, instance, **kwargs):
+    departments = None
+    if ConsultComment.consult.is_cached(instance):
+        departments = _loaded_departments(instance.consult)
+    if departments is None:
+        departments = ConsultRequest.objects.filter(pk=instance.consult_id).values_list(
+            'from_department_id', 'to_department_id'
+        ).first()
+    if departments:
+        bump_generation_on_commit(*departments)
+
+
+def _shared_changed(sender, instance, update_fields=None, **kwargs):
+    if sender is User and update_fields and not USER_RENDERED_FIELDS.intersection(update_fields):
+        return
+    bump_generation_on_commit(GLOBAL)
+
+
+post_init.connect(_consult_loaded, sender=ConsultRequest, dispatch_uid='consults.cache.consult.init')
+for name, signal in (('save', post_save), ('delete', post_delete)):
+    signal.connect(_consult_changed, sender=ConsultRequest, dispatch_uid=f'consults.cache.consult.{name}')
+    signal.connect(_comment_changed, sender=ConsultComment, dispatch_uid=f'consults.cache.comment.{name}')
+    for model in (Patient, Department, User):
+        signal.connect(_shared_changed, sender=model, dispatch_uid=f'consults.cache.{model.__name__}.{name}')
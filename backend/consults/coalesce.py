@@ -0,0 +1,167 @@
+"""
+Single-flight coalescing of identical concurrent GET requests.
+
+When several identical requests arrive while one is still being computed
+(e.g. a whole department opening its inbox at shift handover), only the first
+runs the view; the others wait for it and receive a copy of its rendered
+bytes. The key includes the requesting user's department, the full path and
+the negotiated media type, so a response is only ever shared between users who
+would have been shown the same thing.
+
+Within a worker, waiters share the result through memory. With
+COALESCE_SHARED enabled, workers also coordinate through a lock in the shared
+cache: a single worker computes and publishes the bytes for the duration of
+the wait window.
+"""
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .routers import is_pinned
+
+
+# Interval at which cross-worker waiters poll the shared cache.
+SHARED_POLL_SECONDS = 0.025
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class SingleFlight:
+    """Run a function once for all concurrent callers passing the same key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, timeout):
+        """
+        Return (result, shared). Waiters give up after `timeout` seconds, or
+        when the leading call raises, and run `func` themselves.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(timeout) and not call.failed:
+                return call.result, True
+            return func(), False
+
+        try:
+            call.result = func()
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+flights = SingleFlight()
+
+
+def _payload(response):
+    return response.status_code, dict(response.items()), response.content
+
+
+def _copy(result):
+    # Every header (Content-Type, Vary, Cache-Control, ETag...) is carried
+    # over, so a waiter's response is indistinguishable from the leader's.
+    if isinstance(result, tuple):
+        status_code, headers, content = result
+    else:
+        status_code, headers, content = _payload(result)
+    response = HttpResponse(content, status=status_code)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def run_shared(key, func, timeout):
+    """
+    Coordinate `func` across workers through the shared cache. The worker
+    that runs `func` gets its rendered response back; the others get the
+    published (status, headers, content) tuple.
+    """
+    lock_key = f'consults:flight:{key}'
+    token = uuid.uuid4().hex
+    if cache.add(lock_key, token, timeout):
+        try:
+            response = func()
+            cache.set(f'{lock_key}:{token}', _payload(response), timeout)
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    # Wait for the result published under the current leader's token; a new
+    # leader (after this one finished) means a newer computation, not ours.
+    leader_token = cache.get(lock_key)
+    deadline = time.monotonic() + timeout
+    while leader_token and time.monotonic() < deadline:
+        result = cache.get(f'{lock_key}:{leader_token}')
+        if result is not None:
+            return result
+        if cache.get(lock_key) != leader_token:
+            break
+        time.sleep(SHARED_POLL_SECONDS)
+    return func()
+
+
+def coalesce_key(request):
+    """Return the coalescing key for a request, or None if it must run on its own"""
+    if request.method != 'GET' or not settings.COALESCE_GET_REQUESTS:
+        return None
+    # Browsable API pages embed the current user; only share API payloads.
+    if request.accepted_renderer.format == 'api':
+        return None
+    user = request.user
+    if not user or not user.is_authenticated:
+        return None
+    # Users who have just written must not receive a response computed before
+    # their write committed.
+    if is_pinned(user):
+        return None
+    parts = (request.get_host(), request.get_full_path(), request.accepted_media_type, user.department_id)
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+class CoalescedReadMixin:
+    """Viewset mixin sharing one rendered response between identical concurrent list/retrieve requests"""
+
+    def list(self, request, *args, **kwargs):
+        return self._coalesce(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._coalesce(super().retrieve, request, *args, **kwargs)
+
+    def _coalesce(self, handler, request, *args, **kwargs):
+        key = coalesce_key(request)
+        if key is None:
+            return handler(request, *args, **kwargs)
+
+        def render():
+            response = self.finalize_response(request, handler(request, *args, **kwargs), *args, **kwargs)
+            return response.render()
+
+        compute = render
+        if settings.COALESCE_SHARED:
+            compute = lambda: run_shared(key, render, settings.COALESCE_WAIT_SECONDS)
+
+        result, shared = flights.do(key, compute, settings.COALESCE_WAIT_SECONDS)
+        # The request that did the work keeps its own Response; waiters get
+        # a copy of its bytes.
+        return _copy(result) if shared or isinstance(result, tuple) else result
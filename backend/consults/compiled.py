@@ -0,0 +1,222 @@
+"""
+Serializer compiler for hot read paths.
+
+`CompiledSerializer` walks a ModelSerializer's declared fields once and turns
+them into a flat plan that runs over `.values()` rows: dotted sources such as
+`from_department.name` become SQL joins, nested serializers read prefixed
+columns from the same row, and many=True children are fetched with a single
+extra query. The rendered output is identical to the serializer's own
+`to_representation`.
+"""
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+_SKIP = object()
+
+
+class CompileError(ValueError):
+    """Raised when a serializer uses a field the compiler cannot flatten"""
+
+
+def _identity_safe(field, model_field):
+    """Whether field.to_representation is a no-op for values of model_field"""
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        return field.pk_field is None
+    if type(field) is serializers.CharField:
+        return isinstance(model_field, (models.CharField, models.TextField))
+    if type(field) is serializers.ChoiceField:
+        return isinstance(model_field, models.CharField) and all(isinstance(key, str) for key in field.choices)
+    if type(field) is serializers.IntegerField:
+        return isinstance(model_field, (models.IntegerField, models.AutoField))
+    return False
+
+
+class CompiledSerializer:
+    """Flat, precomputed equivalent of a ModelSerializer over `.values()` rows"""
+
+    def __init__(self, serializer, fields=None):
+        if isinstance(serializer, type):
+            serializer = serializer()
+        if type(serializer).to_representation is not serializers.Serializer.to_representation:
+            raise CompileError(f'{type(serializer).__name__} overrides to_representation')
+
+        self.model = serializer.Meta.model
+        self.lookups = {'pk': None}
+        self.annotations = {}
+        self.children = {}
+        self.plan = [
+            (key, self._compile_field(field, self.model, ''))
+            for key, field in serializer.fields.items()
+            if not field.write_only and (fields is None or key in fields)
+        ]
+
+    def queryset(self, queryset):
+        """Return `queryset` reduced to the columns this serializer needs"""
+        return queryset.prefetch_related(None).annotate(**self.annotations).values(*self.lookups)
+
+    def render(self, rows):
+        """Render `.values()` rows produced by `queryset()`"""
+        rows = list(rows)
+        for key, (child, fk_attname) in self.children.items():
+            grouped = defaultdict(list)
+            if rows:
+                child_rows = list(child.queryset(
+                    child.model._default_manager.filter(**{f'{fk_attname}__in': [row['pk'] for row in rows]})
+                ))
+                for child_row, data in zip(child_rows, child.render(child_rows)):
+                    grouped[child_row[fk_attname]].append(data)
+            for row in rows:
+                row[key] = grouped.get(row['pk'], [])
+        return [self._render_row(row) for row in rows]
+
+    def serialize(self, queryset):
+        return self.render(self.queryset(queryset))
+
+    def _render_row(self, row):
+        data = {}
+        for key, getter in self.plan:
+            value = getter(row)
+            if value is not _SKIP:
+                data[key] = value
+        return data
+
+    def _compile_field(self, field, model, prefix):
+        if field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+            raise CompileError(f'Cannot compile field {field.field_name!r}')
+
+        if isinstance(field, serializers.ListSerializer):
+            return self._compile_many(field, model, prefix)
+        if isinstance(field, serializers.BaseSerializer):
+            return self._compile_nested(field, model, prefix)
+
+        attrs = field.source_attrs
+        if len(attrs) == 2 and attrs[1] == 'count':
+            return self._compile_count(field, model, prefix, attrs[0])
+
+        # Walk forward relations; any nullable hop is guarded so the field is
+        # skipped (as DRF does) when the related object is missing.
+        guards = []
+        for index, attr in enumerate(attrs[:-1]):
+            relation = self._get_model_field(model, attr)
+            if not (relation.many_to_one or relation.one_to_one) or not relation.concrete:
+                raise CompileError(f'Cannot follow {attr!r} for field {field.field_name!r}')
+            if relation.null:
+                guards.append(prefix + '__'.join(attrs[:index + 1]))
+            model = relation.related_model
+
+        model_field = self._get_model_field(model, attrs[-1])
+        lookup = prefix + '__'.join(attrs)
+        self.lookups[lookup] = None
+        self.lookups.update(dict.fromkeys(guards))
+        convert = None if _identity_safe(field, model_field) else field.to_representation
+
+        def getter(row):
+            for guard in guards:
+                if row[guard] is None:
+                    return _SKIP
+            value = row[lookup]
+            if value is None or convert is None:
+                return value
+            return convert(value)
+        return getter
+
+    def _compile_nested(self, field, model, prefix):
+        if len(field.source_attrs) != 1:
+            raise CompileError(f'Cannot compile nested source {field.source!r}')
+        relation = self._get_model_field(model, field.source)
+        if not (relation.many_to_one or relation.one_to_one) or not relation.concrete:
+            raise CompileError(f'Cannot compile nested source {field.source!r}')
+
+        nested = CompiledSerializer.__new__(CompiledSerializer)
+        nested.model = relation.related_model
+        nested.lookups = self.lookups
+        nested.annotations = {}
+        nested.children = {}
+        nested_prefix = f'{prefix}{field.source}__'
+        nested.plan = [
+            (key, nested._compile_field(child, nested.model, nested_prefix))
+            for key, child in field.fields.items()
+            if not child.write_only
+        ]
+        if nested.annotations or nested.children:
+            raise CompileError(f'Nested serializer {field.field_name!r} cannot have counts or lists')
+
+        guard = prefix + field.source
+        self.lookups[guard] = None
+
+        def getter(row):
+            if row[guard] is None:
+                return None
+            return nested._render_row(row)
+        return getter
+
+    def _compile_many(self, field, model, prefix):
+        relation = self._get_model_field(model, field.source)
+        if prefix or not relation.one_to_many:
+            raise CompileError(f'Cannot compile list source {field.source!r}')
+
+        child = CompiledSerializer(field.child)
+        fk_attname = relation.field.attname
+        child.lookups[fk_attname] = None
+        key = f'{field.field_name}_rows'
+        self.children[key] = (child, fk_attname)
+        return lambda row: row[key]
+
+    def _compile_count(self, field, model, prefix, relation_name):
+        relation = self._get_model_field(model, relation_name)
+        if prefix or not relation.one_to_many:
+            raise CompileError(f'Cannot compile count source {field.source!r}')
+
+        # Reuse the rows of a sibling list on the same relation when there is one.
+        for key, (child, fk_attname) in self.children.items():
+            if child.model is relation.related_model and fk_attname == relation.field.attname:
+                return lambda row: len(row[key])
+
+        name = f'{field.field_name}_count'
+        self.annotations[name] = Coalesce(Subquery(
+            relation.related_model._default_manager.filter(**{relation.field.name: OuterRef('pk')})
+            .order_by().values(relation.field.name).annotate(total=Count('pk')).values('total')
+        ), 0)
+        self.lookups[name] = None
+        return lambda row: row[name]
+
+    @staticmethod
+    def _get_model_field(model, name):
+        try:
+            return model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise CompileError(f'{model.__name__} has no field {name!r}')
+
+
+# Fields come from the client's ?fields=, and any subset of a serializer's
+# fields is valid, so the number of compiled forms kept is bounded.
+@lru_cache(maxsize=128)
+def compile_serializer(serializer_class, fields=None):
+    """Return the cached compiled form of `serializer_class`"""
+    return CompiledSerializer(serializer_class, fields)
+
+
+class CompiledListMixin:
+    """Viewset mixin that serves `list` through the compiled serializer"""
+
+    def list(self, request, *args, **kwargs):
+        if not settings.COMPILED_SERIALIZERS:
+            return super().list(request, *args, **kwargs)
+
+        serializer_class = self.get_serializer_class()
+        fields = self.get_fieldset(serializer_class) if hasattr(self, 'get_fieldset') else None
+        compiled = compile_serializer(serializer_class, fields)
+        queryset = compiled.queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(compiled.render(page))
+        return Response(compiled.render(queryset))
@@ -0,0 +1,76 @@
+import logging
+import time
+import threading
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_counters = {
+    'connections_opened': 0,
+}
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    with _lock:
+        _counters['connections_opened'] += 1
+
+
+connection_created.connect(_on_connection_created, dispatch_uid='consults.dbpool.connection_created')
+
+
+def check_database(alias='default'):
+    """Run a trivial query against the database and time the round trip"""
+    started = time.perf_counter()
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except Exception:
+        # The health check is public; driver messages can name hosts and users.
+        logger.exception('Database health check failed for %r', alias)
+        return {'ok': False, 'error': 'Database unavailable'}
+    return {'ok': True, 'latency_ms': round((time.perf_counter() - started) * 1000, 3)}
+
+
+def pool_stats(alias='default'):
+    """Return connection reuse metrics for this worker process"""
+    connection = connections[alias]
+    settings_dict = connection.settings_dict
+    with _lock:
+        stats = {
+            'mode': settings.DB_POOL_MODE,
+            'vendor': connection.vendor,
+            'connections_opened': _counters['connections_opened'],
+        }
+
+    pool = getattr(connection, 'pool', None)
+    if pool is None:
+        stats['conn_max_age'] = settings_dict.get('CONN_MAX_AGE', 0)
+        stats['health_checks'] = settings_dict.get('CONN_HEALTH_CHECKS', False)
+        return stats
+
+    raw = pool.get_stats()
+    size = raw.get('pool_size', 0)
+    available = raw.get('pool_available', 0)
+    requests = raw.get('requests_num', 0)
+    stats.update({
+        'min_size': pool.min_size,
+        'max_size': pool.max_size,
+        'size': size,
+        'in_use': size - available,
+        'available': available,
+        'overflow': max(size - pool.min_size, 0),
+        'requests': requests,
+        'requests_waiting': raw.get('requests_waiting', 0),
+        'requests_queued': raw.get('requests_queued', 0),
+        'requests_errors': raw.get('requests_errors', 0),
+        'wait_ms_total': raw.get('requests_wait_ms', 0),
+        'wait_ms_avg': round(raw.get('requests_wait_ms', 0) / requests, 3) if requests else 0,
+        'connections_lost': raw.get('connections_lost', 0),
+    })
+    return stats
@@ -0,0 +1,47 @@
+"""
+SLA escalation for consults left pending too long.
+
+Consults that can still breach carry an `sla_deadline` (see
+ConsultRequest.PENDING_SLA), kept in a partial index that holds nothing else.
+Escalating clears the deadline, which both makes escalation idempotent and
+drops the consult from the index, so each scan reads only breached rows.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_generation_on_commit
+from .models import ConsultRequest
+from .notifications import notify_many
+
+
+def escalate_overdue(now=None, batch_size=500):
+    """Escalate consults whose SLA deadline has passed; returns their ids"""
+    now = now or timezone.now()
+    escalated = []
+    while True:
+        with transaction.atomic():
+            due = list(
+                ConsultRequest.objects.filter(sla_deadline__lte=now)
+                .order_by('sla_deadline')
+                .select_for_update(skip_locked=True)
+                .values_list('pk', 'from_department_id', 'to_department_id')[:batch_size]
+            )
+            if not due:
+                return escalated
+            ids = [pk for pk, _, _ in due]
+            # The deadline check makes a concurrent or repeated run a no-op.
+            ConsultRequest.objects.filter(pk__in=ids, sla_deadline__isnull=False).update(
+                escalated_at=now, sla_deadline=None
+            )
+            notify_many('escalated', ids)
+            bump_generation_on_commit(*(department for _, *pair in due for department in pair))
+        escalated.extend(ids)
+        if len(due) < batch_size:
+            return escalated
+
+
+def next_deadline():
+    """Return the earliest pending SLA deadline, or None"""
+    return ConsultRequest.objects.filter(sla_deadline__isnull=False).order_by('sla_deadline').values_list(
+        'sla_deadline', flat=True
+    ).first()
@@ -0,0 +1,106 @@
+"""
+Sparse fieldsets (`?fields=`) and explicit expansion (`?expand=`).
+
+Without either parameter, endpoints return their full representation. With
+`fields`, only the listed fields (plus any listed in `expand`) are returned;
+with only `expand`, the serializer's expandable fields (`Meta.expandable_fields`)
+are dropped unless named. The selected fields also shape the queryset, so
+`select_related`, `prefetch_related` and `.only()` load exactly what is rendered.
+"""
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .serializers import DynamicFieldsMixin
+
+
+def _split(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def parse_fieldset(query_params, serializer_class):
+    """Return the set of field names requested, or None for all fields"""
+    if 'fields' not in query_params and 'expand' not in query_params:
+        return None
+
+    available = [
+        name for name, field in serializer_class().fields.items() if not field.write_only
+    ]
+    expandable = set(getattr(serializer_class.Meta, 'expandable_fields', []))
+    expand = set(_split(query_params.get('expand', '')))
+
+    if 'fields' in query_params:
+        selected = set(_split(query_params['fields'])) | expand
+    else:
+        selected = {name for name in available if name not in expandable} | expand
+
+    unknown = selected.difference(available)
+    if unknown:
+        raise ValidationError({'fields': [f"Unknown field(s): {', '.join(sorted(unknown))}"]})
+    return frozenset(selected)
+
+
+def optimize_queryset(queryset, serializer_class, fields=None):
+    """Apply select_related/prefetch_related/only() for the fields to be rendered"""
+    return _optimize(queryset, serializer_class(), fields)
+
+
+def _optimize(queryset, serializer, fields, extra=()):
+    select, only, prefetch = set(), {'pk', *extra}, {}
+    _plan(serializer, queryset.model, '', fields, select, only, prefetch)
+    if select:
+        # select_related() without arguments would follow every foreign key.
+        queryset = queryset.select_related(*select)
+    return queryset.prefetch_related(*prefetch.values()).only(*only)
+
+
+def _plan(serializer, model, prefix, fields, select, only, prefetch):
+    for name, field in serializer.fields.items():
+        if field.write_only or (fields is not None and name not in fields):
+            continue
+        attrs = field.source_attrs
+
+        if isinstance(field, serializers.ListSerializer):
+            relation = model._meta.get_field(field.source)
+            child_queryset = _optimize(
+                relation.related_model._default_manager.all(), field.child, None, extra=[relation.field.name]
+            )
+            prefetch[prefix + field.source] = Prefetch(prefix + field.source, queryset=child_queryset)
+        elif isinstance(field, serializers.BaseSerializer):
+            path = prefix + field.source
+            select.add(path)
+            only.add(path)
+            _plan(field, model._meta.get_field(field.source).related_model, path + '__', None, select, only, prefetch)
+        elif len(attrs) == 2 and attrs[1] == 'count':
+            # comments.count reuses the prefetched rows; prefetch just the keys
+            # when the list itself is not rendered.
+            relation = model._meta.get_field(attrs[0])
+            if prefix + attrs[0] not in prefetch:
+                prefetch[prefix + attrs[0]] = Prefetch(
+                    prefix + attrs[0],
+                    queryset=relation.related_model._default_manager.only('pk', relation.field.name)
+                )
+        else:
+            for index in range(1, len(attrs)):
+                path = prefix + '__'.join(attrs[:index])
+                select.add(path)
+                only.add(path)
+            only.add(prefix + '__'.join(attrs))
+
+
+class SparseFieldsetMixin:
+    """Viewset mixin adding `?fields=` and `?expand=` support"""
+
+    def get_fieldset(self, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        if not issubclass(serializer_class, DynamicFieldsMixin):
+            return None
+        return parse_fieldset(self.request.query_params, serializer_class)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        fieldset = self.get_fieldset(serializer_class)
+        if fieldset is not None:
+            kwargs.setdefault('fields', fieldset)
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
@@ -0,0 +1,111 @@
+"""
+Idempotency keys for unsafe requests retried over flaky ward networks.
+
+A client sending `Idempotency-Key: <unique value>` with a write may resend it
+as often as it likes: the first request runs, and its response is kept in the
+shared cache for IDEMPOTENCY_KEY_TTL seconds, so retries get that response
+back (marked `Idempotent-Replayed: true`) without running validation or
+inserts again. Keys belong to the user who sent them, and each remembers a
+fingerprint of its request; reusing a key for a different request is refused
+(422) rather than answered with an unrelated response. A retry arriving while
+the first request is still running gets 409 and should try again shortly.
+
+Server errors (5xx) are not remembered, so a failed request can be retried
+for real. The response is stored as soon as the handler returns, by which time
+the handler's own transactions have committed (requests aren't wrapped in one
+with ATOMIC_REQUESTS). If a worker dies before storing it, the reservation
+expires after IDEMPOTENCY_LOCK_SECONDS and a retry runs the request again.
+"""
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+RUNNING = 'running'
+DONE = 'done'
+
+
+def _cache_key(user, key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'consults:idempotency:{user.pk}:{digest}'
+
+
+def fingerprint(request):
+    """Hash of what makes two requests the same: method, path and body"""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(repr((request.method, request.path, body)).encode()).hexdigest()
+
+
+def _error(message, status_code):
+    return Response({'error': message}, status=status_code)
+
+
+def idempotent(handler):
+    """Decorate a viewset action to honour the Idempotency-Key header"""
+
+    @functools.wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return handler(self, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return _error(f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters', status.HTTP_400_BAD_REQUEST)
+
+        cache_key = _cache_key(request.user, key)
+        request_fingerprint = fingerprint(request)
+        reservation = {'state': RUNNING, 'fingerprint': request_fingerprint}
+        if not cache.add(cache_key, reservation, settings.IDEMPOTENCY_LOCK_SECONDS):
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return _replay(stored, request_fingerprint)
+            # Expired between add and get: take it over.
+            cache.set(cache_key, reservation, settings.IDEMPOTENCY_LOCK_SECONDS)
+
+        try:
+            try:
+                response = handler(self, request, *args, **kwargs)
+            except Exception as exc:
+                # Validation errors are part of the outcome a retry must see;
+                # anything the view can't turn into a response propagates.
+                response = self.handle_exception(exc)
+        except BaseException:
+            cache.delete(cache_key)
+            raise
+
+        if response.status_code >= 500:
+            cache.delete(cache_key)
+        else:
+            cache.set(cache_key, {
+                'state': DONE,
+                'fingerprint': request_fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+            }, settings.IDEMPOTENCY_KEY_TTL)
+        return response
+
+    return wrapper
+
+
+def _replay(stored, request_fingerprint):
+    if stored['fingerprint'] != request_fingerprint:
+        return _error(
+            f'{HEADER} was already used for a different request', status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if stored['state'] == RUNNING:
+        response = _error(
+            f'A request with this {HEADER} is still being processed', status.HTTP_409_CONFLICT
+        )
+        response['Retry-After'] = '1'
+        return response
+    response = Response(stored['data'], status=stored['status'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
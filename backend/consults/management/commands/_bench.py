@@ -0,0 +1,44 @@
+"""Shared fixtures and timing helpers for the bench_* management commands"""
+import statistics
+import time
+
+from consults.models import Department, User, Patient, ConsultRequest, ConsultComment
+
+
+def create_consult_fixture(consult_count, comment_count):
+    """Create consults with nested comments and return their target department"""
+    source = Department.objects.create(name='Bench Source', code='BSRC')
+    target = Department.objects.create(name='Bench Target', code='BTGT')
+    doctor = User.objects.create(username='bench_doctor', full_name='Dr. Bench', department=source)
+    for index in range(consult_count):
+        patient = Patient.objects.create(
+            hospital_id=f'BENCH{index:05d}', name=f'Bench Patient {index}', age=40, gender='F',
+            bed_ward_info='Ward B, Bed 7'
+        )
+        consult = ConsultRequest.objects.create(
+            patient=patient, from_department=source, to_department=target, requested_by=doctor,
+            priority='urgent', clinical_summary='Chest pain radiating to the left arm. ' * 5,
+            consult_question='Please evaluate for acute coronary syndrome.'
+        )
+        ConsultComment.objects.bulk_create([
+            ConsultComment(consult=consult, author=doctor, message=f'Follow-up note {n} – seen on ward round.')
+            for n in range(comment_count)
+        ])
+    return target
+
+
+def median_ms(func, iterations):
+    """Return the median wall time of func() in milliseconds"""
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of values"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,81 @@
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from consults.models import ConsultRequest, ArchivedConsult
+from consults.serializers import ConsultRequestSerializer
+
+
+CLOSED_STATUSES = ['completed', 'cancelled']
+
+
+class Command(BaseCommand):
+    help = 'Moves completed and cancelled consults older than N days into the archive table, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=365, help='Archive consults closed this long ago')
+        parser.add_argument('--batch-size', type=int, default=500, help='Consults moved per transaction')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many consults would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        candidates = ConsultRequest.objects.filter(status__in=CLOSED_STATUSES, updated_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f'{candidates.count()} consults would be archived (closed before {cutoff:%Y-%m-%d})')
+            return
+
+        total = 0
+        while True:
+            moved = self._archive_batch(candidates, options['batch_size'])
+            if not moved:
+                break
+            total += moved
+            self.stdout.write(f'  Archived {moved} consults ({total} so far)')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} consults closed before {cutoff:%Y-%m-%d}'))
+
+    def _archive_batch(self, candidates, batch_size):
+        # Each batch is its own short transaction; rows another worker is
+        # updating are skipped and picked up by a later run.
+        with transaction.atomic():
+            ids = list(
+                candidates.order_by('pk').select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return 0
+
+            consults = ConsultRequest.objects.filter(pk__in=ids).select_related(
+                'patient', 'from_department', 'to_department', 'requested_by'
+            ).prefetch_related('comments__author')
+            ArchivedConsult.objects.bulk_create([
+                ArchivedConsult(
+                    consult_id=consult.pk,
+                    patient_hospital_id=consult.patient.hospital_id,
+                    patient_name=consult.patient.name,
+                    from_department_id=consult.from_department_id,
+                    to_department_id=consult.to_department_id,
+                    priority=consult.priority,
+                    status=consult.status,
+                    created_at=consult.created_at,
+                    closed_at=consult.updated_at,
+                    payload=self._snapshot(consult),
+                )
+                for consult in consults
+            ])
+            ConsultRequest.objects.filter(pk__in=ids).delete()
+        return len(ids)
+
+    @staticmethod
+    def _snapshot(consult):
+        # Round-trip through the API renderer so the payload holds plain JSON
+        # types exactly as clients saw them.
+        return json.loads(JSONRenderer().render(ConsultRequestSerializer(consult).data))
@@ -0,0 +1,65 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core import signals
+from django.db import connections
+
+from ._bench import percentile
+
+
+class Command(BaseCommand):
+    help = 'Measures per-request database latency with and without connection reuse'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Simulated requests per mode')
+        parser.add_argument('--database', default='default', help='Database alias to benchmark')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        count = options['requests']
+        connection = connections[alias]
+        settings_dict = connection.settings_dict
+        original_max_age = settings_dict.get('CONN_MAX_AGE', 0)
+        # Pooling and CONN_MAX_AGE are mutually exclusive, so the baselines
+        # run with the pool temporarily switched off.
+        pool_options = settings_dict.get('OPTIONS', {}).pop('pool', None)
+
+        self.stdout.write(f'Benchmarking {count} simulated requests against {connection.vendor} ({alias})')
+        results = {}
+        try:
+            for label, max_age in (('per-request', 0), ('persistent', 600)):
+                connection.close()
+                settings_dict['CONN_MAX_AGE'] = max_age
+                results[label] = self._run(connection, count)
+        finally:
+            connection.close()
+            settings_dict['CONN_MAX_AGE'] = original_max_age
+            if pool_options is not None:
+                settings_dict['OPTIONS']['pool'] = pool_options
+
+        if pool_options is not None:
+            results['pool'] = self._run(connection, count)
+
+        for label, timings in results.items():
+            self.stdout.write(
+                f'  {label:<12} median={statistics.median(timings):.3f}ms '
+                f'p95={percentile(timings, 95):.3f}ms'
+            )
+
+        saved = statistics.median(results['per-request']) - statistics.median(results['persistent'])
+        self.stdout.write(self.style.SUCCESS(f'Connection reuse saves {saved:.3f}ms per request (median)'))
+
+    def _run(self, connection, count):
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter()
+            # Mirror Django's request lifecycle: connections are closed or kept
+            # on request_started/request_finished according to CONN_MAX_AGE.
+            signals.request_started.send(sender=self.__class__)
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            signals.request_finished.send(sender=self.__class__)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
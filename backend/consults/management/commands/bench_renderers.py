@@ -0,0 +1,56 @@
+import io
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from consults import renderers
+from consults.models import ConsultRequest
+from consults.serializers import ConsultRequestSerializer
+from ._bench import create_consult_fixture, median_ms
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks API renderers and parsers on a page of consults with nested comments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consults', type=int, default=50, help='Consults on the page')
+        parser.add_argument('--comments', type=int, default=5, help='Comments per consult')
+        parser.add_argument('--iterations', type=int, default=200, help='Timed iterations per codec')
+
+    def handle(self, *args, **options):
+        # Fixture rows are created inside a transaction that is rolled back.
+        with transaction.atomic():
+            page = self._build_page(options['consults'], options['comments'])
+            transaction.set_rollback(True)
+
+        codecs = [('stdlib json', JSONRenderer(), JSONParser())]
+        if renderers.orjson is not None:
+            codecs.append(('orjson', renderers.FastJSONRenderer(), renderers.FastJSONParser()))
+        if renderers.msgpack is not None:
+            codecs.append(('msgpack', renderers.MessagePackRenderer(), renderers.MessagePackParser()))
+
+        self.stdout.write(
+            f"Page of {options['consults']} consults x {options['comments']} comments, "
+            f"{options['iterations']} iterations"
+        )
+        baseline = None
+        for label, renderer, parser in codecs:
+            body = renderer.render(page)
+            render_ms = median_ms(lambda: renderer.render(page), options['iterations'])
+            parse_ms = median_ms(lambda: parser.parse(io.BytesIO(body)), options['iterations'])
+            if baseline is None:
+                baseline = render_ms
+            self.stdout.write(
+                f'  {label:<12} render={render_ms:.3f}ms parse={parse_ms:.3f}ms '
+                f'size={len(body)}B speedup={baseline / render_ms:.1f}x'
+            )
+
+    def _build_page(self, consult_count, comment_count):
+        target = create_consult_fixture(consult_count, comment_count)
+        queryset = ConsultRequest.objects.filter(to_department=target).select_related(
+            'patient', 'from_department', 'to_department', 'requested_by'
+        ).prefetch_related('comments__author')
+        results = ConsultRequestSerializer(queryset, many=True).data
+        return {'count': len(results), 'next': None, 'previous': None, 'results': results}
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from consults.compiled import CompiledSerializer
+from consults.models import ConsultRequest
+from consults.serializers import ConsultRequestSerializer
+from ._bench import create_consult_fixture, median_ms
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the DRF consult serializer against its compiled form'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consults', type=int, default=50, help='Consults on the page')
+        parser.add_argument('--comments', type=int, default=5, help='Comments per consult')
+        parser.add_argument('--iterations', type=int, default=50, help='Timed iterations per serializer')
+
+    def handle(self, *args, **options):
+        # Fixture rows are created inside a transaction that is rolled back.
+        with transaction.atomic():
+            target = create_consult_fixture(options['consults'], options['comments'])
+            self._compare(target, options['iterations'])
+            transaction.set_rollback(True)
+
+    def _compare(self, target, iterations):
+        # Same queryset ConsultRequestViewSet.get_queryset() builds.
+        queryset = ConsultRequest.objects.filter(to_department=target).select_related(
+            'patient', 'from_department', 'to_department', 'requested_by'
+        ).prefetch_related('comments')
+        compiled = CompiledSerializer(ConsultRequestSerializer)
+
+        def drf():
+            return ConsultRequestSerializer(queryset.all(), many=True).data
+
+        def drf_prefetched():
+            return ConsultRequestSerializer(queryset.prefetch_related('comments__author'), many=True).data
+
+        def precompiled():
+            return compiled.serialize(queryset.all())
+
+        identical = JSONRenderer().render(drf()) == JSONRenderer().render(precompiled())
+        self.stdout.write(f'Output identical: {identical}')
+
+        baseline = None
+        for label, func in (('drf', drf), ('drf+author', drf_prefetched), ('compiled', precompiled)):
+            with CaptureQueriesContext(connection) as queries:
+                func()
+            elapsed = median_ms(func, iterations)
+            if baseline is None:
+                baseline = elapsed
+            self.stdout.write(
+                f'  {label:<10} median={elapsed:.3f}ms queries={len(queries)} '
+                f'speedup={baseline / elapsed:.1f}x'
+            )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from consults.escalation import escalate_overdue, next_deadline
+
+
+class Command(BaseCommand):
+    help = 'Escalates STAT and urgent consults still pending past their SLA; runs once or as a scheduler loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running, waking at the next deadline')
+        parser.add_argument('--interval', type=float, default=60.0, help='Longest sleep between scans in --loop mode')
+        parser.add_argument('--batch-size', type=int, default=500, help='Consults escalated per transaction')
+
+    def handle(self, *args, **options):
+        while True:
+            escalated = escalate_overdue(batch_size=options['batch_size'])
+            if escalated:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Escalated {len(escalated)} consults: {', '.join(f'#{pk}' for pk in escalated)}"
+                ))
+            if not options['loop']:
+                if not escalated:
+                    self.stdout.write('No consults past their SLA')
+                return
+
+            # Sleep until the next consult could breach (one index lookup),
+            # but re-check at least every --interval for newly created ones.
+            delay = options['interval']
+            deadline = next_deadline()
+            if deadline is not None:
+                delay = min(delay, max((deadline - timezone.now()).total_seconds(), 0) + 0.1)
+            time.sleep(delay)
@@ -0,0 +1,280 @@
+"""
+Mixed-workload load generator for a running server.
+
+Each simulated doctor logs in through /api/auth/login/ with one of the seeded
+accounts, then loops over a weighted mix of what doctors do all day: polling
+the incoming inbox and worklist, searching patients, commenting on consults in
+their inbox and creating new consults. Doctors start staggered over --ramp-up
+and pause for an exponentially distributed think time between actions, so
+requests arrive the way real traffic does rather than in lockstep.
+
+At the end it reports throughput, latency percentiles and error rates per
+operation, and fails (non-zero exit) if any p95 latency SLO or the error-rate
+SLO was missed.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from urllib import error, parse, request
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ._bench import percentile
+
+
+DEFAULT_USERNAMES = 'doctor_medicine,doctor_surgery,doctor_cardiology,doctor_radiology,doctor_pathology'
+DEFAULT_MIX = 'inbox=40,worklist=15,search=20,comment=15,create=10'
+# p95 latency objectives in milliseconds.
+DEFAULT_SLOS = 'login=1000,inbox=300,worklist=300,search=200,comment=500,create=800'
+
+SEARCH_TERMS = ['MRN', 'Anderson', 'Builder', 'Carter', 'Load', 'a', 'e']
+PRIORITIES = ['routine'] * 14 + ['urgent'] * 5 + ['stat']
+
+
+def parse_pairs(value, cast=float):
+    """Parse 'name=value,name=value' into a dict"""
+    pairs = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, sep, number = item.partition('=')
+        if not sep:
+            raise CommandError(f"Expected NAME=VALUE, got '{item}'")
+        try:
+            pairs[name.strip()] = cast(number)
+        except ValueError:
+            raise CommandError(f"Invalid value in '{item}'")
+    return pairs
+
+
+class Recorder:
+    """Thread-safe collection of per-operation latencies and failures"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(int)
+
+    def record(self, operation, elapsed_ms, status, expected=()):
+        with self._lock:
+            self.latencies[operation].append(elapsed_ms)
+            self.statuses[status] += 1
+            if status not in expected and (not isinstance(status, int) or status >= 400):
+                self.errors[operation] += 1
+
+
+class Doctor:
+    """One simulated doctor with its own token and view of the data"""
+
+    def __init__(self, base_url, username, password, recorder, timeout, rng):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.recorder = recorder
+        self.timeout = timeout
+        self.rng = rng
+        self.token = None
+        self.departments = []
+        self.patients = []
+        self.consults = []
+
+    def call(self, operation, method, path, body=None, expected=()):
+        """
+        Send one request, record it and return the decoded body (None on
+        failure). Statuses in `expected` are outcomes of the operation, not errors.
+        """
+        headers = {'Accept': 'application/json'}
+        data = None
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+            data = json.dumps(body).encode()
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        req = request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with request.urlopen(req, timeout=self.timeout) as response:
+                payload = response.read()
+                status = response.status
+        except error.HTTPError as exc:
+            exc.read()
+            payload, status = None, exc.code
+        except (error.URLError, OSError) as exc:
+            payload, status = None, type(exc).__name__
+        self.recorder.record(operation, (time.perf_counter() - started) * 1000, status, expected)
+        if payload is None:
+            if status == 401 and operation != 'login':
+                self.token = None
+            return None
+        return json.loads(payload) if payload else {}
+
+    def login(self):
+        self.token = None
+        data = self.call('login', 'POST', '/api/auth/login/', {'username': self.username, 'password': self.password})
+        self.token = data and data.get('access')
+        if self.token and not self.departments:
+            departments = self.call('departments', 'GET', '/api/departments/') or {}
+            self.departments = [item['id'] for item in _results(departments)]
+        return bool(self.token)
+
+    def inbox(self):
+        data = self.call('inbox', 'GET', '/api/consults/?role=incoming&status=pending')
+        if data is not None:
+            # Remember a page of consults to comment on later.
+            self.consults = [item['id'] for item in _results(data)] or self.consults
+
+    def worklist(self):
+        self.call('worklist', 'GET', '/api/consults/worklist/')
+
+    def search(self):
+        term = parse.quote(self.rng.choice(SEARCH_TERMS))
+        data = self.call('search', 'GET', f'/api/patients/?search={term}')
+        if data is not None:
+            self.patients = [item['id'] for item in _results(data)] or self.patients
+
+    def comment(self):
+        if not self.consults:
+            return self.inbox()
+        consult = self.rng.choice(self.consults)
+        self.call('comment', 'POST', f'/api/consults/{consult}/add_comment/', {
+            'message': f'Reviewed by {self.username}; will see the patient this afternoon.'
+        })
+
+    def create(self):
+        if not self.departments:
+            return self.login()
+        body = {
+            'to_department': self.rng.choice(self.departments),
+            'priority': self.rng.choice(PRIORITIES),
+            'clinical_summary': 'Simulated consult from the load generator.',
+            'consult_question': 'Please review and advise on management.',
+        }
+        if self.patients and self.rng.random() < 0.8:
+            body['patient'] = self.rng.choice(self.patients)
+        else:
+            body['patient_data'] = {
+                'hospital_id': f'LOAD-{uuid.uuid4().hex[:12]}',
+                'name': f'Load Patient {self.rng.randint(1, 99999)}',
+                'age': self.rng.randint(18, 95),
+                'gender': self.rng.choice('MF'),
+                'bed_ward_info': f'Ward {self.rng.choice("ABCD")}, Bed {self.rng.randint(1, 30)}',
+            }
+        # A patient may have only one open consult per department: reusing a
+        # patient often finds one, answered with 200 (the existing consult)
+        # or, if this doctor's department can't see it, 409.
+        self.call('create', 'POST', '/api/consults/', body, expected=(409,))
+
+
+def _results(data):
+    return data.get('results', []) if isinstance(data, dict) else data
+
+
+class Command(BaseCommand):
+    help = 'Simulates concurrent doctors against a running server and checks latency and error-rate SLOs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000', help='Server to load')
+        parser.add_argument('--users', type=int, default=25, help='Concurrent simulated doctors')
+        parser.add_argument('--usernames', default=DEFAULT_USERNAMES, help='Comma-separated accounts to log in as')
+        parser.add_argument('--password', default='doctor123', help='Password of those accounts')
+        parser.add_argument('--duration', type=float, default=60.0, help='Seconds to run')
+        parser.add_argument('--requests-per-user', type=int, default=0,
+                            help='Stop each doctor after this many actions (0 = run for --duration)')
+        parser.add_argument('--ramp-up', type=float, default=5.0, help='Seconds over which doctors start')
+        parser.add_argument('--think-time', type=float, default=0.5, help='Mean pause between actions in seconds')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='Relative weights of the operations')
+        parser.add_argument('--slo', default=DEFAULT_SLOS, help='p95 latency objectives in ms, per operation')
+        parser.add_argument('--max-error-rate', type=float, default=1.0, help='Error-rate objective in percent')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Per-request timeout in seconds')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed, for repeatable runs')
+
+    def handle(self, *args, **options):
+        mix = parse_pairs(options['mix'])
+        unknown = set(mix) - {'inbox', 'worklist', 'search', 'comment', 'create'}
+        if unknown or not any(weight > 0 for weight in mix.values()):
+            raise CommandError(f"Invalid --mix: {', '.join(sorted(unknown)) or 'no positive weights'}")
+        slos = parse_pairs(options['slo'])
+        usernames = [name.strip() for name in options['usernames'].split(',') if name.strip()]
+        if options['users'] < 1 or not usernames:
+            raise CommandError('Need at least one user and one username')
+
+        recorder = Recorder()
+        seed = random.Random(options['seed'])
+        doctors = [
+            Doctor(options['base_url'], usernames[index % len(usernames)], options['password'],
+                   recorder, options['timeout'], random.Random(seed.random()))
+            for index in range(options['users'])
+        ]
+        operations, weights = zip(*mix.items())
+        stop = threading.Event()
+
+        def run(index, doctor):
+            stop.wait(options['ramp_up'] * index / len(doctors))
+            actions = 0
+            while not stop.is_set():
+                if options['requests_per_user'] and actions >= options['requests_per_user']:
+                    return
+                if doctor.token or doctor.login():
+                    getattr(doctor, doctor.rng.choices(operations, weights)[0])()
+                actions += 1
+                if options['think_time']:
+                    stop.wait(doctor.rng.expovariate(1 / options['think_time']))
+
+        self.stdout.write(
+            f"Loading {options['base_url']} with {len(doctors)} doctors for "
+            f"{options['duration']:g}s (mix {options['mix']})"
+        )
+        threads = [threading.Thread(target=run, args=(index, doctor), daemon=True)
+                   for index, doctor in enumerate(doctors)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        deadline = started + options['duration']
+        for thread in threads:
+            thread.join(max(deadline - time.perf_counter(), 0))
+        stop.set()
+        for thread in threads:
+            thread.join(options['timeout'])
+        elapsed = time.perf_counter() - started
+
+        self._report(recorder, elapsed, slos, options['max_error_rate'])
+
+    def _report(self, recorder, elapsed, slos, max_error_rate):
+        total = sum(len(latencies) for latencies in recorder.latencies.values())
+        errors = sum(recorder.errors.values())
+        if not total:
+            raise CommandError('No requests completed')
+        error_rate = errors / total * 100
+
+        self.stdout.write(
+            f'{total} requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s, {error_rate:.2f}% errors'
+        )
+        self.stdout.write(
+            f"  {'operation':<12}{'count':>7}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}  SLO p95"
+        )
+        missed = []
+        for operation in sorted(recorder.latencies):
+            latencies = recorder.latencies[operation]
+            p95 = percentile(latencies, 95)
+            verdict = ''
+            if operation in slos:
+                met = p95 <= slos[operation]
+                verdict = f"{slos[operation]:g}ms {'PASS' if met else 'FAIL'}"
+                if not met:
+                    missed.append(f'{operation} p95 {p95:.0f}ms > {slos[operation]:g}ms')
+            self.stdout.write(
+                f'  {operation:<12}{len(latencies):>7}{len(latencies) / elapsed:>8.1f}'
+                f'{percentile(latencies, 50):>7.0f}ms{p95:>7.0f}ms{percentile(latencies, 99):>7.0f}ms'
+                f'{recorder.errors[operation]:>8}  {verdict}'.rstrip()
+            )
+        self.stdout.write('  responses: ' + ', '.join(
+            f'{status}={count}' for status, count in sorted(recorder.statuses.items(), key=lambda item: str(item[0]))
+        ))
+
+        if error_rate > max_error_rate:
+            missed.append(f'error rate {error_rate:.2f}% > {max_error_rate:g}%')
+        if missed:
+            raise CommandError('SLOs missed: ' + '; '.join(missed))
+        self.stdout.write(self.style.SUCCESS('All SLOs met'))
@@ -0,0 +1,109 @@
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from consults import taskqueue
+from consults.tasks import purge_finished_tasks, schedule_purge
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background tasks; start several to share the load'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queue', action='append', dest='queues', metavar='NAME[=CONCURRENCY]',
+            help='Queue to work on, with the number of tasks it may run at once (default: TASK_WORKER_QUEUES)'
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when no task is due')
+        parser.add_argument('--once', action='store_true', help='Exit once no task is due instead of polling')
+
+    def handle(self, *args, **options):
+        queues = self._parse_queues(options['queues'] or settings.TASK_WORKER_QUEUES)
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        pools = {name: ThreadPoolExecutor(limit, thread_name_prefix=f'task-{name}') for name, limit in queues.items()}
+        running = {name: 0 for name in queues}
+        active = set()
+        lock = threading.Lock()
+        stopping = threading.Event()
+
+        def stop(signum, frame):
+            self.stdout.write('Finishing running tasks...')
+            stopping.set()
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, stop)
+            signal.signal(signal.SIGINT, stop)
+
+        def run(name, task_row):
+            try:
+                outcome = taskqueue.execute(task_row)
+                self.stdout.write(f'  {task_row.name} #{task_row.pk}: {outcome}')
+            except Exception as exc:
+                # Recording the outcome failed; the task is requeued once its lock goes stale.
+                self.stderr.write(f'  {task_row.name} #{task_row.pk}: {exc}')
+            finally:
+                close_old_connections()
+                with lock:
+                    running[name] -= 1
+                    active.discard(task_row.pk)
+
+        self.stdout.write(f"Worker {worker_id} on {', '.join(f'{n}={c}' for n, c in queues.items())}")
+        next_heartbeat = next_purge = time.monotonic()
+        try:
+            while not stopping.is_set():
+                now = time.monotonic()
+                if now >= next_heartbeat:
+                    with lock:
+                        ids = list(active)
+                    taskqueue.heartbeat(ids, worker_id)
+                    requeued = taskqueue.requeue_stale()
+                    if requeued:
+                        self.stdout.write(f'  Requeued {requeued} stale tasks')
+                    next_heartbeat = now + settings.TASK_HEARTBEAT_SECONDS
+                if purge_finished_tasks.queue in queues and now >= next_purge:
+                    schedule_purge()
+                    next_purge = now + settings.TASK_PURGE_INTERVAL
+
+                claimed = 0
+                for name, limit in queues.items():
+                    with lock:
+                        free = limit - running[name]
+                    if free <= 0:
+                        continue
+                    for task_row in taskqueue.claim(name, free, worker_id):
+                        with lock:
+                            running[name] += 1
+                            active.add(task_row.pk)
+                        pools[name].submit(run, name, task_row)
+                        claimed += 1
+
+                if not claimed:
+                    with lock:
+                        busy = any(running.values())
+                    if options['once'] and not busy:
+                        break
+                    stopping.wait(options['poll_interval'])
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS('Worker stopped'))
+
+    @staticmethod
+    def _parse_queues(values):
+        queues = {}
+        for value in values:
+            name, _, concurrency = value.partition('=')
+            try:
+                queues[name] = int(concurrency or 1)
+            except ValueError:
+                raise CommandError(f'Invalid queue concurrency: {value}')
+            if queues[name] < 1:
+                raise CommandError(f'Queue concurrency must be at least 1: {value}')
+        return queues
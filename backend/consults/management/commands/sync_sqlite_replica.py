@@ -0,0 +1,34 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from consults.routers import replica_aliases
+
+
+class Command(BaseCommand):
+    help = 'Copies the SQLite primary into the local replica stand-in files'
+
+    def handle(self, *args, **kwargs):
+        primary = connections['default'].settings_dict
+        if not primary['ENGINE'].endswith('sqlite3'):
+            raise CommandError('sync_sqlite_replica only works with USE_SQLITE=True')
+
+        replicas = replica_aliases()
+        if not replicas:
+            raise CommandError('No replica configured; set USE_SQLITE_REPLICA=True')
+
+        source = sqlite3.connect(primary['NAME'])
+        try:
+            for alias in replicas:
+                connections[alias].close()
+                target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f'  Synced: {alias}')
+        finally:
+            source.close()
+
+        self.stdout.write(self.style.SUCCESS('Replica sync completed successfully!'))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consults', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedConsult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consult_id', models.BigIntegerField(unique=True)),
+                ('patient_hospital_id', models.CharField(db_index=True, max_length=50)),
+                ('patient_name', models.CharField(max_length=200)),
+                ('from_department_id', models.BigIntegerField()),
+                ('to_department_id', models.BigIntegerField()),
+                ('priority', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('closed_at', models.DateTimeField(help_text='Last update before archiving')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('payload', models.JSONField(help_text='Consult as rendered by the API, including comments')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['to_department_id', '-created_at'], name='archive_to_dept_created'), models.Index(fields=['from_department_id', '-created_at'], name='archive_from_dept_created')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consults', '0003_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(choices=[('created', 'New consult'), ('status_changed', 'Status changed'), ('commented', 'New comment')], max_length=20)),
+                ('message', models.CharField(max_length=500)),
+                ('urgent', models.BooleanField(default=False, help_text='Sent immediately instead of in the next digest')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('consult', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='consults.consultrequest')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['recipient', 'created_at'], name='notification_pending')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+
+
+def fill_triage_at(apps, schema_editor):
+    # Same head starts as ConsultRequest.PRIORITY_HEAD_START at the time of writing.
+    ConsultRequest = apps.get_model('consults', 'ConsultRequest')
+    ConsultRequest.objects.filter(status__in=['pending', 'in_progress']).update(triage_at=Case(
+        When(priority='stat', then=F('created_at') - Value(timedelta(hours=24))),
+        When(priority='urgent', then=F('created_at') - Value(timedelta(hours=4))),
+        default=F('created_at'),
+        output_field=models.DateTimeField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consults', '0004_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consultrequest',
+            name='triage_at',
+            field=models.DateTimeField(
+                null=True,
+                editable=False,
+                help_text="Worklist sort key: creation time moved earlier by the priority's head start; empty once closed"
+            ),
+        ),
+        migrations.RunPython(fill_triage_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='consultrequest',
+            index=models.Index(
+                condition=models.Q(('triage_at__isnull', False)),
+                fields=['to_department', 'triage_at', 'id'], name='consult_worklist'
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:39
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.utils import timezone
+
+
+# Same SLAs as ConsultRequest.PENDING_SLA at the time of writing.
+PENDING_SLA = {
+    'stat': timedelta(minutes=30),
+    'urgent': timedelta(hours=4),
+}
+
+
+def fill_sla_deadline(apps, schema_editor):
+    # Consults still inside their window get a deadline. Those that breached
+    # before escalation existed are recorded as escalated when they breached,
+    # rather than all being escalated, and notified, on the first run.
+    ConsultRequest = apps.get_model('consults', 'ConsultRequest')
+    now = timezone.now()
+    for priority, sla in PENDING_SLA.items():
+        pending = ConsultRequest.objects.filter(status='pending', priority=priority)
+        deadline = models.ExpressionWrapper(F('created_at') + Value(sla), output_field=models.DateTimeField())
+        pending.filter(created_at__gt=now - sla).update(sla_deadline=deadline)
+        pending.filter(created_at__lte=now - sla).update(escalated_at=deadline)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consults', '0005_consultrequest_triage_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consultrequest',
+            name='escalated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='consultrequest',
+            name='sla_deadline',
+            field=models.DateTimeField(editable=False, help_text='When this consult breaches its SLA if still pending; empty once accepted, closed or escalated', null=True),
+        ),
+        migrations.RunPython(fill_sla_deadline, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='notification',
+            name='event',
+            field=models.CharField(choices=[('created', 'New consult'), ('status_changed', 'Status changed'), ('commented', 'New comment'), ('escalated', 'SLA breached')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='consultrequest',
+            index=models.Index(condition=models.Q(('sla_deadline__isnull', False)), fields=['sla_deadline'], name='consult_sla_deadline'),
+        ),
+    ]
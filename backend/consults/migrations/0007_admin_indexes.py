@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consults', '0006_consult_sla'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='consultrequest',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='consultcomment',
+            index=models.Index(fields=['created_at'], name='comment_created'),
+        ),
+        migrations.AddIndex(
+            model_name='consultrequest',
+            index=models.Index(fields=['-created_at'], name='consult_created'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['-created_at'], name='patient_created'),
+        ),
+    ]
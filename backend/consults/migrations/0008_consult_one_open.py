@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:04
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def cancel_duplicate_open_consults(apps, schema_editor):
+    # Existing duplicates would stop the constraint from being created. Keep
+    # the consult furthest along (in progress, else the oldest) and cancel
+    # the others.
+    ConsultRequest = apps.get_model('consults', 'ConsultRequest')
+    open_consults = ConsultRequest.objects.filter(status__in=['pending', 'in_progress'])
+    duplicates = open_consults.values('patient_id', 'to_department_id').annotate(
+        count=Count('id')
+    ).filter(count__gt=1)
+    for group in duplicates.iterator():
+        ids = list(open_consults.filter(
+            patient_id=group['patient_id'], to_department_id=group['to_department_id']
+        ).order_by(
+            models.Case(models.When(status='in_progress', then=0), default=1), 'created_at', 'id'
+        ).values_list('id', flat=True))
+        ConsultRequest.objects.filter(id__in=ids[1:]).update(
+            status='cancelled', triage_at=None, sla_deadline=None, updated_at=timezone.now()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consults', '0007_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_open_consults, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='consultrequest',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'in_progress'])), fields=('patient', 'to_department'), name='consult_one_open'),
+        ),
+    ]
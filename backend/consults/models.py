@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+from datetime import timedelta
 
 
 class Department(models.Model):
@@ -53,11 +55,48 @@ class Patient(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='patient_created'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.hospital_id})"
 
 
+class ConsultRequestQuerySet(models.QuerySet):
+    def set_status(self, status):
+        """
+        Change the status of every consult in the queryset with one UPDATE,
+        recomputing the worklist and SLA keys that save() would maintain.
+        Returns the number of consults updated. Like any update(), this sends
+        no signals, so callers invalidate caches themselves.
+        """
+        model = self.model
+        changes = {'status': status, 'updated_at': timezone.now(), 'triage_at': None, 'sla_deadline': None}
+        if status in model.OPEN_STATUSES:
+            changes['triage_at'] = models.Case(
+                *[
+                    models.When(priority=priority, then=models.F('created_at') - models.Value(head_start))
+                    for priority, head_start in model.PRIORITY_HEAD_START.items()
+                ],
+                default=models.F('created_at'),
+                output_field=models.DateTimeField(),
+            )
+        if status == 'pending':
+            changes['sla_deadline'] = models.Case(
+                *[
+                    models.When(
+                        priority=priority, escalated_at__isnull=True,
+                        then=models.F('created_at') + models.Value(sla)
+                    )
+                    for priority, sla in model.PENDING_SLA.items()
+                ],
+                default=None,
+                output_field=models.DateTimeField(),
+            )
+        return self.update(**changes)
+
+
 class ConsultRequest(models.Model):
     """Consultation request model"""
     PRIORITY_CHOICES = [
@@ -89,14 +128,90 @@ class ConsultRequest(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     clinical_summary = models.TextField(help_text="Clinical summary of the patient")
     consult_question = models.TextField(help_text="Specific consultation question")
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set on construction rather than auto_now_add, so save() can derive
+    # triage_at and sla_deadline from the final value.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
+    triage_at = models.DateTimeField(
+        null=True,
+        editable=False,
+        help_text="Worklist sort key: creation time moved earlier by the priority's head start; empty once closed"
+    )
+    
+    OPEN_STATUSES = ['pending', 'in_progress']
+    
+    # Worklist urgency grows with waiting time; higher priorities start ahead,
+    # so a routine consult waiting over 4 hours outranks a new urgent one.
+    # Ordering by created_at minus the head start is the same ranking and
+    # doesn't change over time, so it can be stored and indexed.
+    PRIORITY_HEAD_START = {
+        'stat': timedelta(hours=24),
+        'urgent': timedelta(hours=4),
+        'routine': timedelta(0),
+    }
+    
+    sla_deadline = models.DateTimeField(
+        null=True,
+        editable=False,
+        help_text="When this consult breaches its SLA if still pending; empty once accepted, closed or escalated"
+    )
+    escalated_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    # Consults of these priorities are escalated when still pending this long.
+    PENDING_SLA = {
+        'stat': timedelta(minutes=30),
+        'urgent': timedelta(hours=4),
+    }
+    
+    objects = ConsultRequestQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='consult_created'),
+            models.Index(
+                fields=['to_department', 'triage_at', 'id'], name='consult_worklist',
+                condition=models.Q(triage_at__isnull=False)
+            ),
+            # Holds only consults that can still breach, so the escalation
+            # scanner's cost follows the number of breaches, not table size.
+            models.Index(
+                fields=['sla_deadline'], name='consult_sla_deadline',
+                condition=models.Q(sla_deadline__isnull=False)
+            ),
+        ]
+        constraints = [
+            # One open consult per patient and receiving department. Checked
+            # by the database on insert, so concurrent requests can't both
+            # get through; the statuses are OPEN_STATUSES.
+            models.UniqueConstraint(
+                fields=['patient', 'to_department'], name='consult_one_open',
+                condition=models.Q(status__in=['pending', 'in_progress'])
+            ),
+        ]
     
     def __str__(self):
         return f"Consult #{self.id}: {self.patient.name} - {self.from_department} to {self.to_department}"
+    
+    def get_triage_at(self):
+        if self.status not in self.OPEN_STATUSES:
+            return None
+        return (self.created_at or timezone.now()) - self.PRIORITY_HEAD_START.get(self.priority, timedelta(0))
+    
+    def get_sla_deadline(self):
+        sla = self.PENDING_SLA.get(self.priority)
+        if sla is None or self.status != 'pending' or self.escalated_at is not None:
+            return None
+        return (self.created_at or timezone.now()) + sla
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'priority', 'status'}.intersection(update_fields):
+            self.triage_at = self.get_triage_at()
+            self.sla_deadline = self.get_sla_deadline()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'triage_at', 'sla_deadline'}
+        super().save(*args, **kwargs)
 
 
 class ConsultComment(models.Model):
@@ -108,6 +223,103 @@ class ConsultComment(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='comment_created'),
+        ]
+    
+    def __str__(self):
+        return f"Comment by {self.author.username} on Consult #{self.consult_id}"
+
+
+class Notification(models.Model):
+    """Consult event waiting to be (or already) delivered to one recipient"""
+    EVENT_CHOICES = [
+        ('created', 'New consult'),
+        ('status_changed', 'Status changed'),
+        ('commented', 'New comment'),
+        ('escalated', 'SLA breached'),
+    ]
+    
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    consult = models.ForeignKey(ConsultRequest, on_delete=models.CASCADE, related_name='notifications')
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    message = models.CharField(max_length=500)
+    urgent = models.BooleanField(default=False, help_text="Sent immediately instead of in the next digest")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(
+                fields=['recipient', 'created_at'], name='notification_pending',
+                condition=models.Q(sent_at__isnull=True)
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_event_display()} for {self.recipient.username} on Consult #{self.consult_id}"
+
+
+class ArchivedConsult(models.Model):
+    """Compact, searchable snapshot of a closed consult moved out of the hot tables"""
+    consult_id = models.BigIntegerField(unique=True)
+    patient_hospital_id = models.CharField(max_length=50, db_index=True)
+    patient_name = models.CharField(max_length=200)
+    from_department_id = models.BigIntegerField()
+    to_department_id = models.BigIntegerField()
+    priority = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    created_at = models.DateTimeField()
+    closed_at = models.DateTimeField(help_text="Last update before archiving")
+    archived_at = models.DateTimeField(auto_now_add=True)
+    payload = models.JSONField(help_text="Consult as rendered by the API, including comments")
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['to_department_id', '-created_at'], name='archive_to_dept_created'),
+            models.Index(fields=['from_department_id', '-created_at'], name='archive_from_dept_created'),
+        ]
+    
+    def __str__(self):
+        return f"Archived consult #{self.consult_id}: {self.patient_name}"
+
+
+class Task(models.Model):
+    """Background task waiting for, or run by, the `run_tasks` worker"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=200, help_text="Registered task name")
+    queue = models.CharField(max_length=50, default='default')
+    priority = models.SmallIntegerField(default=0, help_text="Higher runs first")
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now, help_text="Not run before this time")
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Workers claim with queue = ? ORDER BY priority DESC, run_at over
+            # queued rows only, which stay few however large the table grows.
+            models.Index(
+                fields=['queue', '-priority', 'run_at'], name='task_claim',
+                condition=models.Q(status='queued')
+            ),
+            models.Index(fields=['status', 'locked_at'], name='task_status_locked'),
+        ]
     
     def __str__(self):
-        return f"Comment by {self.author.username} on Consult #{self.consult.id}"
+        return f"Task #{self.id}: {self.name} ({self.status})"
@@ -0,0 +1,215 @@
+"""
+Consult notifications.
+
+API writes only record Notification rows (one per recipient, in the same
+transaction) and queue a background task, so no request waits on delivery.
+STAT consults and SLA escalations go out on the fast `stat` queue as soon as
+a worker picks them up; everything else is collected for NOTIFICATION_DIGEST_SECONDS and sent as
+one digest per recipient. Delivery goes through the channels listed in
+NOTIFICATION_CHANNELS.
+"""
+import json
+import threading
+from collections import namedtuple
+from datetime import timedelta
+from functools import lru_cache
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import User, ConsultRequest, ConsultComment, Notification, Task
+
+
+# One outgoing message: a recipient and the notifications it covers.
+Message = namedtuple('Message', ['recipient', 'subject', 'body', 'urgent', 'notifications'])
+
+
+class Channel:
+    """Delivers messages; subclasses implement send()"""
+
+    def send(self, messages):
+        raise NotImplementedError
+
+
+class FileChannel(Channel):
+    """Appends messages as JSON lines to NOTIFICATION_FILE (a stand-in for a real transport)"""
+    _lock = threading.Lock()
+
+    def send(self, messages):
+        lines = [
+            json.dumps({
+                'to': message.recipient.username,
+                'subject': message.subject,
+                'body': message.body,
+                'urgent': message.urgent,
+                'sent_at': timezone.now().isoformat(),
+            })
+            for message in messages
+        ]
+        with self._lock, open(settings.NOTIFICATION_FILE, 'a', encoding='utf-8') as sink:
+            sink.write(''.join(line + '\n' for line in lines))
+
+
+class EmailChannel(Channel):
+    """Sends messages by email over one SMTP connection (EMAIL_HOST/EMAIL_PORT; use a local relay)"""
+
+    def send(self, messages):
+        emails = [
+            EmailMessage(message.subject, message.body, settings.DEFAULT_FROM_EMAIL, [message.recipient.email])
+            for message in messages if message.recipient.email
+        ]
+        if emails:
+            get_connection(fail_silently=False).send_messages(emails)
+
+
+@lru_cache(maxsize=None)
+def _load_channels(paths):
+    return [import_string(path)() for path in paths]
+
+
+def get_channels():
+    return _load_channels(tuple(settings.NOTIFICATION_CHANNELS))
+
+
+def _department_users(department_id, exclude):
+    return list(
+        User.objects.filter(department_id=department_id, is_active=True)
+        .exclude(pk=exclude).values_list('pk', flat=True)
+    )
+
+
+def notify(event, consult_id, actor=None):
+    """Record notifications for a consult event and queue their delivery; actor is None for system events"""
+    return notify_many(event, [consult_id], actor)
+
+
+def notify_many(event, consult_ids, actor=None):
+    """
+    Record the same event for several consults at once. Consults are loaded in
+    one query and recipients of every consult created in one INSERT, so a
+    bulk status change costs the same handful of queries as a single one.
+    """
+    consults = ConsultRequest.objects.filter(pk__in=consult_ids).values(
+        'id', 'priority', 'status', 'requested_by_id', 'to_department_id', 'created_at',
+        'patient__name', 'from_department__name', 'to_department__name'
+    )
+    actor_id = actor.pk if actor is not None else None
+    department_users = {}
+
+    def users_of(department_id, exclude):
+        if department_id not in department_users:
+            department_users[department_id] = _department_users(department_id, exclude)
+        return department_users[department_id]
+
+    pending = []
+    for consult in consults:
+        consult_id = consult['id']
+        label = f"consult #{consult_id} for {consult['patient__name']}"
+        if event == 'escalated':
+            recipients = [*users_of(consult['to_department_id'], actor_id), consult['requested_by_id']]
+            waited = int((timezone.now() - consult['created_at']).total_seconds() // 60)
+            message = f"{consult['priority'].upper()} {label} still pending after {waited} minutes"
+        elif event == 'created':
+            recipients = users_of(consult['to_department_id'], actor_id)
+            message = f"New {consult['priority'].upper()} {label} from {consult['from_department__name']}"
+        elif event == 'status_changed':
+            recipients = [consult['requested_by_id']]
+            status = dict(ConsultRequest.STATUS_CHOICES)[consult['status']]
+            message = f"{consult['to_department__name']} marked {label} as {status}"
+        else:
+            # Everyone who has taken part so far; the consulted department as a
+            # whole until someone there has replied.
+            recipients = set(
+                ConsultComment.objects.filter(consult_id=consult_id).values_list('author_id', flat=True)
+            )
+            recipients.add(consult['requested_by_id'])
+            recipients.discard(actor.pk)
+            if not recipients:
+                recipients = users_of(consult['to_department_id'], actor.pk)
+            message = f"{actor.full_name or actor.username} commented on {label}"
+
+        urgent = consult['priority'] == 'stat' or event == 'escalated'
+        pending.extend(
+            Notification(recipient_id=recipient, consult_id=consult_id, event=event, message=message, urgent=urgent)
+            for recipient in sorted(set(recipients)) if recipient != actor_id
+        )
+
+    notifications = Notification.objects.bulk_create(pending)
+    if not notifications:
+        return notifications
+
+    from .tasks import send_urgent_notifications, send_notification_digests
+    urgent_ids = [notification.pk for notification in notifications if notification.urgent]
+    if urgent_ids:
+        send_urgent_notifications.enqueue(ids=urgent_ids)
+    if len(urgent_ids) < len(notifications) and not Task.objects.filter(
+        name=send_notification_digests.name, status='queued'
+    ).exists():
+        # One pending digest task collects every event until it runs.
+        send_notification_digests.enqueue(
+            run_at=timezone.now() + timedelta(seconds=settings.NOTIFICATION_DIGEST_SECONDS)
+        )
+    return notifications
+
+
+def compose(recipient, notifications):
+    """Build the message for one recipient's pending notifications"""
+    urgent = any(notification.urgent for notification in notifications)
+    if len(notifications) == 1:
+        subject = notifications[0].message
+    else:
+        consults = len({notification.consult_id for notification in notifications})
+        subject = f"{len(notifications)} updates on {consults} consult{'s' if consults > 1 else ''}"
+    if any(notification.event == 'escalated' for notification in notifications):
+        subject = f'[ESCALATED] {subject}'
+    elif urgent:
+        subject = f'[STAT] {subject}'
+    body = '\n'.join(
+        f"{timezone.localtime(notification.created_at):%H:%M} {notification.message}"
+        for notification in notifications
+    )
+    return Message(recipient, subject, body, urgent, notifications)
+
+
+def _send(messages, ids):
+    try:
+        for channel in get_channels():
+            channel.send(messages)
+    except Exception:
+        # Hand the rows back so the retried task delivers them.
+        Notification.objects.filter(pk__in=ids).update(sent_at=None)
+        raise
+
+
+def dispatch(queryset):
+    """
+    Deliver pending notifications from queryset, grouped per recipient, in
+    batches of NOTIFICATION_BATCH_SIZE; returns the number of messages sent.
+    Rows are locked and marked sent in a short transaction (skipping rows
+    another worker holds), and messages go out once it commits, so no lock
+    is held while a channel is slow. If sending fails the rows are marked
+    unsent again, so each is delivered at least once.
+    """
+    sent = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                queryset.filter(sent_at__isnull=True)
+                .select_related('recipient')
+                .select_for_update(skip_locked=True, of=('self',))
+                .order_by('recipient_id', 'created_at')[:settings.NOTIFICATION_BATCH_SIZE]
+            )
+            if not batch:
+                return sent
+            messages = [
+                compose(recipient, list(items))
+                for recipient, items in groupby(batch, key=lambda notification: notification.recipient)
+            ]
+            ids = [notification.pk for notification in batch]
+            Notification.objects.filter(pk__in=ids).update(sent_at=timezone.now())
+            transaction.on_commit(lambda messages=messages, ids=ids: _send(messages, ids))
+        sent += len(messages)
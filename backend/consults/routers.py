@@ -0,0 +1,84 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+
+# Replica alias the current request may read from; None means the primary.
+_read_alias = ContextVar('consults_read_alias', default=None)
+
+
+def current_read_alias():
+    """Return the replica the current request reads from, or None for the primary"""
+    return _read_alias.get()
+
+
+def replica_aliases():
+    """Return the configured read replica aliases"""
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+def _pin_key(user):
+    return f'consults:primary-pin:{user.pk}'
+
+
+def pin_to_primary(user):
+    """Send the user's reads to the primary until their writes have replicated"""
+    cache.set(_pin_key(user), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user):
+    return bool(cache.get(_pin_key(user)))
+
+
+def read_alias_for(request):
+    """Return the replica a request may read from, or None to use the primary"""
+    if request.method not in SAFE_METHODS:
+        return None
+    replicas = replica_aliases()
+    if not replicas:
+        return None
+    user = request.user
+    if user and user.is_authenticated and is_pinned(user):
+        return None
+    return random.choice(replicas)
+
+
+class ReplicaRouter:
+    """Route reads to the replica chosen for the current request, writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        # Only application data is routed; cache and session tables stay on the primary.
+        if model._meta.app_label != 'consults':
+            return None
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class ReplicaReadMixin:
+    """
+    Viewset mixin that serves safe requests from a read replica and pins users
+    to the primary for REPLICA_STICKY_SECONDS after any write, so they always
+    read their own writes.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _read_alias.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            _read_alias.set(read_alias_for(request))
+        elif request.user and request.user.is_authenticated:
+            pin_to_primary(request.user)
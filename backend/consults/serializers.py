@@ -1,5 +1,33 @@
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from .models import Department, User, Patient, ConsultRequest, ConsultComment
+from .models import Department, User, Patient, ConsultRequest, ConsultComment, ArchivedConsult
+from .notifications import notify
+
+
+class DynamicFieldsMixin:
+    """Serializer mixin that accepts a `fields` argument limiting the output fields"""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        # Serializers taking input keep every field, so `fields` never drops
+        # what a create or update sends; only their output is trimmed.
+        self._output_fields = None
+        if fields is None:
+            return
+        if 'data' in kwargs:
+            self._output_fields = set(fields)
+            return
+        for name in set(self.fields) - set(fields):
+            self.fields.pop(name)
+
+    @property
+    def data(self):
+        data = super().data
+        if self._output_fields is not None:
+            for name in set(data) - self._output_fields:
+                del data[name]
+        return data
 
 
 class DepartmentSerializer(serializers.ModelSerializer):
@@ -18,14 +46,14 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Patient
         fields = ['id', 'hospital_id', 'name', 'age', 'gender', 'bed_ward_info', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
 
-class ConsultCommentSerializer(serializers.ModelSerializer):
+class ConsultCommentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     author_name = serializers.CharField(source='author.full_name', read_only=True)
     author_username = serializers.CharField(source='author.username', read_only=True)
     
@@ -35,7 +63,7 @@ class ConsultCommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'author']
 
 
-class ConsultRequestSerializer(serializers.ModelSerializer):
+class ConsultRequestSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     patient_details = PatientSerializer(source='patient', read_only=True)
     from_department_name = serializers.CharField(source='from_department.name', read_only=True)
     to_department_name = serializers.CharField(source='to_department.name', read_only=True)
@@ -49,9 +77,22 @@ class ConsultRequestSerializer(serializers.ModelSerializer):
             'id', 'patient', 'patient_details', 'from_department', 'from_department_name',
             'to_department', 'to_department_name', 'requested_by', 'requested_by_name',
             'priority', 'status', 'clinical_summary', 'consult_question',
-            'created_at', 'updated_at', 'comments', 'comment_count'
+            'created_at', 'updated_at', 'escalated_at', 'comments', 'comment_count'
         ]
         read_only_fields = ['created_at', 'updated_at', 'requested_by', 'from_department']
+        expandable_fields = ['patient_details', 'comments']
+        # The consult_one_open constraint is left to the database (see
+        # update()) rather than checked with a racing query first.
+        validators = []
+    
+    def update(self, instance, validated_data):
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                'The patient already has an open consult with this department.'
+            )
     
     def create(self, validated_data):
         # Automatically set from_department and requested_by from current user
@@ -74,10 +115,14 @@ class ConsultRequestCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ConsultRequest
         fields = [
-            'patient', 'patient_data', 'to_department', 'priority', 
+            'id', 'patient', 'patient_data', 'to_department', 'priority', 
             'clinical_summary', 'consult_question'
         ]
     
+    # Set by create(): True if an open consult for the same patient and
+    # department already existed and was returned instead.
+    existing = False
+    
     def validate(self, data):
         """Ensure either patient or patient_data is provided"""
         if not data.get('patient') and not data.get('patient_data'):
@@ -86,6 +131,7 @@ class ConsultRequestCreateSerializer(serializers.ModelSerializer):
             )
         return data
     
+    @transaction.atomic
     def create(self, validated_data):
         patient_data = validated_data.pop('patient_data', None)
         
@@ -100,4 +146,30 @@ class ConsultRequestCreateSerializer(serializers.ModelSerializer):
             validated_data['requested_by'] = request.user
             validated_data['from_department'] = request.user.department
         
-        return super().create(validated_data)
+        try:
+            with transaction.atomic():
+                consult = super().create(validated_data)
+        except IntegrityError:
+            # The consult_one_open constraint: the patient already has an
+            # open consult with this department, so hand that one back.
+            consult = ConsultRequest.objects.filter(
+                patient=validated_data['patient'],
+                to_department=validated_data['to_department'],
+                status__in=ConsultRequest.OPEN_STATUSES
+            ).first()
+            if consult is None:
+                raise
+            self.existing = True
+            return consult
+        if request and request.user:
+            # Only records the notifications; delivery runs in the task worker.
+            notify('created', consult.pk, request.user)
+        return consult
+
+
+class ArchivedConsultSerializer(serializers.ModelSerializer):
+    consult = serializers.JSONField(source='payload', read_only=True)
+    
+    class Meta:
+        model = ArchivedConsult
+        fields = ['id', 'consult_id', 'archived_at', 'consult']
@@ -0,0 +1,141 @@
+"""
+Database-backed background task queue.
+
+Tasks are rows in the Task table, so the queue needs nothing but the database
+the application already uses. Functions decorated with `@task` can be queued
+with `func.enqueue(**kwargs)`; the `run_tasks` management command claims due
+tasks with SELECT ... FOR UPDATE SKIP LOCKED (so any number of workers can
+share a queue without blocking one another), runs them in a thread pool per
+queue and retries failures with exponential backoff. Workers renew the lock
+on the tasks they are running every TASK_HEARTBEAT_SECONDS; a task whose lock
+is older than TASK_LOCK_TIMEOUT is taken to have lost its worker and is
+requeued.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class TaskFunction:
+    """A registered task; call it to run inline, or `enqueue()` it"""
+
+    def __init__(self, func, name, queue, priority, max_attempts):
+        self.func = func
+        self.name = name
+        self.queue = queue
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def enqueue(self, priority=None, run_at=None, queue=None, **kwargs):
+        """Queue the task with the given JSON-serializable kwargs"""
+        return enqueue(self.name, kwargs, queue=queue or self.queue,
+                       priority=self.priority if priority is None else priority,
+                       run_at=run_at, max_attempts=self.max_attempts)
+
+
+def task(name=None, queue='default', priority=0, max_attempts=None):
+    """Register a function as a background task"""
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__qualname__}'
+        registry[task_name] = TaskFunction(
+            func, task_name, queue, priority, max_attempts or settings.TASK_MAX_ATTEMPTS
+        )
+        return registry[task_name]
+    return decorator
+
+
+def enqueue(name, kwargs=None, queue='default', priority=0, run_at=None, max_attempts=None):
+    """Insert a task row; as part of the caller's transaction, so it only exists if that commits"""
+    return Task.objects.create(
+        name=name,
+        kwargs=kwargs or {},
+        queue=queue,
+        priority=priority,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+    )
+
+
+def claim(queue, limit, worker_id):
+    """Lock and mark up to `limit` due tasks from a queue as running"""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Task.objects.filter(queue=queue, status='queued', run_at__lte=now)
+            .order_by('-priority', 'run_at')
+            .select_for_update(skip_locked=True)
+            .values_list('pk', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        Task.objects.filter(pk__in=ids).update(
+            status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+        )
+    return list(Task.objects.filter(pk__in=ids).order_by('-priority', 'run_at'))
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number `attempts`, with +/-10% jitter"""
+    delay = min(settings.TASK_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.TASK_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.9, 1.1)
+
+
+def execute(task_row):
+    """Run a claimed task and record the outcome; returns the final status"""
+    try:
+        function = registry[task_row.name]
+        function(**task_row.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Task %s #%s failed (attempt %s/%s)', task_row.name, task_row.pk,
+                       task_row.attempts, task_row.max_attempts)
+        if task_row.attempts < task_row.max_attempts:
+            run_at = timezone.now() + timedelta(seconds=backoff(task_row.attempts))
+            Task.objects.filter(pk=task_row.pk).update(
+                status='queued', run_at=run_at, locked_by='', locked_at=None, last_error=error
+            )
+            return 'queued'
+        Task.objects.filter(pk=task_row.pk).update(
+            status='failed', finished_at=timezone.now(), locked_by='', locked_at=None, last_error=error
+        )
+        return 'failed'
+
+    Task.objects.filter(pk=task_row.pk).update(status='done', finished_at=timezone.now(), locked_by='', locked_at=None)
+    return 'done'
+
+
+def heartbeat(ids, worker_id):
+    """Renew this worker's lock on tasks it is still running, so they aren't taken for lost"""
+    if not ids:
+        return 0
+    return Task.objects.filter(pk__in=ids, status='running', locked_by=worker_id).update(
+        locked_at=timezone.now()
+    )
+
+
+def requeue_stale(timeout=None):
+    """Return tasks whose worker died mid-run to the queue; returns how many"""
+    timeout = settings.TASK_LOCK_TIMEOUT if timeout is None else timeout
+    now = timezone.now()
+    stale = Task.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=timeout))
+    # A task that keeps killing its worker must not be retried forever.
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', finished_at=now, locked_by='', locked_at=None, last_error='Worker lost while running'
+    )
+    return stale.update(status='queued', locked_by='', locked_at=None, run_at=now)
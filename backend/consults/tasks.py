@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Task, Notification
+from .notifications import dispatch
+from .taskqueue import task
+
+
+@task(name='consults.purge_finished_tasks', queue='maintenance')
+def purge_finished_tasks(days=7):
+    """Delete finished tasks older than `days`, keeping failures for inspection"""
+    cutoff = timezone.now() - timedelta(days=days)
+    Task.objects.filter(status='done', finished_at__lt=cutoff).delete()
+
+
+def schedule_purge():
+    """Queue purge_finished_tasks unless one is already waiting or running"""
+    if not Task.objects.filter(name=purge_finished_tasks.name, status__in=('queued', 'running')).exists():
+        purge_finished_tasks.enqueue()
+
+
+@task(name='consults.send_urgent_notifications', queue='stat', priority=100)
+def send_urgent_notifications(ids):
+    """Send notifications for STAT consults straight away"""
+    dispatch(Notification.objects.filter(pk__in=ids))
+
+
+@task(name='consults.send_notification_digests', queue='notifications')
+def send_notification_digests():
+    """Send every pending notification, one digest per recipient"""
+    dispatch(Notification.objects.all())
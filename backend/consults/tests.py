@@ -1,9 +1,9 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, LiveServerTestCase
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from .models import Department, User, Patient, ConsultRequest, ConsultComment
+from .models import Department, User, Patient, ConsultRequest, ConsultComment, ArchivedConsult, Task
 from .serializers import (
     DepartmentSerializer, UserSerializer, PatientSerializer,
     ConsultRequestSerializer, ConsultCommentSerializer
@@ -370,6 +370,8 @@ class ConsultRequestAPITestCase(APITestCase):
     """Test consultation request endpoints"""
     
     def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
         # Create departments
         self.medicine_dept = Department.objects.create(name='Medicine', code='MED')
         self.cardio_dept = Department.objects.create(name='Cardiology', code='CARD')
@@ -618,6 +620,97 @@ class ConsultRequestAPITestCase(APITestCase):
         consult.refresh_from_db()
         self.assertEqual(consult.status, 'in_progress')
     
+    def test_update_consult_status_conflict(self):
+        """Test a status change based on an outdated updated_at is refused"""
+        consult = ConsultRequest.objects.create(
+            patient=self.patient,
+            from_department=self.medicine_dept,
+            to_department=self.cardio_dept,
+            requested_by=self.medicine_doctor,
+            clinical_summary='Test',
+            consult_question='Test'
+        )
+        url = reverse('consult-update-status', kwargs={'pk': consult.id})
+        seen = self.client.get(reverse('consult-detail', kwargs={'pk': consult.id})).data['updated_at']
+        
+        response = self.client.patch(url, {'status': 'in_progress', 'updated_at': seen}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        # Replaying another change made against the same version conflicts.
+        response = self.client.patch(url, {'status': 'cancelled', 'updated_at': seen}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['consult']['status'], 'in_progress')
+        consult.refresh_from_db()
+        self.assertEqual(consult.status, 'in_progress')
+        
+        response = self.client.patch(url, {'status': 'cancelled', 'updated_at': 'yesterday'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_create_duplicate_open_consult_returns_existing(self):
+        """Test a second open consult for the same patient and department returns the first"""
+        url = reverse('consult-list')
+        data = {
+            'patient': self.patient.id,
+            'to_department': self.cardio_dept.id,
+            'priority': 'urgent',
+            'clinical_summary': 'Chest pain',
+            'consult_question': 'Please evaluate'
+        }
+        first = self.client.post(url, data, format='json')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        
+        self.client.force_authenticate(user=self.cardio_doctor)
+        second = self.client.post(url, dict(data, priority='stat'), format='json')
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(second.data['priority'], 'urgent')
+        self.assertEqual(ConsultRequest.objects.count(), 1)
+        
+        # A department that can't see the open consult only learns its id.
+        surgeon = User.objects.create_user(
+            username='surgeon', password='testpass123', full_name='Dr. Surgery',
+            department=self.surgery_dept, role='doctor'
+        )
+        self.client.force_authenticate(user=surgeon)
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['id'], first.data['id'])
+        for field in ('patient', 'priority', 'clinical_summary', 'consult_question'):
+            self.assertNotIn(field, response.data)
+        self.assertEqual(ConsultRequest.objects.count(), 1)
+        
+        # Another department, or once the first is closed, opens a new consult.
+        response = self.client.post(url, dict(data, to_department=self.surgery_dept.id), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        ConsultRequest.objects.filter(pk=first.data['id']).update(status='completed')
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(ConsultRequest.objects.count(), 3)
+    
+    def test_open_consult_unique_in_database(self):
+        """Test the database itself refuses a second open consult, and reopening one"""
+        from django.db import IntegrityError, transaction
+        
+        fields = dict(
+            patient=self.patient, from_department=self.medicine_dept, to_department=self.cardio_dept,
+            requested_by=self.medicine_doctor, clinical_summary='Test', consult_question='Test'
+        )
+        ConsultRequest.objects.create(**fields)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ConsultRequest.objects.create(**fields, status='in_progress')
+        closed = ConsultRequest.objects.create(**fields, status='cancelled')
+        
+        response = self.client.patch(
+            reverse('consult-update-status', kwargs={'pk': closed.id}), {'status': 'pending'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        response = self.client.patch(
+            reverse('consult-detail', kwargs={'pk': closed.id}), {'status': 'pending'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        closed.refresh_from_db()
+        self.assertEqual(closed.status, 'cancelled')
+    
     def test_update_consult_status_invalid(self):
         """Test updating consultation status with invalid value"""
         consult = ConsultRequest.objects.create(
@@ -912,3 +1005,2186 @@ class EdgeCaseTestCase(APITestCase):
         consult.refresh_from_db()
         self.assertEqual(consult.priority, 'urgent')
         self.assertEqual(consult.clinical_summary, 'Original summary')
+
+
+class DatabaseHealthTestCase(APITestCase):
+    """Test database health endpoint and connection pool metrics"""
+    
+    def test_health_endpoint_reports_database(self):
+        """Test health check is public and reports database latency"""
+        url = reverse('health')
+        response = self.client.get(url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'ok')
+        self.assertTrue(response.data['database']['ok'])
+        self.assertIn('latency_ms', response.data['database'])
+        self.assertIn('connections_opened', response.data['pool'])
+    
+    def test_health_endpoint_hides_database_errors(self):
+        """Test a failing database is reported without the driver's message"""
+        from unittest import mock
+        from django.db import OperationalError
+        
+        error = OperationalError('could not connect to server at "db.internal" as user "postgres"')
+        with mock.patch('django.db.backends.base.base.BaseDatabaseWrapper.cursor', side_effect=error), \
+                self.assertLogs('consults.dbpool', level='ERROR'):
+            response = self.client.get(reverse('health'))
+        
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.data['database'], {'ok': False, 'error': 'Database unavailable'})
+        self.assertNotIn('db.internal', response.content.decode())
+    
+    def test_pool_stats_persistent_mode(self):
+        """Test pool stats expose connection reuse settings without a pool"""
+        from .dbpool import pool_stats
+        
+        stats = pool_stats()
+        self.assertEqual(stats['mode'], 'persistent')
+        self.assertIn('conn_max_age', stats)
+        self.assertTrue(stats['health_checks'])
+    
+    def test_bench_db_connections_command(self):
+        """Test connection benchmark restores connection settings"""
+        from django.core.management import call_command
+        from django.db import connection
+        from io import StringIO
+        
+        max_age = connection.settings_dict['CONN_MAX_AGE']
+        out = StringIO()
+        call_command('bench_db_connections', requests=5, stdout=out)
+        
+        self.assertIn('per-request', out.getvalue())
+        self.assertIn('persistent', out.getvalue())
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], max_age)
+
+
+class ReplicaRoutingTestCase(APITestCase):
+    """Test read replica routing and read-your-writes stickiness"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.doctor = User.objects.create_user(
+            username='doc1',
+            password='pass',
+            department=self.med_dept
+        )
+        self.patient = Patient.objects.create(
+            hospital_id='MRN001',
+            name='John Doe',
+            age=45,
+            gender='M'
+        )
+        self.consult = ConsultRequest.objects.create(
+            patient=self.patient,
+            from_department=self.med_dept,
+            to_department=self.card_dept,
+            requested_by=self.doctor,
+            clinical_summary='Test',
+            consult_question='Test'
+        )
+        self.client.force_authenticate(user=self.doctor)
+    
+    def _request(self, method):
+        from rest_framework.test import APIRequestFactory
+        from rest_framework.request import Request
+        
+        request = Request(getattr(APIRequestFactory(), method)('/api/consults/'))
+        request.user = self.doctor
+        return request
+    
+    def test_router_defaults_to_primary(self):
+        """Test reads outside replica-aware views go to the primary"""
+        from .routers import ReplicaRouter
+        
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(ConsultRequest))
+        self.assertEqual(router.db_for_write(ConsultRequest), 'default')
+    
+    def test_safe_reads_use_replica(self):
+        """Test GET requests read from a configured replica"""
+        from unittest import mock
+        from .routers import read_alias_for
+        
+        with mock.patch('consults.routers.replica_aliases', return_value=['replica1']):
+            request = self._request('get')
+            self.assertEqual(read_alias_for(request), 'replica1')
+            
+            request = self._request('post')
+            self.assertIsNone(read_alias_for(request))
+    
+    def test_write_pins_user_to_primary(self):
+        """Test users read from the primary right after writing"""
+        from unittest import mock
+        from .routers import is_pinned, read_alias_for
+        
+        self.assertFalse(is_pinned(self.doctor))
+        url = reverse('consult-add-comment', kwargs={'pk': self.consult.id})
+        response = self.client.post(url, {'message': 'On my way'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(is_pinned(self.doctor))
+        
+        with mock.patch('consults.routers.replica_aliases', return_value=['replica1']):
+            request = self._request('get')
+            self.assertIsNone(read_alias_for(request))
+    
+    def test_replica_reads_through_viewsets(self):
+        """Test viewsets serve reads when routed through the replica path"""
+        from unittest import mock
+        
+        with mock.patch('consults.routers.replica_aliases', return_value=['default']):
+            response = self.client.get(reverse('consult-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+
+
+class RendererTestCase(APITestCase):
+    """Test fast JSON renderer and parser"""
+    
+    def setUp(self):
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.doctor = User.objects.create_user(
+            username='doc1',
+            password='pass',
+            full_name='Dr. Ünal',
+            department=self.med_dept
+        )
+        self.patient = Patient.objects.create(
+            hospital_id='MRN001',
+            name='John Doe',
+            age=45,
+            gender='M'
+        )
+        consult = ConsultRequest.objects.create(
+            patient=self.patient,
+            from_department=self.med_dept,
+            to_department=self.card_dept,
+            requested_by=self.doctor,
+            clinical_summary='Line one\u2028line two',
+            consult_question='Test'
+        )
+        ConsultComment.objects.create(consult=consult, author=self.doctor, message='Seen – plan ECG')
+        self.client.force_authenticate(user=self.doctor)
+    
+    def test_fast_renderer_matches_json_renderer(self):
+        """Test FastJSONRenderer output is byte-identical to JSONRenderer"""
+        from datetime import datetime, timezone
+        from decimal import Decimal
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+        
+        data = ConsultRequestSerializer(ConsultRequest.objects.all(), many=True).data
+        extra = {'when': datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc), 'dose': Decimal('1.50'), 1: None}
+        for payload in (data, extra, {'results': []}):
+            self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+    
+    def test_fast_renderer_indent_falls_back(self):
+        """Test indented output is delegated to the stdlib renderer"""
+        from .renderers import FastJSONRenderer
+        
+        body = FastJSONRenderer().render({'a': 1}, 'application/json; indent=2')
+        self.assertEqual(body, b'{\n  "a": 1\n}')
+    
+    def test_fast_renderer_without_orjson(self):
+        """Test renderer and parser fall back to stdlib json"""
+        from io import BytesIO
+        from unittest import mock
+        from .renderers import FastJSONRenderer, FastJSONParser
+        
+        with mock.patch('consults.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render({'a': 1}), b'{"a":1}')
+            self.assertEqual(FastJSONParser().parse(BytesIO(b'{"a": 1}')), {'a': 1})
+    
+    def test_fast_parser(self):
+        """Test FastJSONParser parses request bodies and rejects invalid JSON"""
+        from io import BytesIO
+        from rest_framework.exceptions import ParseError
+        from .renderers import FastJSONParser
+        
+        self.assertEqual(FastJSONParser().parse(BytesIO('{"message": "Grüße"}'.encode())), {'message': 'Grüße'})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b'{"message": '))
+    
+    def test_api_uses_fast_renderer(self):
+        """Test API responses are rendered by FastJSONRenderer"""
+        from .renderers import FastJSONRenderer
+        
+        response = self.client.get(reverse('consult-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(response.json()['results'][0]['comments'][0]['message'], 'Seen – plan ECG')
+    
+    def test_bench_renderers_command(self):
+        """Test renderer benchmark runs and leaves no fixture rows behind"""
+        from django.core.management import call_command
+        from io import StringIO
+        
+        out = StringIO()
+        call_command('bench_renderers', consults=3, comments=2, iterations=2, stdout=out)
+        
+        self.assertIn('stdlib json', out.getvalue())
+        self.assertEqual(ConsultRequest.objects.count(), 1)
+
+
+class CompiledSerializerTestCase(APITestCase):
+    """Test precompiled serializers produce identical output"""
+    
+    def setUp(self):
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.doctor = User.objects.create_user(
+            username='doc1',
+            password='pass',
+            full_name='Dr. Test',
+            department=self.med_dept
+        )
+        self.cardiologist = User.objects.create_user(
+            username='doc2',
+            password='pass',
+            department=self.card_dept
+        )
+        for index in range(3):
+            patient = Patient.objects.create(
+                hospital_id=f'MRN00{index}',
+                name=f'Patient {index}',
+                age=40 + index,
+                gender='F',
+                bed_ward_info='Ward A' if index else ''
+            )
+            consult = ConsultRequest.objects.create(
+                patient=patient,
+                from_department=self.med_dept,
+                to_department=self.card_dept,
+                requested_by=self.doctor,
+                priority='stat',
+                clinical_summary='Summary',
+                consult_question='Question'
+            )
+            for n in range(index):
+                ConsultComment.objects.create(consult=consult, author=self.cardiologist, message=f'Note {n}')
+        self.client.force_authenticate(user=self.doctor)
+    
+    def _assert_identical(self, serializer_class, queryset):
+        from rest_framework.renderers import JSONRenderer
+        from .compiled import CompiledSerializer
+        
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        actual = JSONRenderer().render(CompiledSerializer(serializer_class).serialize(queryset))
+        self.assertEqual(actual, expected)
+    
+    def test_consult_serializer_equivalence(self):
+        """Test compiled consult output matches ConsultRequestSerializer byte for byte"""
+        self._assert_identical(ConsultRequestSerializer, ConsultRequest.objects.all())
+    
+    def test_flat_serializers_equivalence(self):
+        """Test compiled patient, department and comment output"""
+        self._assert_identical(PatientSerializer, Patient.objects.all())
+        self._assert_identical(DepartmentSerializer, Department.objects.all())
+        self._assert_identical(ConsultCommentSerializer, ConsultComment.objects.all())
+    
+    def test_null_relation_fields_are_skipped(self):
+        """Test fields behind a null foreign key are omitted like DRF does"""
+        User.objects.create_user(username='nodept', password='pass')
+        self._assert_identical(UserSerializer, User.objects.order_by('id'))
+    
+    def test_compiled_count_without_list(self):
+        """Test counts use a subquery when the list itself is not rendered"""
+        from rest_framework import serializers as drf_serializers
+        
+        class CountOnlySerializer(drf_serializers.ModelSerializer):
+            comment_count = drf_serializers.IntegerField(source='comments.count', read_only=True)
+            
+            class Meta:
+                model = ConsultRequest
+                fields = ['id', 'comment_count']
+        
+        self._assert_identical(CountOnlySerializer, ConsultRequest.objects.all())
+    
+    def test_unsupported_field_raises(self):
+        """Test serializers with method fields are rejected at compile time"""
+        from rest_framework import serializers as drf_serializers
+        from .compiled import CompiledSerializer, CompileError
+        
+        class MethodSerializer(drf_serializers.ModelSerializer):
+            label = drf_serializers.SerializerMethodField()
+            
+            class Meta:
+                model = Patient
+                fields = ['id', 'label']
+        
+        with self.assertRaises(CompileError):
+            CompiledSerializer(MethodSerializer)
+    
+    def test_list_endpoint_matches_drf(self):
+        """Test /api/consults/ returns the same bytes with and without compilation"""
+        url = reverse('consult-list')
+        # Both requests must be computed, not served from the list cache.
+        with self.settings(CONSULT_LIST_CACHE_TIMEOUT=0, COALESCE_GET_REQUESTS=False):
+            compiled = self.client.get(url, {'role': 'outgoing'})
+            with self.settings(COMPILED_SERIALIZERS=False):
+                plain = self.client.get(url, {'role': 'outgoing'})
+        
+        self.assertEqual(compiled.status_code, status.HTTP_200_OK)
+        self.assertEqual(compiled.data['count'], 3)
+        self.assertEqual(compiled.content, plain.content)
+    
+    def test_compiled_forms_are_bounded(self):
+        """Test clients choosing ever new ?fields= can't grow the compiled serializer cache without limit"""
+        from itertools import combinations
+        from .compiled import compile_serializer
+        from .serializers import ConsultRequestSerializer
+        
+        names = ['id', 'priority', 'status', 'created_at', 'updated_at', 'clinical_summary', 'consult_question']
+        for size in range(1, len(names) + 1):
+            for fields in combinations(names, size):
+                compile_serializer(ConsultRequestSerializer, frozenset(fields))
+        self.assertLessEqual(compile_serializer.cache_info().currsize, 128)
+    
+    def test_bench_serializers_command(self):
+        """Test serializer benchmark reports identical output"""
+        from django.core.management import call_command
+        from io import StringIO
+        
+        out = StringIO()
+        call_command('bench_serializers', consults=2, comments=2, iterations=1, stdout=out)
+        self.assertIn('Output identical: True', out.getvalue())
+
+
+class SparseFieldsetTestCase(APITestCase):
+    """Test ?fields= and ?expand= support"""
+    
+    def setUp(self):
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.doctor = User.objects.create_user(
+            username='doc1',
+            password='pass',
+            full_name='Dr. Test',
+            department=self.med_dept
+        )
+        self.patient = Patient.objects.create(
+            hospital_id='MRN001',
+            name='John Doe',
+            age=45,
+            gender='M'
+        )
+        self.consult = ConsultRequest.objects.create(
+            patient=self.patient,
+            from_department=self.med_dept,
+            to_department=self.card_dept,
+            requested_by=self.doctor,
+            clinical_summary='Test',
+            consult_question='Test'
+        )
+        ConsultComment.objects.create(consult=self.consult, author=self.doctor, message='First')
+        self.client.force_authenticate(user=self.doctor)
+    
+    def test_writes_with_fields_keep_every_input(self):
+        """Test ?fields= trims what a create or update returns, never what it saves"""
+        url = reverse('patient-list') + '?fields=id,name'
+        response = self.client.post(
+            url, {'hospital_id': 'MRN002', 'name': 'Jane Roe', 'age': 60, 'gender': 'F'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(set(response.data), {'id', 'name'})
+        self.assertEqual(Patient.objects.get(pk=response.data['id']).age, 60)
+        
+        url = reverse('patient-detail', args=[self.patient.id]) + '?fields=name'
+        response = self.client.patch(url, {'age': 99}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'name'})
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.age, 99)
+        
+        url = reverse('consult-detail', args=[self.consult.id]) + '?fields=id'
+        response = self.client.patch(url, {'clinical_summary': 'Changed summary'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'id': self.consult.id})
+        self.consult.refresh_from_db()
+        self.assertEqual(self.consult.clinical_summary, 'Changed summary')
+    
+    def test_list_with_fields(self):
+        """Test list returns only requested fields"""
+        url = reverse('consult-list')
+        response = self.client.get(url, {'fields': 'id,status,to_department_name'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'status', 'to_department_name'})
+    
+    def test_detail_with_fields_and_expand(self):
+        """Test detail combines fields with explicit expansion"""
+        url = reverse('consult-detail', kwargs={'pk': self.consult.id})
+        response = self.client.get(url, {'fields': 'id,comment_count', 'expand': 'patient_details'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'id', 'comment_count', 'patient_details'})
+        self.assertEqual(response.data['comment_count'], 1)
+        self.assertEqual(response.data['patient_details']['name'], 'John Doe')
+    
+    def test_expand_only_drops_unexpanded_nested_fields(self):
+        """Test ?expand= without fields omits nested fields not named"""
+        url = reverse('consult-detail', kwargs={'pk': self.consult.id})
+        response = self.client.get(url, {'expand': 'comments'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('patient_details', response.data)
+        self.assertEqual(len(response.data['comments']), 1)
+        self.assertIn('clinical_summary', response.data)
+    
+    def test_no_params_returns_full_representation(self):
+        """Test clients without parameters still get every field"""
+        url = reverse('consult-detail', kwargs={'pk': self.consult.id})
+        response = self.client.get(url)
+        
+        self.assertIn('patient_details', response.data)
+        self.assertIn('comments', response.data)
+    
+    def test_unknown_field_rejected(self):
+        """Test unknown field names return 400"""
+        response = self.client.get(reverse('consult-list'), {'fields': 'id,bogus'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_fields_shape_queryset(self):
+        """Test requested fields limit the loaded columns and joins"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        url = reverse('consult-detail', kwargs={'pk': self.consult.id})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'fields': 'id,status'})
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('clinical_summary', sql)
+        self.assertNotIn('consults_patient', sql)
+        self.assertNotIn('consults_consultcomment', sql)
+    
+    def test_comments_action_with_fields(self):
+        """Test the comments action honours ?fields="""
+        url = reverse('consult-comments', kwargs={'pk': self.consult.id})
+        response = self.client.get(url, {'fields': 'id,author_name,message'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{'id': response.data[0]['id'], 'author_name': 'Dr. Test', 'message': 'First'}])
+    
+    def test_patient_list_with_fields(self):
+        """Test patient list honours ?fields="""
+        response = self.client.get(reverse('patient-list'), {'fields': 'id,name'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{'id': self.patient.id, 'name': 'John Doe'}])
+
+
+class ArchiveConsultsTestCase(APITestCase):
+    """Test archive_consults command and archive search"""
+    
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.doctor = User.objects.create_user(
+            username='doc1',
+            password='pass',
+            department=self.med_dept
+        )
+        self.patient = Patient.objects.create(
+            hospital_id='MRN001',
+            name='John Doe',
+            age=45,
+            gender='M'
+        )
+        old = timezone.now() - timedelta(days=400)
+        self.consults = {}
+        for state in ['completed', 'cancelled', 'pending']:
+            consult = ConsultRequest.objects.create(
+                patient=self.patient,
+                from_department=self.med_dept,
+                to_department=self.card_dept,
+                requested_by=self.doctor,
+                status=state,
+                clinical_summary='Test',
+                consult_question='Test'
+            )
+            ConsultComment.objects.create(consult=consult, author=self.doctor, message=f'{state} note')
+            ConsultRequest.objects.filter(pk=consult.pk).update(updated_at=old)
+            self.consults[state] = consult
+        self.recent = ConsultRequest.objects.create(
+            patient=self.patient,
+            from_department=self.med_dept,
+            to_department=self.card_dept,
+            requested_by=self.doctor,
+            status='completed',
+            clinical_summary='Test',
+            consult_question='Test'
+        )
+        self.client.force_authenticate(user=self.doctor)
+    
+    def test_archive_moves_old_closed_consults(self):
+        """Test only old completed/cancelled consults are moved, in batches"""
+        from django.core.management import call_command
+        from io import StringIO
+        
+        out = StringIO()
+        call_command('archive_consults', older_than_days=365, batch_size=1, stdout=out)
+        
+        self.assertEqual(ArchivedConsult.objects.count(), 2)
+        self.assertEqual(
+            set(ConsultRequest.objects.values_list('pk', flat=True)),
+            {self.consults['pending'].pk, self.recent.pk}
+        )
+        self.assertFalse(ConsultComment.objects.filter(consult_id=self.consults['completed'].pk).exists())
+        archived = ArchivedConsult.objects.get(consult_id=self.consults['completed'].pk)
+        self.assertEqual(archived.payload['comments'][0]['message'], 'completed note')
+        self.assertEqual(archived.patient_hospital_id, 'MRN001')
+        self.assertIn('Archived 2 consults', out.getvalue())
+    
+    def test_archive_dry_run(self):
+        """Test dry run reports without moving anything"""
+        from django.core.management import call_command
+        from io import StringIO
+        
+        out = StringIO()
+        call_command('archive_consults', dry_run=True, stdout=out)
+        
+        self.assertIn('2 consults would be archived', out.getvalue())
+        self.assertEqual(ArchivedConsult.objects.count(), 0)
+    
+    def test_search_archive(self):
+        """Test archived consults are searchable and department scoped"""
+        from django.core.management import call_command
+        from io import StringIO
+        
+        call_command('archive_consults', stdout=StringIO())
+        url = reverse('archived-consult-list')
+        response = self.client.get(url, {'search': 'MRN001'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['results'][0]['consult']['patient_details']['name'], 'John Doe')
+        
+        outsider = User.objects.create_user(
+            username='doc3',
+            password='pass',
+            department=Department.objects.create(name='Surgery', code='SURG')
+        )
+        self.client.force_authenticate(user=outsider)
+        self.assertEqual(self.client.get(url).data['count'], 0)
+
+
+class ConsultListCacheTestCase(APITestCase):
+    """Test department-scoped consult list cache"""
+    
+    def setUp(self):
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.surg_dept = Department.objects.create(name='Surgery', code='SURG')
+        self.doctor = User.objects.create_user(
+            username='doc1',
+            password='pass',
+            department=self.med_dept
+        )
+        self.cardiologist = User.objects.create_user(
+            username='doc2',
+            password='pass',
+            department=self.card_dept
+        )
+        self.patient = Patient.objects.create(
+            hospital_id='MRN001',
+            name='John Doe',
+            age=45,
+            gender='M'
+        )
+        self.consult = ConsultRequest.objects.create(
+            patient=self.patient,
+            from_department=self.med_dept,
+            to_department=self.card_dept,
+            requested_by=self.doctor,
+            clinical_summary='Test',
+            consult_question='Test'
+        )
+        self.url = reverse('consult-list')
+        self.client.force_authenticate(user=self.cardiologist)
+    
+    def test_cached_page_served_without_queries(self):
+        """Test a repeated inbox request is served from the cache"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        first = self.client.get(self.url, {'role': 'incoming'})
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url, {'role': 'incoming'})
+        
+        self.assertEqual(first.json(), second.json())
+        self.assertFalse(any('consults_consultrequest' in q['sql'] for q in queries.captured_queries))
+    
+    def test_add_comment_invalidates_both_departments(self):
+        """Test writes bump the generation of both departments"""
+        self.client.get(self.url, {'role': 'incoming'})
+        
+        url = reverse('consult-add-comment', kwargs={'pk': self.consult.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'message': 'Seen'}, format='json')
+        
+        response = self.client.get(self.url, {'role': 'incoming'})
+        self.assertEqual(response.data['results'][0]['comment_count'], 1)
+        self.client.force_authenticate(user=self.doctor)
+        response = self.client.get(self.url, {'role': 'outgoing'})
+        self.assertEqual(response.data['results'][0]['comment_count'], 1)
+    
+    def test_update_status_and_department_move_invalidate(self):
+        """Test status changes and moving a consult invalidate cached pages"""
+        self.client.get(self.url, {'role': 'incoming', 'status': 'pending'})
+        
+        url = reverse('consult-update-status', kwargs={'pk': self.consult.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'status': 'in_progress'}, format='json')
+        response = self.client.get(self.url, {'role': 'incoming', 'status': 'pending'})
+        self.assertEqual(response.data['count'], 0)
+        
+        self.client.get(self.url, {'role': 'incoming'})
+        with self.captureOnCommitCallbacks(execute=True):
+            consult = ConsultRequest.objects.get(pk=self.consult.pk)
+            consult.to_department = self.surg_dept
+            consult.save()
+        response = self.client.get(self.url, {'role': 'incoming'})
+        self.assertEqual(response.data['count'], 0)
+    
+    def test_cache_is_department_scoped(self):
+        """Test departments never share cached pages"""
+        self.client.get(self.url)
+        surgeon = User.objects.create_user(username='doc3', password='pass', department=self.surg_dept)
+        self.client.force_authenticate(user=surgeon)
+        
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 0)
+    
+    def test_last_login_does_not_invalidate(self):
+        """Test saves touching only last_login keep cached pages"""
+        from django.utils import timezone
+        from .cache import get_generations
+        
+        before = get_generations(self.card_dept.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cardiologist.last_login = timezone.now()
+            self.cardiologist.save(update_fields=['last_login'])
+        self.assertEqual(get_generations(self.card_dept.id), before)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.save()
+        self.assertNotEqual(get_generations(self.card_dept.id), before)
+    
+    def test_cache_disabled(self):
+        """Test CONSULT_LIST_CACHE_TIMEOUT=0 disables the cache"""
+        with self.settings(CONSULT_LIST_CACHE_TIMEOUT=0):
+            self.client.get(self.url)
+            ConsultRequest.objects.filter(pk=self.consult.pk).update(status='completed')
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['status'], 'completed')
+
+
+class RequestCoalescingTestCase(APITestCase):
+    """Test single-flight coalescing of identical GET requests"""
+    
+    def setUp(self):
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.doctor = User.objects.create_user(
+            username='doc1',
+            password='pass',
+            department=self.med_dept
+        )
+        self.cardiologist = User.objects.create_user(
+            username='doc2',
+            password='pass',
+            department=self.card_dept
+        )
+    
+    def test_concurrent_callers_share_one_call(self):
+        """Test waiters receive the leader's result without running the function"""
+        import threading
+        from .coalesce import SingleFlight
+        
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+        
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return b'payload'
+        
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', compute, 5)))
+        leader.start()
+        started.wait(5)
+        waiters = [
+            threading.Thread(target=lambda: results.append(flight.do('key', compute, 5)))
+            for _ in range(5)
+        ]
+        for thread in waiters:
+            thread.start()
+        release.set()
+        for thread in [leader, *waiters]:
+            thread.join(5)
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 6)
+        self.assertEqual({result for result, _ in results}, {b'payload'})
+        self.assertEqual(sum(shared for _, shared in results), 5)
+    
+    def test_waiters_recompute_when_leader_fails(self):
+        """Test a failing leader does not fail the requests waiting on it"""
+        import threading
+        from .coalesce import SingleFlight
+        
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        results = []
+        
+        def failing():
+            started.set()
+            release.wait(5)
+            raise RuntimeError('boom')
+        
+        def leader():
+            with self.assertRaises(RuntimeError):
+                flight.do('key', failing, 5)
+        
+        thread = threading.Thread(target=leader)
+        thread.start()
+        started.wait(5)
+        waiter = threading.Thread(target=lambda: results.append(flight.do('key', lambda: b'ok', 5)))
+        waiter.start()
+        release.set()
+        thread.join(5)
+        waiter.join(5)
+        
+        self.assertEqual(results, [(b'ok', False)])
+    
+    def test_key_is_scoped_to_department_and_representation(self):
+        """Test only requests rendering the same response share a key"""
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from .coalesce import coalesce_key
+        from .renderers import FastJSONRenderer
+        
+        def key(user, path='/api/consults/?role=incoming', **extra):
+            request = Request(APIRequestFactory().get(path, **extra))
+            request.user = user
+            request.accepted_renderer = FastJSONRenderer()
+            request.accepted_media_type = extra.get('HTTP_ACCEPT', 'application/json')
+            return coalesce_key(request)
+        
+        colleague = User.objects.create_user(username='doc3', password='pass', department=self.card_dept)
+        self.assertEqual(key(self.cardiologist), key(colleague))
+        self.assertNotEqual(key(self.cardiologist), key(self.doctor))
+        self.assertNotEqual(key(self.cardiologist), key(self.cardiologist, '/api/consults/?role=outgoing'))
+        self.assertNotEqual(key(self.cardiologist), key(self.cardiologist, HTTP_ACCEPT='application/msgpack'))
+    
+    def test_writers_bypass_coalescing(self):
+        """Test users pinned after a write never share an in-flight response"""
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from .coalesce import coalesce_key
+        from .renderers import FastJSONRenderer
+        from .routers import pin_to_primary
+        
+        request = Request(APIRequestFactory().get('/api/consults/'))
+        request.user = self.cardiologist
+        request.accepted_renderer = FastJSONRenderer()
+        request.accepted_media_type = 'application/json'
+        self.assertIsNotNone(coalesce_key(request))
+        
+        pin_to_primary(self.cardiologist)
+        self.assertIsNone(coalesce_key(request))
+    
+    def test_shared_waiter_uses_published_bytes(self):
+        """Test a worker waiting on another worker's lock receives its published bytes"""
+        from django.core.cache import cache
+        from .coalesce import run_shared
+        
+        cache.set('consults:flight:abc', 'token', 5)
+        cache.set('consults:flight:abc:token', (200, {'Content-Type': 'application/json'}, b'[]'), 5)
+        
+        result = run_shared('abc', lambda: self.fail('should not recompute'), 1)
+        self.assertEqual(result, (200, {'Content-Type': 'application/json'}, b'[]'))
+    
+    def test_copies_keep_every_header(self):
+        """Test waiters receive the leader's headers along with its bytes"""
+        from django.http import HttpResponse
+        from .coalesce import _copy, _payload
+        
+        leader = HttpResponse(b'[]', status=200, content_type='application/json')
+        leader['Vary'] = 'Accept, Authorization'
+        leader['Cache-Control'] = 'private, max-age=0'
+        leader['ETag'] = '"abc"'
+        for result in (leader, _payload(leader)):
+            copy = _copy(result)
+            self.assertEqual(copy.status_code, 200)
+            self.assertEqual(copy.content, b'[]')
+            self.assertEqual(dict(copy.items()), dict(leader.items()))
+    
+    def test_endpoints_return_full_responses(self):
+        """Test coalesced list and detail endpoints behave as before"""
+        patient = Patient.objects.create(hospital_id='MRN001', name='John Doe', age=45, gender='M')
+        consult = ConsultRequest.objects.create(
+            patient=patient,
+            from_department=self.med_dept,
+            to_department=self.card_dept,
+            requested_by=self.doctor,
+            clinical_summary='Test',
+            consult_question='Test'
+        )
+        self.client.force_authenticate(user=self.cardiologist)
+        
+        response = self.client.get(reverse('consult-list'), {'role': 'incoming'})
+        self.assertEqual(response.data['count'], 1)
+        response = self.client.get(reverse('consult-detail', kwargs={'pk': consult.id}))
+        self.assertEqual(response.json()['id'], consult.id)
+        
+        self.client.force_authenticate(user=User.objects.create_user(username='doc3', password='pass'))
+        response = self.client.get(reverse('consult-detail', kwargs={'pk': consult.id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class InvalidationBusTestCase(APITestCase):
+    """Test the cache invalidation bus and per-process caches"""
+    
+    def setUp(self):
+        from .bus import local_cache
+        local_cache.clear()
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.doctor = User.objects.create_user(
+            username='doc1',
+            password='pass',
+            department=self.med_dept
+        )
+        self.patient = Patient.objects.create(
+            hospital_id='MRN001',
+            name='John Doe',
+            age=45,
+            gender='M'
+        )
+    
+    def subscribe(self):
+        from . import bus
+        messages = []
+        bus.subscribe(messages.append)
+        self.addCleanup(bus._handlers.remove, messages.append)
+        return messages
+    
+    def test_model_changes_publish_messages(self):
+        """Test signals publish compact messages naming the departments involved"""
+        messages = self.subscribe()
+        with self.captureOnCommitCallbacks(execute=True):
+            consult = ConsultRequest.objects.create(
+                patient=self.patient,
+                from_department=self.med_dept,
+                to_department=self.card_dept,
+                requested_by=self.doctor,
+                clinical_summary='Test',
+                consult_question='Test'
+            )
+        
+        self.assertEqual(messages[-1]['m'], 'consults.consultrequest')
+        self.assertEqual(messages[-1]['pk'], consult.pk)
+        self.assertEqual(messages[-1]['d'], sorted([self.med_dept.pk, self.card_dept.pk]))
+        
+        messages.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            ConsultComment.objects.create(consult=consult, author=self.doctor, message='Seen')
+            self.patient.delete()
+        self.assertEqual(
+            {message['m'] for message in messages},
+            {'consults.consultcomment', 'consults.patient', 'consults.consultrequest'}
+        )
+    
+    def test_last_login_is_not_published(self):
+        """Test login bookkeeping does not invalidate anything"""
+        from django.utils import timezone
+        
+        messages = self.subscribe()
+        self.doctor.last_login = timezone.now()
+        self.doctor.save(update_fields=['last_login'])
+        self.assertEqual(messages, [])
+    
+    def test_local_cache_drops_dependent_entries(self):
+        """Test entries are dropped only when a model they depend on changes"""
+        from . import bus
+        
+        local = bus.LocalCache(timeout=60)
+        self.addCleanup(bus._handlers.remove, local.invalidate)
+        calls = []
+        
+        def compute():
+            calls.append(1)
+            return len(calls)
+        
+        self.assertEqual(local.get_or_set('departments', compute, [Department]), 1)
+        self.assertEqual(local.get_or_set('departments', compute, [Department]), 1)
+        
+        self.patient.save()
+        self.assertEqual(local.get_or_set('departments', compute, [Department]), 1)
+        
+        self.card_dept.save()
+        self.assertEqual(local.get_or_set('departments', compute, [Department]), 2)
+    
+    def test_department_list_is_cached_until_changed(self):
+        """Test the department list is served from process memory until a department changes"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        self.client.force_authenticate(user=self.doctor)
+        url = reverse('department-list')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse(any('consults_department' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(len(response.data['results']), 2)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Department.objects.create(name='Surgery', code='SURG')
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 3)
+    
+    def test_sqlite_uses_in_process_delivery(self):
+        """Test the PostgreSQL transport is only used on PostgreSQL"""
+        from .bus import uses_postgres
+        
+        self.assertFalse(uses_postgres())
+        with self.settings(INVALIDATION_BUS='postgres'):
+            self.assertTrue(uses_postgres())
+
+
+# Calls made by the `consults.tests.record` background task.
+recorded_calls = []
+
+
+def _record(value=None, fail=False):
+    recorded_calls.append(value)
+    if fail:
+        raise RuntimeError('task failed')
+
+
+class TaskQueueTestCase(TestCase):
+    """Test the database-backed task queue"""
+    
+    def setUp(self):
+        from .taskqueue import task
+        self.record = task(name='consults.tests.record', max_attempts=2)(_record)
+        recorded_calls.clear()
+    
+    def test_claim_order_and_scope(self):
+        """Test workers claim due tasks of their queue, highest priority first"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .taskqueue import claim
+        
+        low = self.record.enqueue(value='low')
+        high = self.record.enqueue(value='high', priority=10)
+        self.record.enqueue(value='later', priority=20, run_at=timezone.now() + timedelta(hours=1))
+        self.record.enqueue(value='other', priority=30, queue='exports')
+        
+        claimed = claim('default', 10, 'worker-1')
+        self.assertEqual([t.pk for t in claimed], [high.pk, low.pk])
+        self.assertTrue(all(t.status == 'running' and t.attempts == 1 for t in claimed))
+        self.assertEqual(claim('default', 10, 'worker-2'), [])
+    
+    def test_claim_respects_limit(self):
+        """Test a worker claims no more tasks than it has free slots"""
+        from .taskqueue import claim
+        
+        for index in range(5):
+            self.record.enqueue(value=index)
+        self.assertEqual(len(claim('default', 2, 'worker-1')), 2)
+        self.assertEqual(Task.objects.filter(status='queued').count(), 3)
+    
+    def test_success_marks_done(self):
+        """Test a successful task is marked done"""
+        from .taskqueue import claim, execute
+        
+        self.record.enqueue(value='ok')
+        task_row = claim('default', 1, 'worker-1')[0]
+        self.assertEqual(execute(task_row), 'done')
+        
+        task_row.refresh_from_db()
+        self.assertEqual(task_row.status, 'done')
+        self.assertIsNotNone(task_row.finished_at)
+        self.assertEqual(recorded_calls, ['ok'])
+    
+    def test_failure_retries_with_backoff_then_fails(self):
+        """Test failures are retried later until max_attempts is reached"""
+        from django.utils import timezone
+        from .taskqueue import claim, execute
+        
+        self.record.enqueue(value='boom', fail=True)
+        task_row = claim('default', 1, 'worker-1')[0]
+        self.assertEqual(execute(task_row), 'queued')
+        
+        task_row.refresh_from_db()
+        self.assertEqual(task_row.status, 'queued')
+        self.assertIn('task failed', task_row.last_error)
+        self.assertGreater(task_row.run_at, timezone.now())
+        self.assertEqual(claim('default', 1, 'worker-1'), [])
+        
+        Task.objects.filter(pk=task_row.pk).update(run_at=timezone.now())
+        task_row = claim('default', 1, 'worker-1')[0]
+        self.assertEqual(execute(task_row), 'failed')
+        task_row.refresh_from_db()
+        self.assertEqual(task_row.status, 'failed')
+        self.assertEqual(task_row.attempts, 2)
+    
+    def test_backoff_grows_exponentially(self):
+        """Test retry delays double per attempt up to the cap"""
+        from .taskqueue import backoff
+        
+        with self.settings(TASK_RETRY_BASE_SECONDS=10, TASK_RETRY_MAX_SECONDS=60):
+            self.assertAlmostEqual(backoff(1), 10, delta=1)
+            self.assertAlmostEqual(backoff(3), 40, delta=4)
+            self.assertAlmostEqual(backoff(10), 60, delta=6)
+    
+    def test_stale_tasks_are_requeued(self):
+        """Test tasks of a worker that died are run again, unless out of attempts"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .taskqueue import claim, requeue_stale
+        
+        self.record.enqueue(value='lost')
+        self.record.enqueue(value='poison')
+        first, second = claim('default', 2, 'worker-1')
+        Task.objects.filter(pk=second.pk).update(attempts=2)
+        Task.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        
+        self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(Task.objects.get(pk=first.pk).status, 'queued')
+        self.assertEqual(Task.objects.get(pk=second.pk).status, 'failed')
+    
+    def test_heartbeat_keeps_long_tasks_locked(self):
+        """Test a task whose worker renews its lock isn't requeued while it runs"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .taskqueue import claim, heartbeat, requeue_stale
+        
+        self.record.enqueue(value='slow')
+        self.record.enqueue(value='other')
+        mine, theirs = claim('default', 2, 'worker-1')
+        Task.objects.filter(pk=theirs.pk).update(locked_by='worker-2')
+        Task.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        
+        self.assertEqual(heartbeat([mine.pk, theirs.pk], 'worker-1'), 1)
+        self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(Task.objects.get(pk=mine.pk).status, 'running')
+        self.assertEqual(Task.objects.get(pk=theirs.pk).status, 'queued')
+    
+    def test_worker_schedules_purge(self):
+        """Test maintenance workers queue the purge of finished tasks, once"""
+        from unittest import mock
+        from django.core.management import call_command
+        from io import StringIO
+        from .tasks import purge_finished_tasks, schedule_purge
+        
+        schedule_purge()
+        schedule_purge()
+        self.assertEqual(Task.objects.filter(name=purge_finished_tasks.name, status='queued').count(), 1)
+        Task.objects.all().delete()
+        
+        with mock.patch('consults.management.commands.run_tasks.schedule_purge') as scheduled:
+            call_command('run_tasks', '--queue', 'default=1', '--once', stdout=StringIO())
+            scheduled.assert_not_called()
+            call_command('run_tasks', '--queue', 'notifications=1', '--queue', 'maintenance=1', '--once',
+                         stdout=StringIO())
+            scheduled.assert_called_once()
+    
+    def test_invalid_queue_option(self):
+        """Test the worker rejects malformed queue options"""
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        
+        with self.assertRaises(CommandError):
+            call_command('run_tasks', '--queue', 'default=0', '--once')
+
+
+class TaskWorkerTestCase(TransactionTestCase):
+    """Test the run_tasks worker command"""
+    
+    def test_worker_drains_queues(self):
+        """Test the worker runs every due task across queues and exits with --once"""
+        from concurrent.futures import Future
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from .taskqueue import task
+        
+        class InlineExecutor:
+            # SQLite's shared in-memory test database can't take concurrent writers.
+            def __init__(self, *args, **kwargs):
+                pass
+            
+            def submit(self, func, *args):
+                future = Future()
+                future.set_result(func(*args))
+                return future
+            
+            def shutdown(self, wait=True):
+                pass
+        
+        record = task(name='consults.tests.record', max_attempts=2)(_record)
+        recorded_calls.clear()
+        for index in range(4):
+            record.enqueue(value=index)
+        record.enqueue(value='export', queue='exports')
+        
+        out = StringIO()
+        with mock.patch('consults.management.commands.run_tasks.ThreadPoolExecutor', InlineExecutor):
+            call_command(
+                'run_tasks', '--queue', 'default=2', '--queue', 'exports=1', '--once', '--poll-interval', '0.01',
+                stdout=out
+            )
+        
+        self.assertEqual(sorted(map(str, recorded_calls)), ['0', '1', '2', '3', 'export'])
+        self.assertEqual(Task.objects.filter(status='done').count(), 5)
+        self.assertIn('Worker stopped', out.getvalue())
+
+
+class NotificationTestCase(APITestCase):
+    """Test consult notifications and their delivery"""
+    
+    def setUp(self):
+        import os
+        import tempfile
+        
+        handle, self.sink = tempfile.mkstemp(suffix='.log')
+        os.close(handle)
+        self.addCleanup(os.remove, self.sink)
+        override = self.settings(NOTIFICATION_FILE=self.sink, NOTIFICATION_CHANNELS=['consults.notifications.FileChannel'])
+        override.enable()
+        self.addCleanup(override.disable)
+        
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.doctor = User.objects.create_user(username='doc1', password='pass', department=self.med_dept)
+        self.cardiologists = [
+            User.objects.create_user(username=f'card{index}', password='pass', department=self.card_dept)
+            for index in range(3)
+        ]
+        self.patient = Patient.objects.create(hospital_id='MRN001', name='John Doe', age=45, gender='M')
+        self.client.force_authenticate(user=self.doctor)
+    
+    def create_consult(self, priority='routine'):
+        # A patient of its own: only one consult per patient and department may be open.
+        patient = Patient.objects.create(
+            hospital_id=f'MRN{Patient.objects.count() + 1:03}', name='John Doe', age=45, gender='M'
+        )
+        response = self.client.post(reverse('consult-list'), {
+            'patient': patient.id,
+            'to_department': self.card_dept.id,
+            'priority': priority,
+            'clinical_summary': 'Chest pain',
+            'consult_question': 'Please evaluate'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return ConsultRequest.objects.latest('id')
+    
+    def sent(self):
+        import json
+        with open(self.sink, encoding='utf-8') as sink:
+            return [json.loads(line) for line in sink]
+    
+    def test_create_queues_digest_without_sending(self):
+        """Test creating a consult records notifications for the target department and sends nothing inline"""
+        from .models import Notification
+        
+        consult = self.create_consult()
+        
+        recipients = set(Notification.objects.filter(consult=consult).values_list('recipient__username', flat=True))
+        self.assertEqual(recipients, {'card0', 'card1', 'card2'})
+        self.assertEqual(self.sent(), [])
+        digest = Task.objects.get(name='consults.send_notification_digests')
+        self.assertEqual(digest.queue, 'notifications')
+        self.assertGreater(digest.run_at, digest.created_at)
+        
+        self.create_consult()
+        self.assertEqual(Task.objects.filter(name='consults.send_notification_digests').count(), 1)
+    
+    def test_digest_coalesces_events_per_recipient(self):
+        """Test a burst of events becomes one message per recipient"""
+        from .tasks import send_notification_digests
+        
+        for _ in range(3):
+            self.create_consult()
+        # Messages go out once the dispatch transaction commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            send_notification_digests()
+        
+        messages = self.sent()
+        self.assertEqual(sorted(message['to'] for message in messages), ['card0', 'card1', 'card2'])
+        self.assertTrue(all(message['subject'] == '3 updates on 3 consults' for message in messages))
+        self.assertEqual(len(messages[0]['body'].splitlines()), 3)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            send_notification_digests()
+        self.assertEqual(len(self.sent()), 3)
+    
+    def test_stat_consults_use_fast_lane(self):
+        """Test STAT consults are queued for immediate delivery on the stat queue"""
+        from .tasks import send_urgent_notifications
+        
+        self.create_consult(priority='stat')
+        task_row = Task.objects.get(name='consults.send_urgent_notifications')
+        self.assertEqual(task_row.queue, 'stat')
+        self.assertLessEqual(task_row.run_at, task_row.created_at)
+        self.assertFalse(Task.objects.filter(name='consults.send_notification_digests').exists())
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            send_urgent_notifications(**task_row.kwargs)
+        messages = self.sent()
+        self.assertEqual(len(messages), 3)
+        self.assertTrue(all(message['urgent'] and message['subject'].startswith('[STAT]') for message in messages))
+    
+    def test_status_and_comment_recipients(self):
+        """Test status changes notify the requester and comments notify the other participants"""
+        from .models import Notification
+        
+        consult = self.create_consult()
+        Notification.objects.all().delete()
+        
+        consultant = self.cardiologists[0]
+        self.client.force_authenticate(user=consultant)
+        self.client.patch(
+            reverse('consult-update-status', kwargs={'pk': consult.id}), {'status': 'in_progress'}, format='json'
+        )
+        self.client.post(reverse('consult-add-comment', kwargs={'pk': consult.id}), {'message': 'Seen'}, format='json')
+        self.assertEqual(
+            list(Notification.objects.values_list('event', 'recipient__username')),
+            [('status_changed', 'doc1'), ('commented', 'doc1')]
+        )
+        
+        Notification.objects.all().delete()
+        self.client.force_authenticate(user=self.doctor)
+        self.client.post(reverse('consult-add-comment', kwargs={'pk': consult.id}), {'message': 'Thanks'}, format='json')
+        self.assertEqual(list(Notification.objects.values_list('recipient__username', flat=True)), ['card0'])
+    
+    def test_failed_send_is_retried(self):
+        """Test notifications are sent after the commit and marked unsent again if sending fails"""
+        from unittest import mock
+        from .models import Notification
+        from .tasks import send_notification_digests
+        
+        self.create_consult()
+        with mock.patch('consults.notifications.FileChannel.send', side_effect=ConnectionError), \
+                self.assertRaises(ConnectionError), self.captureOnCommitCallbacks(execute=True) as callbacks:
+            send_notification_digests()
+            self.assertEqual(len(callbacks), 1)
+            self.assertEqual(self.sent(), [])
+        self.assertEqual(Notification.objects.filter(sent_at__isnull=True).count(), 3)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            send_notification_digests()
+        self.assertEqual(len(self.sent()), 3)
+    
+    def test_email_channel(self):
+        """Test the email channel sends one email per recipient with an address"""
+        from django.core import mail
+        from .tasks import send_notification_digests
+        
+        self.cardiologists[0].email = 'card0@example.org'
+        self.cardiologists[0].save()
+        self.create_consult()
+        with self.settings(NOTIFICATION_CHANNELS=['consults.notifications.EmailChannel']), \
+                self.captureOnCommitCallbacks(execute=True):
+            send_notification_digests()
+        
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['card0@example.org'])
+    
+    def test_digest_throughput(self):
+        """Test digests keep up with thousands of events per minute in a bounded number of queries"""
+        import time
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .models import Notification
+        from .tasks import send_notification_digests
+        
+        consult = self.create_consult()
+        recipients = self.cardiologists + [
+            User.objects.create_user(username=f'extra{index}', password='pass') for index in range(17)
+        ]
+        Notification.objects.all().delete()
+        Notification.objects.bulk_create([
+            Notification(recipient=recipients[index % len(recipients)], consult=consult,
+                         event='commented', message=f'Update {index}')
+            for index in range(3000)
+        ])
+        
+        started = time.perf_counter()
+        with self.settings(NOTIFICATION_BATCH_SIZE=1000), CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True):
+            send_notification_digests()
+        elapsed = time.perf_counter() - started
+        
+        self.assertFalse(Notification.objects.filter(sent_at__isnull=True).exists())
+        self.assertLessEqual(len(self.sent()), 3 * len(recipients))
+        self.assertLess(len(queries), 20)
+        # 3000 events must be delivered in well under a minute.
+        self.assertLess(elapsed, 10)
+
+
+class WorklistTestCase(APITestCase):
+    """Test the priority-weighted consultant worklist"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.doctor = User.objects.create_user(username='doc1', password='pass', department=self.med_dept)
+        self.cardiologist = User.objects.create_user(username='doc2', password='pass', department=self.card_dept)
+        self.patient = Patient.objects.create(hospital_id='MRN001', name='John Doe', age=45, gender='M')
+        self.url = reverse('consult-worklist')
+        self.client.force_authenticate(user=self.cardiologist)
+    
+    def consult(self, priority, hours_ago, status='pending', to_department=None):
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        # A patient of its own: only one consult per patient and department may be open.
+        patient = Patient.objects.create(
+            hospital_id=f'MRN{Patient.objects.count() + 1:03}', name='John Doe', age=45, gender='M'
+        )
+        consult = ConsultRequest.objects.create(
+            patient=patient,
+            from_department=self.med_dept,
+            to_department=to_department or self.card_dept,
+            requested_by=self.doctor,
+            priority=priority,
+            status=status,
+            clinical_summary='Test',
+            consult_question='Test'
+        )
+        # created_at is auto_now_add; backdate it and refresh the sort key.
+        ConsultRequest.objects.filter(pk=consult.pk).update(created_at=timezone.now() - timedelta(hours=hours_ago))
+        consult.refresh_from_db()
+        consult.save()
+        return consult
+    
+    def test_orders_by_priority_and_waiting_time(self):
+        """Test STAT beats urgent beats routine, until waiting time catches up"""
+        new_routine = self.consult('routine', 0)
+        old_routine = self.consult('routine', 6)
+        new_urgent = self.consult('urgent', 0)
+        new_stat = self.consult('stat', 0)
+        old_urgent = self.consult('urgent', 3)
+        
+        response = self.client.get(self.url)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [new_stat.id, old_urgent.id, old_routine.id, new_urgent.id, new_routine.id]
+        )
+    
+    def test_only_open_incoming_consults(self):
+        """Test closed and outgoing consults are left out"""
+        open_consult = self.consult('routine', 1, status='in_progress')
+        self.consult('stat', 1, status='completed')
+        self.consult('stat', 1, status='cancelled')
+        self.consult('stat', 1, to_department=self.med_dept)
+        
+        response = self.client.get(self.url)
+        self.assertEqual([item['id'] for item in response.data['results']], [open_consult.id])
+        
+        response = self.client.get(self.url, {'status': 'pending'})
+        self.assertEqual(response.data['count'], 0)
+    
+    def test_priority_change_updates_sort_key(self):
+        """Test changing a consult's priority moves it in the worklist"""
+        consult = self.consult('routine', 0)
+        before = consult.triage_at
+        
+        consult.priority = 'stat'
+        consult.save(update_fields=['priority'])
+        consult.refresh_from_db()
+        self.assertEqual(before - consult.triage_at, ConsultRequest.PRIORITY_HEAD_START['stat'])
+        
+        consult.status = 'completed'
+        consult.save(update_fields=['status'])
+        consult.refresh_from_db()
+        self.assertIsNone(consult.triage_at)
+    
+    def test_served_by_index_without_sort(self):
+        """Test the worklist query walks the partial index in order instead of sorting"""
+        from django.db import connection
+        
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan check written for SQLite')
+        for hours in range(20):
+            self.consult('routine', hours)
+        queryset = ConsultRequest.objects.filter(
+            to_department=self.card_dept, triage_at__isnull=False
+        ).order_by('triage_at', 'id')[:10]
+        plan = queryset.explain()
+        self.assertIn('consult_worklist', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class EscalationTestCase(TestCase):
+    """Test SLA escalation of consults left pending"""
+    
+    def setUp(self):
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.doctor = User.objects.create_user(username='doc1', password='pass', department=self.med_dept)
+        self.cardiologist = User.objects.create_user(username='doc2', password='pass', department=self.card_dept)
+        self.patient = Patient.objects.create(hospital_id='MRN001', name='John Doe', age=45, gender='M')
+    
+    def consult(self, priority, minutes_ago, status='pending'):
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        # A patient of its own: only one consult per patient and department may be open.
+        patient = Patient.objects.create(
+            hospital_id=f'MRN{Patient.objects.count() + 1:03}', name='John Doe', age=45, gender='M'
+        )
+        consult = ConsultRequest.objects.create(
+            patient=patient,
+            from_department=self.med_dept,
+            to_department=self.card_dept,
+            requested_by=self.doctor,
+            priority=priority,
+            status=status,
+            clinical_summary='Test',
+            consult_question='Test'
+        )
+        ConsultRequest.objects.filter(pk=consult.pk).update(created_at=timezone.now() - timedelta(minutes=minutes_ago))
+        consult.refresh_from_db()
+        consult.save()
+        return consult
+    
+    def test_deadline_follows_priority_and_status(self):
+        """Test only pending STAT and urgent consults carry a deadline"""
+        from datetime import timedelta
+        
+        stat = self.consult('stat', 0)
+        self.assertEqual(stat.sla_deadline - stat.created_at, timedelta(minutes=30))
+        urgent = self.consult('urgent', 0)
+        self.assertEqual(urgent.sla_deadline - urgent.created_at, timedelta(hours=4))
+        self.assertIsNone(self.consult('routine', 0).sla_deadline)
+        
+        stat.status = 'in_progress'
+        stat.save(update_fields=['status'])
+        stat.refresh_from_db()
+        self.assertIsNone(stat.sla_deadline)
+    
+    def test_escalates_breaches_once(self):
+        """Test breached consults are escalated and notified exactly once"""
+        from .escalation import escalate_overdue
+        from .models import Notification
+        
+        late_stat = self.consult('stat', 31)
+        self.consult('stat', 29)
+        late_urgent = self.consult('urgent', 241)
+        self.consult('urgent', 239)
+        self.consult('stat', 120, status='in_progress')
+        self.consult('routine', 10000)
+        
+        self.assertEqual(sorted(escalate_overdue()), sorted([late_stat.pk, late_urgent.pk]))
+        self.assertEqual(escalate_overdue(), [])
+        
+        late_stat.refresh_from_db()
+        self.assertIsNotNone(late_stat.escalated_at)
+        self.assertIsNone(late_stat.sla_deadline)
+        recipients = Notification.objects.filter(consult=late_stat, event='escalated')
+        self.assertEqual(
+            sorted(recipients.values_list('recipient__username', flat=True)), ['doc1', 'doc2']
+        )
+        self.assertTrue(all(notification.urgent for notification in recipients))
+        self.assertTrue(Task.objects.filter(name='consults.send_urgent_notifications', queue='stat').exists())
+        
+        # Saving an escalated consult must not re-arm its deadline.
+        late_stat.save()
+        late_stat.refresh_from_db()
+        self.assertIsNone(late_stat.sla_deadline)
+    
+    def test_escalation_notifies_in_one_batch(self):
+        """Test one scan records every escalation's notifications together"""
+        from unittest import mock
+        from .escalation import escalate_overdue
+        
+        late = [self.consult('stat', 40 + minutes) for minutes in range(3)]
+        with mock.patch('consults.escalation.notify_many') as notify_many:
+            escalate_overdue()
+        notify_many.assert_called_once()
+        event, ids = notify_many.call_args.args
+        self.assertEqual((event, sorted(ids)), ('escalated', sorted(consult.pk for consult in late)))
+    
+    def test_backfill_escalates_old_breaches_silently(self):
+        """Test the deadline backfill arms open windows and marks earlier breaches as escalated"""
+        from importlib import import_module
+        from django.apps import apps
+        from .escalation import escalate_overdue
+        from .models import Notification
+        
+        recent = self.consult('stat', 10)
+        old = self.consult('stat', 60 * 24 * 30)
+        ConsultRequest.objects.update(sla_deadline=None, escalated_at=None)
+        
+        import_module('consults.migrations.0006_consult_sla').fill_sla_deadline(apps, None)
+        recent.refresh_from_db()
+        old.refresh_from_db()
+        self.assertEqual(recent.sla_deadline, recent.created_at + ConsultRequest.PENDING_SLA['stat'])
+        self.assertIsNone(old.sla_deadline)
+        self.assertEqual(old.escalated_at, old.created_at + ConsultRequest.PENDING_SLA['stat'])
+        self.assertEqual(escalate_overdue(), [])
+        self.assertFalse(Notification.objects.filter(event='escalated').exists())
+    
+    def test_scan_reads_only_the_deadline_index(self):
+        """Test the scan is served by the partial deadline index"""
+        from django.db import connection
+        from django.utils import timezone
+        
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan check written for SQLite')
+        for minutes in range(20):
+            self.consult('routine', minutes)
+        plan = ConsultRequest.objects.filter(sla_deadline__lte=timezone.now()).order_by('sla_deadline').explain()
+        self.assertIn('consult_sla_deadline', plan)
+    
+    def test_command(self):
+        """Test the escalate_consults command reports what it escalated"""
+        from io import StringIO
+        from django.core.management import call_command
+        
+        consult = self.consult('stat', 45)
+        out = StringIO()
+        call_command('escalate_consults', stdout=out)
+        self.assertIn(f'#{consult.pk}', out.getvalue())
+        
+        out = StringIO()
+        call_command('escalate_consults', stdout=out)
+        self.assertIn('No consults past their SLA', out.getvalue())
+
+
+class AdminScalingTestCase(TestCase):
+    """Test the admin stays cheap on large tables"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pass', email='admin@example.org')
+        self.client.force_login(self.admin)
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.doctor = User.objects.create_user(username='doc1', password='pass', department=self.med_dept)
+    
+    def create_consults(self, count):
+        consults = []
+        for _ in range(count):
+            index = ConsultRequest.objects.count()
+            patient = Patient.objects.create(hospital_id=f'MRN{index:05d}', name=f'Patient {index}', age=50, gender='F')
+            consult = ConsultRequest.objects.create(
+                patient=patient,
+                from_department=self.med_dept,
+                to_department=self.card_dept,
+                requested_by=self.doctor,
+                priority='stat',
+                clinical_summary='Test',
+                consult_question='Test'
+            )
+            ConsultComment.objects.create(consult=consult, author=self.doctor, message='Seen')
+            consults.append(consult)
+        return consults
+    
+    def count_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+    
+    def test_changelists_use_constant_queries(self):
+        """Test changelist query counts do not grow with the number of rows"""
+        for name in ['consultrequest', 'consultcomment', 'patient', 'user']:
+            url = reverse(f'admin:consults_{name}_changelist')
+            self.create_consults(2)
+            few = self.count_queries(url)
+            self.create_consults(10)
+            self.assertEqual(self.count_queries(url), few, name)
+    
+    def test_change_form_uses_autocomplete(self):
+        """Test foreign keys are not rendered as selects listing every row"""
+        consult = self.create_consults(3)[0]
+        response = self.client.get(reverse('admin:consults_consultrequest_change', args=[consult.pk]))
+        
+        content = response.content.decode()
+        self.assertIn('admin-autocomplete', content)
+        self.assertNotIn('Patient 1', content)
+        self.assertNotIn('Patient 2', content)
+    
+    def test_bulk_status_action_is_one_update(self):
+        """Test bulk actions issue a single UPDATE and keep worklist and SLA keys in step"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        consults = self.create_consults(5)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('admin:consults_consultrequest_changelist'), {
+                'action': 'mark_completed',
+                '_selected_action': [consult.pk for consult in consults],
+            })
+        self.assertEqual(response.status_code, 302)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "consults_consultrequest"')]
+        self.assertEqual(len(updates), 1)
+        self.assertFalse(
+            ConsultRequest.objects.exclude(status='completed').exists()
+        )
+        self.assertFalse(ConsultRequest.objects.filter(triage_at__isnull=False).exists())
+        self.assertFalse(ConsultRequest.objects.filter(sla_deadline__isnull=False).exists())
+    
+    def test_set_status_recomputes_keys_like_save(self):
+        """Test reopening through set_status restores the keys save() would set"""
+        from datetime import timedelta
+        
+        consult = self.create_consults(1)[0]
+        expected = (consult.triage_at, consult.sla_deadline)
+        
+        ConsultRequest.objects.filter(pk=consult.pk).set_status('cancelled')
+        ConsultRequest.objects.filter(pk=consult.pk).set_status('pending')
+        consult.refresh_from_db()
+        # SQLite date arithmetic keeps only milliseconds.
+        for actual, wanted in zip((consult.triage_at, consult.sla_deadline), expected):
+            self.assertAlmostEqual(actual, wanted, delta=timedelta(milliseconds=1))
+    
+    def test_estimated_count_paginator(self):
+        """Test large unfiltered tables use the planner estimate and filtered lists an exact count"""
+        from unittest import mock
+        from .admin import EstimatedCountPaginator
+        
+        self.create_consults(3)
+        with mock.patch.object(EstimatedCountPaginator, '_estimate', return_value=5000000):
+            self.assertEqual(EstimatedCountPaginator(ConsultRequest.objects.all(), 100).count, 5000000)
+            filtered = ConsultRequest.objects.filter(status='pending')
+            self.assertEqual(EstimatedCountPaginator(filtered, 100).count, 3)
+        
+        # SQLite has no estimate to read.
+        self.assertEqual(EstimatedCountPaginator(ConsultRequest.objects.all(), 100).count, 3)
+
+
+class IdempotencyKeyTestCase(APITestCase):
+    """Test Idempotency-Key handling on consult creation and comments"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        
+        cache.clear()
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.doctor = User.objects.create_user(username='doc1', password='pass', department=self.med_dept)
+        self.patient = Patient.objects.create(hospital_id='MRN001', name='John Doe', age=45, gender='M')
+        self.data = {
+            'patient': self.patient.id,
+            'to_department': self.card_dept.id,
+            'priority': 'urgent',
+            'clinical_summary': 'Chest pain',
+            'consult_question': 'Please evaluate'
+        }
+        self.client.force_authenticate(user=self.doctor)
+    
+    def test_retried_create_returns_original_response(self):
+        """Test a retried create returns the first response without inserting again"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        url = reverse('consult-list')
+        first = self.client.post(url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', first)
+        
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.client.post(url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(ConsultRequest.objects.count(), 1)
+        self.assertFalse([q for q in queries.captured_queries if 'consults_consultrequest' in q['sql']])
+        
+        # Without a key (or with another one) the request runs as usual.
+        for hospital_id, headers in (('MRN002', {'HTTP_IDEMPOTENCY_KEY': 'def'}), ('MRN003', {})):
+            patient = Patient.objects.create(hospital_id=hospital_id, name='Jane Doe', age=50, gender='F')
+            response = self.client.post(url, dict(self.data, patient=patient.id), format='json', **headers)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(ConsultRequest.objects.count(), 3)
+    
+    def test_retried_comment_returns_original_response(self):
+        """Test a retried add_comment creates the comment once"""
+        consult = ConsultRequest.objects.create(
+            patient=self.patient, from_department=self.med_dept, to_department=self.card_dept,
+            requested_by=self.doctor, clinical_summary='Test', consult_question='Test'
+        )
+        url = reverse('consult-add-comment', args=[consult.id])
+        first = self.client.post(url, {'message': 'On my way'}, format='json', HTTP_IDEMPOTENCY_KEY='c1')
+        retry = self.client.post(url, {'message': 'On my way'}, format='json', HTTP_IDEMPOTENCY_KEY='c1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(ConsultComment.objects.count(), 1)
+    
+    def test_validation_errors_are_replayed(self):
+        """Test a rejected request is answered the same way on retry"""
+        url = reverse('consult-list')
+        data = dict(self.data, priority='whenever')
+        first = self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='bad')
+        retry = self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='bad')
+        self.assertEqual(first.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(retry.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+    
+    def test_key_reused_for_different_request(self):
+        """Test a key cannot be reused for a different request body or endpoint"""
+        url = reverse('consult-list')
+        self.client.post(url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        response = self.client.post(
+            url, dict(self.data, priority='stat'), format='json', HTTP_IDEMPOTENCY_KEY='abc'
+        )
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(ConsultRequest.objects.count(), 1)
+    
+    def test_keys_are_per_user(self):
+        """Test the same key sent by another user is a separate request"""
+        other = User.objects.create_user(username='doc2', password='pass', department=self.med_dept)
+        url = reverse('consult-list')
+        self.client.post(url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.client.force_authenticate(user=other)
+        response = self.client.post(url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        # Run rather than replayed, finding the first user's open consult.
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(ConsultRequest.objects.count(), 1)
+    
+    def test_request_in_progress(self):
+        """Test a retry arriving while the first request runs is told to try again"""
+        from django.core.cache import cache
+        from .idempotency import RUNNING, _cache_key, fingerprint
+        from rest_framework.test import APIRequestFactory
+        from rest_framework.request import Request
+        from rest_framework.parsers import JSONParser
+        
+        url = reverse('consult-list')
+        raw = APIRequestFactory().post(url, self.data, format='json')
+        request = Request(raw, parsers=[JSONParser()])
+        cache.set(_cache_key(self.doctor, 'abc'), {'state': RUNNING, 'fingerprint': fingerprint(request)})
+        
+        response = self.client.post(url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(ConsultRequest.objects.count(), 0)
+    
+    def test_server_errors_are_not_remembered(self):
+        """Test a request that failed with an exception can be retried for real"""
+        from unittest import mock
+        
+        url = reverse('consult-list')
+        self.client.raise_request_exception = True
+        with mock.patch('consults.serializers.notify', side_effect=RuntimeError('down')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        response = self.client.post(url, self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+    
+    def test_invalid_key(self):
+        """Test an over-long key is rejected"""
+        response = self.client.post(
+            reverse('consult-list'), self.data, format='json', HTTP_IDEMPOTENCY_KEY='x' * 256
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(ConsultRequest.objects.count(), 0)
+
+
+class BulkStatusTestCase(APITestCase):
+    """Test changing the status of several consults at once"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        
+        cache.clear()
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.surg_dept = Department.objects.create(name='Surgery', code='SURG')
+        self.doctor = User.objects.create_user(username='doc1', password='pass', department=self.med_dept)
+        self.cardiologist = User.objects.create_user(username='doc2', password='pass', department=self.card_dept)
+        self.url = reverse('consult-bulk-status')
+        self.client.force_authenticate(user=self.cardiologist)
+    
+    def consult(self, to_department=None, from_department=None, status='pending', patient=None):
+        patient = patient or Patient.objects.create(
+            hospital_id=f'MRN{Patient.objects.count() + 1:03}', name='John Doe', age=45, gender='M'
+        )
+        return ConsultRequest.objects.create(
+            patient=patient,
+            from_department=from_department or self.med_dept,
+            to_department=to_department or self.card_dept,
+            requested_by=self.doctor,
+            status=status,
+            clinical_summary='Test',
+            consult_question='Test'
+        )
+    
+    def test_closes_consults_with_one_update(self):
+        """Test visible consults are changed by a single UPDATE with an outcome per id"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .models import Notification
+        
+        open_consults = [self.consult() for _ in range(3)]
+        done = self.consult(status='completed')
+        elsewhere = self.consult(to_department=self.surg_dept)
+        ids = [consult.id for consult in open_consults] + [done.id, elsewhere.id, 9999]
+        
+        # Warm the list cache, which the bulk change must invalidate.
+        self.client.get(reverse('consult-list'), {'role': 'incoming'})
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'ids': ids, 'status': 'completed'}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(
+            [result['result'] for result in response.data['results']],
+            ['updated'] * 3 + ['unchanged', 'not_found', 'not_found']
+        )
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "consults_consultrequest"')]
+        self.assertEqual(len(updates), 1)
+        
+        for consult in open_consults:
+            consult.refresh_from_db()
+            self.assertEqual(consult.status, 'completed')
+            self.assertIsNone(consult.triage_at)
+        elsewhere.refresh_from_db()
+        self.assertEqual(elsewhere.status, 'pending')
+        self.assertEqual(
+            Notification.objects.filter(event='status_changed', recipient=self.doctor).count(), 3
+        )
+        listed = self.client.get(reverse('consult-list'), {'role': 'incoming'}).data['results']
+        self.assertEqual({consult['status'] for consult in listed}, {'completed'})
+    
+    def test_invalid_requests(self):
+        """Test malformed status or id lists are rejected"""
+        consult = self.consult()
+        for body in (
+            {'ids': [consult.id], 'status': 'closed'},
+            {'ids': [], 'status': 'completed'},
+            {'ids': [str(consult.id)], 'status': 'completed'},
+            {'ids': consult.id, 'status': 'completed'},
+            {'ids': list(range(1, 202)), 'status': 'completed'},
+        ):
+            response = self.client.post(self.url, body, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+        consult.refresh_from_db()
+        self.assertEqual(consult.status, 'pending')
+    
+    def test_reopening_duplicate_changes_nothing(self):
+        """Test a bulk change that would open a second consult for a patient is refused whole"""
+        first = self.consult()
+        closed = self.consult(status='cancelled', patient=first.patient)
+        other = self.consult(status='cancelled')
+        
+        response = self.client.post(self.url, {'ids': [closed.id, other.id], 'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'cancelled')
+
+
+class LatencyBudgetTestCase(APITestCase):
+    """Test per-action latency budgets and their timeout responses"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        
+        cache.clear()
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.doctor = User.objects.create_user(username='doc1', password='pass', department=self.med_dept)
+        self.client.force_authenticate(user=self.doctor)
+    
+    def database_error(self, cause):
+        from django.db import OperationalError
+        
+        error = OperationalError(str(cause))
+        error.__cause__ = cause
+        return error
+    
+    def test_budget_set_for_request_and_reset(self):
+        """Test the action's budget is set as the statement timeout and reset afterwards"""
+        from unittest import mock
+        from django.test import override_settings
+        
+        with mock.patch('consults.budgets.supports_statement_timeout', return_value=True), \
+                mock.patch('consults.budgets.set_statement_timeout') as set_timeout, \
+                mock.patch('consults.budgets.reset_statement_timeout') as reset_timeout:
+            self.client.get(reverse('consult-worklist'))
+            self.client.get(reverse('consult-list'), {'search': 'a'})
+            self.client.get(reverse('patient-list'))
+            with override_settings(LATENCY_BUDGETS={'consult.search': 300, 'patient.list': 0}):
+                self.client.get(reverse('consult-list'), {'search': 'a'})
+                self.client.get(reverse('patient-list'))
+            # Viewsets without budgets are left alone.
+            self.client.get(reverse('department-list'))
+        
+        self.assertEqual(
+            [call.args for call in set_timeout.call_args_list],
+            [('default', 500), ('default', 2000), ('default', 500), ('default', 300)]
+        )
+        self.assertEqual(reset_timeout.call_count, 4)
+    
+    def test_connection_closed_if_reset_fails(self):
+        """Test a connection whose budget can't be reset isn't reused with it"""
+        from unittest import mock
+        from django.db import DatabaseError, connection
+        
+        with mock.patch('consults.budgets.supports_statement_timeout', return_value=True), \
+                mock.patch('consults.budgets.set_statement_timeout'), \
+                mock.patch('consults.budgets.reset_statement_timeout', side_effect=DatabaseError), \
+                mock.patch.object(connection, 'close') as close:
+            response = self.client.get(reverse('consult-worklist'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        close.assert_called_once_with()
+    
+    def test_statement_timeout_returns_504(self):
+        """Test a statement cancelled by its budget becomes a counted 504"""
+        from unittest import mock
+        from .budgets import timeout_stats
+        from .views import ConsultRequestViewSet
+        
+        class QueryCanceled(Exception):
+            sqlstate = '57014'
+        
+        before = timeout_stats()['statement_timeouts'].get('consult.search', 0)
+        error = self.database_error(QueryCanceled('canceling statement due to statement timeout'))
+        with mock.patch.object(ConsultRequestViewSet, 'get_queryset', side_effect=error):
+            response = self.client.get(reverse('consult-list'), {'search': 'a'})
+        
+        self.assertEqual(response.status_code, status.HTTP_504_GATEWAY_TIMEOUT)
+        self.assertIn('2000 ms', response.data['error'])
+        self.assertEqual(timeout_stats()['statement_timeouts']['consult.search'], before + 1)
+        health = self.client.get(reverse('health'))
+        self.assertEqual(health.data['timeouts']['statement_timeouts']['consult.search'], before + 1)
+    
+    def test_pool_timeout_returns_503(self):
+        """Test running out of pooled connections becomes a 503 with Retry-After"""
+        from unittest import mock
+        from .views import PatientViewSet
+        
+        class PoolTimeout(Exception):
+            pass
+        
+        error = self.database_error(PoolTimeout("couldn't get a connection after 10.00 sec"))
+        with mock.patch.object(PatientViewSet, 'get_queryset', side_effect=error):
+            response = self.client.get(reverse('patient-list'))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+    
+    def test_other_database_errors_propagate(self):
+        """Test database errors other than timeouts are not turned into timeout responses"""
+        from unittest import mock
+        from django.db import OperationalError
+        from .views import PatientViewSet
+        
+        self.client.raise_request_exception = True
+        with mock.patch.object(PatientViewSet, 'get_queryset', side_effect=OperationalError('disk I/O error')):
+            with self.assertRaises(OperationalError):
+                self.client.get(reverse('patient-list'))
+
+
+class AdmissionControlTestCase(APITestCase):
+    """Test priority-aware admission control and load shedding"""
+    
+    def setUp(self):
+        from unittest import mock
+        from django.core.cache import cache
+        from rest_framework_simplejwt.tokens import AccessToken
+        from .admission import LocalLimiter
+        
+        cache.clear()
+        for patcher in (
+            mock.patch('consults.admission.local_limiter', LocalLimiter()),
+            mock.patch.dict('consults.admission._departments', clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.med_dept = Department.objects.create(name='Medicine', code='MED')
+        self.card_dept = Department.objects.create(name='Cardiology', code='CARD')
+        self.doctor = User.objects.create_user(username='doc1', password='pass', department=self.med_dept)
+        self.patient = Patient.objects.create(hospital_id='MRN001', name='John Doe', age=45, gender='M')
+        self.consult = ConsultRequest.objects.create(
+            patient=self.patient, from_department=self.med_dept, to_department=self.card_dept,
+            requested_by=self.doctor, clinical_summary='Test', consult_question='Test'
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.doctor)}')
+    
+    def test_classify(self):
+        """Test writes and the worklist are critical, detail reads and searches read, lists polling"""
+        from rest_framework.test import APIRequestFactory
+        from .admission import classify
+        
+        factory = APIRequestFactory()
+        self.assertEqual(classify(factory.post('/api/consults/')), 'critical')
+        self.assertEqual(classify(factory.patch('/api/consults/1/update_status/')), 'critical')
+        self.assertEqual(classify(factory.post('/api/auth/refresh/')), 'critical')
+        self.assertEqual(classify(factory.get('/api/consults/worklist/')), 'critical')
+        self.assertEqual(classify(factory.get('/api/consults/1/')), 'read')
+        self.assertEqual(classify(factory.get('/api/consults/1/comments/')), 'read')
+        self.assertEqual(classify(factory.get('/api/patients/', {'search': 'doe'})), 'read')
+        self.assertEqual(classify(factory.get('/api/consults/', {'role': 'incoming'})), 'poll')
+        self.assertEqual(classify(factory.get('/api/departments/')), 'poll')
+    
+    def test_polling_shed_before_reads_and_writes(self):
+        """Test polls are refused at half a bucket, reads at empty, and writes never"""
+        from django.test import override_settings
+        from .admission import admission_stats
+        
+        shed_before = admission_stats()['shed'].get('poll:rate', 0)
+        with override_settings(ADMISSION_USER_RATE=0.01, ADMISSION_USER_BURST=4):
+            polls = [self.client.get(reverse('consult-list')).status_code for _ in range(3)]
+            self.assertEqual(polls, [200, 200, 429])
+            response = self.client.get(reverse('consult-list'))
+            self.assertGreaterEqual(int(response['Retry-After']), 1)
+            
+            detail = reverse('consult-detail', args=[self.consult.id])
+            reads = [self.client.get(detail).status_code for _ in range(3)]
+            self.assertEqual(reads, [200, 200, 429])
+            
+            response = self.client.post(
+                reverse('consult-add-comment', args=[self.consult.id]), {'message': 'Seen'}, format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.client.get(reverse('consult-worklist')).status_code, status.HTTP_200_OK)
+        
+        health = self.client.get(reverse('health'))
+        self.assertEqual(health.status_code, status.HTTP_200_OK)
+        self.assertEqual(health.data['admission']['shed']['poll:rate'], shed_before + 2)
+    
+    def test_department_bucket_shared_by_its_users(self):
+        """Test one department's users draw from the same department allowance"""
+        from django.test import override_settings
+        from rest_framework_simplejwt.tokens import AccessToken
+        
+        colleague = User.objects.create_user(username='doc2', password='pass', department=self.med_dept)
+        other = User.objects.create_user(username='doc3', password='pass', department=self.card_dept)
+        detail = reverse('consult-detail', args=[self.consult.id])
+        with override_settings(ADMISSION_DEPARTMENT_RATE=0.01, ADMISSION_DEPARTMENT_BURST=2):
+            self.assertEqual(self.client.get(detail).status_code, status.HTTP_200_OK)
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(colleague)}')
+            self.assertEqual(self.client.get(detail).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get(detail).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(other)}')
+            self.assertEqual(self.client.get(detail).status_code, status.HTTP_200_OK)
+    
+    def test_concurrency_reserved_for_critical(self):
+        """Test a busy worker refuses lower classes first and still admits writes"""
+        from unittest import mock
+        from django.test import override_settings
+        
+        with override_settings(ADMISSION_CONCURRENCY={'read': 3, 'poll': 2}):
+            with mock.patch('consults.admission._in_flight', 2):
+                self.assertEqual(self.client.get(reverse('consult-list')).status_code, 429)
+                detail = self.client.get(reverse('consult-detail', args=[self.consult.id]))
+                self.assertEqual(detail.status_code, status.HTTP_200_OK)
+            with mock.patch('consults.admission._in_flight', 3):
+                response = self.client.get(reverse('consult-detail', args=[self.consult.id]))
+                self.assertEqual(response.status_code, 429)
+                self.assertEqual(response['Retry-After'], '1')
+                self.assertEqual(self.client.get(reverse('consult-worklist')).status_code, status.HTTP_200_OK)
+    
+    def test_shared_buckets(self):
+        """Test the shared backend counts requests in the cache"""
+        from django.test import override_settings
+        
+        with override_settings(ADMISSION_SHARED=True, ADMISSION_USER_RATE=0.01, ADMISSION_USER_BURST=4):
+            polls = [self.client.get(reverse('consult-list')).status_code for _ in range(3)]
+        self.assertEqual(polls, [200, 200, 429])
+    
+    def test_tracked_users_bounded(self):
+        """Test remembered departments and buckets stay within MAX_TRACKED"""
+        from unittest import mock
+        from .admission import LocalLimiter, _departments, _department_id
+        
+        with mock.patch('consults.admission.MAX_TRACKED', 3):
+            for user_id in range(10):
+                _department_id(user_id)
+            self.assertEqual(len(_departments), 3)
+            self.assertIn(9, _departments)
+            
+            limiter = LocalLimiter()
+            for user_id in range(10):
+                self.assertEqual(limiter.acquire([(f'user:{user_id}', 1, 5)], 0), 0)
+            self.assertLessEqual(len(limiter._buckets), 3)
+    
+    def test_disabled(self):
+        """Test nothing is shed with admission control off"""
+        from django.test import override_settings
+        
+        with override_settings(ADMISSION_CONTROL=False, ADMISSION_USER_RATE=0.01, ADMISSION_USER_BURST=1):
+            for _ in range(3):
+                self.assertEqual(self.client.get(reverse('consult-list')).status_code, status.HTTP_200_OK)
+
+
+class LoadTestCommandTestCase(LiveServerTestCase):
+    """Test the load_test generator against a live server"""
+    
+    def setUp(self):
+        source = Department.objects.create(name='Medicine', code='MED')
+        target = Department.objects.create(name='Cardiology', code='CARD')
+        doctor = User.objects.create_user(username='load_doctor', password='pass123', department=target)
+        patient = Patient.objects.create(hospital_id='MRN001', name='Alice Anderson', age=45, gender='F')
+        ConsultRequest.objects.create(
+            patient=patient, from_department=source, to_department=target, requested_by=doctor,
+            clinical_summary='Chest pain', consult_question='Evaluate'
+        )
+    
+    def run_load_test(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+        
+        out = StringIO()
+        call_command(
+            'load_test', '--base-url', self.live_server_url, '--users', '1', '--usernames', 'load_doctor',
+            '--password', 'pass123', '--requests-per-user', '25', '--think-time', '0', '--ramp-up', '0',
+            '--mix', 'inbox=1,worklist=1,search=1,comment=1,create=1', '--seed', '1', *args, stdout=out
+        )
+        return out.getvalue()
+    
+    def test_mixed_workload_report(self):
+        """Test every operation in the mix runs without errors and is reported"""
+        output = self.run_load_test('--slo', 'inbox=60000,create=60000')
+        
+        for operation in ('login', 'inbox', 'worklist', 'search', 'comment', 'create'):
+            self.assertIn(f'  {operation} ', output)
+        self.assertIn('0.00% errors', output)
+        self.assertIn('All SLOs met', output)
+        self.assertTrue(ConsultComment.objects.filter(author__username='load_doctor').exists())
+        self.assertGreater(ConsultRequest.objects.count(), 1)
+    
+    def test_duplicate_creates_are_not_errors(self):
+        """Test a create refused because the patient already has an open consult isn't counted as an error"""
+        from .management.commands.load_test import Recorder
+        
+        recorder = Recorder()
+        recorder.record('create', 5, 409, expected=(409,))
+        recorder.record('create', 5, 200, expected=(409,))
+        recorder.record('comment', 5, 409)
+        recorder.record('create', 5, 500, expected=(409,))
+        self.assertEqual(dict(recorder.errors), {'comment': 1, 'create': 1})
+        self.assertEqual(recorder.statuses[409], 2)
+    
+    def test_missed_slo_fails(self):
+        """Test a missed latency or error-rate objective fails the run"""
+        from django.core.management.base import CommandError
+        
+        with self.assertRaisesMessage(CommandError, 'inbox p95'):
+            self.run_load_test('--slo', 'inbox=0')
+        with self.assertRaisesMessage(CommandError, 'error rate 100.00%'):
+            self.run_load_test('--password', 'wrong', '--requests-per-user', '2', '--slo', '')
@@ -1,12 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DepartmentViewSet, PatientViewSet, ConsultRequestViewSet
+from .views import DepartmentViewSet, PatientViewSet, ConsultRequestViewSet, ArchivedConsultViewSet, HealthView
 
 router = DefaultRouter()
 router.register(r'departments', DepartmentViewSet, basename='department')
 router.register(r'patients', PatientViewSet, basename='patient')
 router.register(r'consults', ConsultRequestViewSet, basename='consult')
+router.register(r'archived-consults', ArchivedConsultViewSet, basename='archived-consult')
 
 urlpatterns = [
+    path('health/', HealthView.as_view(), name='health'),
     path('', include(router.urls)),
 ]
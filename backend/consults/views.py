@@ -1,32 +1,60 @@
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.views import APIView
+from django.db import IntegrityError, transaction
 from django.db.models import Q
-from .models import Department, Patient, ConsultRequest, ConsultComment
+from django.utils.dateparse import parse_datetime
+from .admission import admission_stats
+from .budgets import LatencyBudgetMixin, timeout_stats
+from .dbpool import check_database, pool_stats
+from .routers import ReplicaReadMixin
+from .compiled import CompiledListMixin
+from .fieldsets import SparseFieldsetMixin, optimize_queryset
+from .cache import CachedListMixin, bump_generation_on_commit
+from .coalesce import CoalescedReadMixin
+from .bus import LocalCachedListMixin
+from .idempotency import idempotent
+from .notifications import notify, notify_many
+from .models import Department, Patient, ConsultRequest, ConsultComment, ArchivedConsult
 from .serializers import (
     DepartmentSerializer, PatientSerializer,
-    ConsultRequestSerializer, ConsultRequestCreateSerializer, ConsultCommentSerializer
+    ConsultRequestSerializer, ConsultRequestCreateSerializer, ConsultCommentSerializer,
+    ArchivedConsultSerializer
 )
 
 
-class DepartmentViewSet(viewsets.ReadOnlyModelViewSet):
+# Most consults one bulk_status request may change.
+BULK_STATUS_LIMIT = 200
+
+
+class DepartmentViewSet(ReplicaReadMixin, CoalescedReadMixin, LocalCachedListMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for listing departments"""
     queryset = Department.objects.all()
     serializer_class = DepartmentSerializer
     permission_classes = [IsAuthenticated]
+    local_cache_depends_on = [Department]
 
 
-class PatientViewSet(viewsets.ModelViewSet):
+class PatientViewSet(LatencyBudgetMixin, ReplicaReadMixin, CoalescedReadMixin, SparseFieldsetMixin,
+                     CompiledListMixin, viewsets.ModelViewSet):
     """ViewSet for managing patients"""
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter]
     search_fields = ['hospital_id', 'name']
+    latency_budgets = {
+        'list': 500, 'search': 1000, 'retrieve': 500, 'create': 1000, 'update': 1000, 'partial_update': 1000,
+    }
+    
+    def get_queryset(self):
+        return optimize_queryset(super().get_queryset(), self.get_serializer_class(), self.get_fieldset())
 
 
-class ConsultRequestViewSet(viewsets.ModelViewSet):
+class ConsultRequestViewSet(LatencyBudgetMixin, ReplicaReadMixin, CoalescedReadMixin, SparseFieldsetMixin,
+                            CachedListMixin, CompiledListMixin, viewsets.ModelViewSet):
     """ViewSet for managing consultation requests"""
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter]
@@ -36,6 +64,22 @@ class ConsultRequestViewSet(viewsets.ModelViewSet):
         'from_department__name',
         'to_department__name'
     ]
+    # Milliseconds. Inbox and worklist reads are kept tight, and searches
+    # across the joined tables get their own, larger budget.
+    latency_budgets = {
+        'list': 1000,
+        'search': 2000,
+        'worklist': 500,
+        'retrieve': 500,
+        'comments': 500,
+        'create': 2000,
+        'add_comment': 1000,
+        'update_status': 1000,
+        'bulk_status': 5000,
+        'update': 1000,
+        'partial_update': 1000,
+        'destroy': 1000,
+    }
     
     def get_queryset(self):
         user = self.request.user
@@ -45,7 +89,13 @@ class ConsultRequestViewSet(viewsets.ModelViewSet):
         role = self.request.query_params.get('role', None)
         status_filter = self.request.query_params.get('status', None)
         
-        if role == 'incoming':
+        if self.action == 'worklist':
+            # Only open consults have a sort key, so this walks the
+            # consult_worklist partial index in order.
+            queryset = queryset.filter(
+                to_department=user.department, triage_at__isnull=False
+            ).order_by('triage_at', 'id')
+        elif role == 'incoming':
             # Show consults where user's department is the target
             queryset = queryset.filter(to_department=user.department)
         elif role == 'outgoing':
@@ -60,16 +110,38 @@ class ConsultRequestViewSet(viewsets.ModelViewSet):
         if status_filter:
             queryset = queryset.filter(status=status_filter)
         
-        return queryset.select_related(
-            'patient', 'from_department', 'to_department', 'requested_by'
-        ).prefetch_related('comments')
+        if self.action in ('comments', 'add_comment'):
+            # These actions only need the consult's key; comments are loaded separately.
+            return queryset.only('pk')
+        
+        serializer_class = self.get_serializer_class()
+        return optimize_queryset(queryset, serializer_class, self.get_fieldset(serializer_class))
     
     def get_serializer_class(self):
         if self.action == 'create':
             return ConsultRequestCreateSerializer
         return ConsultRequestSerializer
     
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        if serializer.existing:
+            # The patient already has an open consult with that department.
+            # It is handed back (200 rather than 201) only to a department
+            # that can already see it; anyone else just learns its id.
+            if not self.get_queryset().filter(pk=serializer.instance.pk).exists():
+                return Response(
+                    {'error': 'The patient already has an open consult with this department',
+                     'id': serializer.instance.pk},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=self.get_success_headers(serializer.data))
+    
     @action(detail=True, methods=['post'])
+    @idempotent
     def add_comment(self, request, pk=None):
         """Add a comment to a consultation request"""
         consult = self.get_object()
@@ -81,21 +153,29 @@ class ConsultRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        comment = ConsultComment.objects.create(
-            consult=consult,
-            author=request.user,
-            message=message
-        )
+        with transaction.atomic():
+            comment = ConsultComment.objects.create(
+                consult=consult,
+                author=request.user,
+                message=message
+            )
+            notify('commented', consult.pk, request.user)
         
         serializer = ConsultCommentSerializer(comment)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
+    @action(detail=False, methods=['get'])
+    def worklist(self, request):
+        """Open incoming consults, most urgent first (priority head start plus waiting time)"""
+        return self.list(request)
+    
     @action(detail=True, methods=['get'])
     def comments(self, request, pk=None):
         """Get all comments for a consultation request"""
         consult = self.get_object()
-        comments = consult.comments.all()
-        serializer = ConsultCommentSerializer(comments, many=True)
+        fields = self.get_fieldset(ConsultCommentSerializer)
+        comments = optimize_queryset(consult.comments.all(), ConsultCommentSerializer, fields)
+        serializer = ConsultCommentSerializer(comments, many=True, fields=fields)
         return Response(serializer.data)
     
     @action(detail=True, methods=['patch'])
@@ -110,8 +190,120 @@ class ConsultRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        consult.status = new_status
-        consult.save()
+        # Clients replaying a change made offline send the updated_at they
+        # saw; if the consult has changed since, the change is refused.
+        expected = request.data.get('updated_at')
+        try:
+            expected_at = parse_datetime(expected) if isinstance(expected, str) else None
+        except ValueError:
+            expected_at = None
+        if expected is not None and expected_at is None:
+            return Response(
+                {'error': 'Invalid updated_at value'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        with transaction.atomic():
+            if expected_at is not None:
+                current = ConsultRequest.objects.select_for_update().filter(pk=consult.pk).values_list(
+                    'updated_at', flat=True
+                ).first()
+                if current != expected_at:
+                    consult.refresh_from_db()
+                    return Response(
+                        {'error': 'Consult has changed since it was loaded', 'consult': self.get_serializer(consult).data},
+                        status=status.HTTP_409_CONFLICT
+                    )
+            consult.status = new_status
+            try:
+                with transaction.atomic():
+                    consult.save()
+            except IntegrityError:
+                return Response(
+                    {'error': 'The patient already has an open consult with this department'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            notify('status_changed', consult.pk, request.user)
         
         serializer = self.get_serializer(consult)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        """Move several consults to one status with a single UPDATE, reporting the outcome per id"""
+        ids = request.data.get('ids')
+        new_status = request.data.get('status')
+        
+        if new_status not in dict(ConsultRequest.STATUS_CHOICES):
+            return Response(
+                {'error': 'Invalid status value'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (not isinstance(ids, list) or not 0 < len(ids) <= BULK_STATUS_LIMIT
+                or not all(type(pk) is int for pk in ids)):
+            return Response(
+                {'error': f'ids must be a list of 1 to {BULK_STATUS_LIMIT} consult ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        department_id = request.user.department_id
+        visible = ConsultRequest.objects.filter(
+            Q(to_department_id=department_id) | Q(from_department_id=department_id), pk__in=ids
+        )
+        with transaction.atomic():
+            # Lock the consults first, so the outcomes reported are the ones applied.
+            rows = list(visible.select_for_update().values_list(
+                'pk', 'status', 'from_department_id', 'to_department_id'
+            ))
+            changed = {pk for pk, current, _, _ in rows if current != new_status}
+            if changed:
+                try:
+                    with transaction.atomic():
+                        visible.exclude(status=new_status).set_status(new_status)
+                except IntegrityError:
+                    return Response(
+                        {'error': 'A patient would have two open consults with the same department; nothing was changed'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                # set_status() sends no signals; invalidate and notify here.
+                bump_generation_on_commit(*{
+                    department for pk, _, *departments in rows if pk in changed for department in departments
+                })
+                notify_many('status_changed', changed, request.user)
+        
+        found = {pk for pk, *_ in rows}
+        results = [
+            {'id': pk, 'result': 'updated' if pk in changed else 'unchanged' if pk in found else 'not_found'}
+            for pk in dict.fromkeys(ids)
+        ]
+        return Response({'status': new_status, 'updated': len(changed), 'results': results})
+
+
+class ArchivedConsultViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet for searching archived consults of the user's department"""
+    serializer_class = ArchivedConsultSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [filters.SearchFilter]
+    search_fields = ['=patient_hospital_id', 'patient_name']
+    
+    def get_queryset(self):
+        department_id = self.request.user.department_id
+        return ArchivedConsult.objects.filter(
+            Q(to_department_id=department_id) | Q(from_department_id=department_id)
+        )
+
+
+class HealthView(APIView):
+    """Liveness check reporting database reachability, pool metrics, budget timeouts and load shedding"""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        database = check_database()
+        return Response(
+            {
+                'status': 'ok' if database['ok'] else 'error', 'database': database, 'pool': pool_stats(),
+                'timeouts': timeout_stats(), 'admission': admission_stats(),
+            },
+            status=status.HTTP_200_OK if database['ok'] else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
@@ -13,6 +13,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
+from copy import deepcopy
+from importlib.util import find_spec
+from corsheaders.defaults import default_headers
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -48,6 +52,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'consults.admission.AdmissionControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -65,6 +70,8 @@ CORS_ALLOWED_ORIGINS = [
     'http://172.235.33.181:3001',
 ]
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed', 'Retry-After']
 
 ROOT_URLCONF = 'core.urls'
 
@@ -89,6 +96,21 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connection reuse: 'none' opens a connection per request, 'persistent' keeps
+# one connection per worker thread alive for DB_CONN_MAX_AGE seconds, and
+# 'pool' uses psycopg 3's connection pool (requires psycopg[pool]).
+DB_POOL_MODE = config('DB_POOL_MODE', default='persistent')
+
+# Pool sizing: every gunicorn worker process owns its own pool, so a worker
+# never needs more connections than it has threads. Keep
+# WEB_CONCURRENCY * DB_POOL_MAX_SIZE below PostgreSQL's max_connections,
+# leaving headroom for migrations, admin shells and replicas.
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=3, cast=int)
+GUNICORN_THREADS = config('GUNICORN_THREADS', default=1, cast=int)
+DB_POOL_MIN_SIZE = config('DB_POOL_MIN_SIZE', default=1, cast=int)
+DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=GUNICORN_THREADS + 1, cast=int)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10, cast=float)
+
 if config('USE_SQLITE', default=False, cast=bool):
     DATABASES = {
         'default': {
@@ -108,6 +130,158 @@ else:
         }
     }
 
+if DB_POOL_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif DB_POOL_MODE == 'pool' and DATABASES['default']['ENGINE'].endswith('postgresql'):
+    # Pooled connections are health-checked by the pool itself before being
+    # handed out; CONN_MAX_AGE must stay 0 when pooling.
+    if find_spec('psycopg_pool') is None:
+        raise ImproperlyConfigured(
+            "DB_POOL_MODE=pool requires psycopg 3 with its pool: pip install 'psycopg[binary,pool]'"
+        )
+    from psycopg_pool import ConnectionPool
+
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+            'check': ConnectionPool.check_connection,
+        },
+    }
+
+
+# Read replicas: safe reads from the consult, patient and department APIs are
+# routed to replicas, except for users who wrote within REPLICA_STICKY_SECONDS.
+# DB_REPLICA_HOSTS adds PostgreSQL replicas sharing the primary's credentials;
+# USE_SQLITE_REPLICA adds a second SQLite file as a local stand-in (refresh it
+# with `manage.py sync_sqlite_replica`).
+for index, host in enumerate(filter(None, config('DB_REPLICA_HOSTS', default='').split(',')), start=1):
+    DATABASES[f'replica{index}'] = deepcopy(DATABASES['default'])
+    DATABASES[f'replica{index}'].update({'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}})
+
+if config('USE_SQLITE_REPLICA', default=False, cast=bool) and DATABASES['default']['ENGINE'].endswith('sqlite3'):
+    DATABASES['replica1'] = deepcopy(DATABASES['default'])
+    DATABASES['replica1'].update({'NAME': BASE_DIR / 'db_replica.sqlite3', 'TEST': {'MIRROR': 'default'}})
+
+DATABASE_ROUTERS = ['consults.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Cached consult pages, generation tokens and read-your-writes pins must be
+# visible to every worker, so deployments running more than one process set
+# REDIS_URL. Without it the cache is per process, which is only right for a
+# single process such as the development server. The database cache
+# (CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache, after
+# `manage.py createcachetable`) is shared too, but puts every cached read
+# back on the primary, so it is opt-in.
+REDIS_URL = config('REDIS_URL', default='')
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.redis.RedisCache' if REDIS_URL
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': config('CACHE_LOCATION', default=REDIS_URL or 'consults_cache'),
+    }
+}
+
+# Seconds a cached /api/consults/ page may be served; 0 disables the cache.
+CONSULT_LIST_CACHE_TIMEOUT = config('CONSULT_LIST_CACHE_TIMEOUT', default=300, cast=int)
+
+# Identical concurrent GETs (same path, media type and department) wait for
+# one in-flight computation and share its response for up to
+# COALESCE_WAIT_SECONDS. COALESCE_SHARED also coordinates across workers
+# through the cache above (best with a fast shared cache such as Redis).
+COALESCE_GET_REQUESTS = config('COALESCE_GET_REQUESTS', default=True, cast=bool)
+COALESCE_SHARED = config('COALESCE_SHARED', default=False, cast=bool)
+COALESCE_WAIT_SECONDS = config('COALESCE_WAIT_SECONDS', default=5.0, cast=float)
+
+# Invalidation bus for per-process caches: 'auto' uses PostgreSQL
+# LISTEN/NOTIFY when the database is PostgreSQL and in-process delivery
+# otherwise. LOCAL_CACHE_TIMEOUT bounds staleness if a notification is missed.
+INVALIDATION_BUS = config('INVALIDATION_BUS', default='auto')
+INVALIDATION_CHANNEL = config('INVALIDATION_CHANNEL', default='consults_invalidate')
+LOCAL_CACHE_TIMEOUT = config('LOCAL_CACHE_TIMEOUT', default=60, cast=int)
+
+# Latency budgets (ms) for consult and patient API actions, enforced as
+# PostgreSQL statement_timeout (consults.budgets). Viewsets define the
+# defaults; override single actions with e.g.
+# LATENCY_BUDGETS=consult.list=1500,patient.list=800 (0 = no limit). Actions
+# without a budget get LATENCY_BUDGET_DEFAULT_MS.
+LATENCY_BUDGETS = {
+    name.strip(): int(milliseconds)
+    for name, milliseconds in (
+        item.split('=') for item in config('LATENCY_BUDGETS', default='').split(',') if item.strip()
+    )
+}
+LATENCY_BUDGET_DEFAULT_MS = config('LATENCY_BUDGET_DEFAULT_MS', default=5000, cast=int)
+
+# Admission control for /api/ (consults.admission). Reads and list polling
+# are refused with 429 once this process has ADMISSION_CONCURRENCY requests
+# in flight (capacity above that is kept for writes and the worklist), or
+# once the user's or department's token bucket runs dry (refill per second,
+# burst size). ADMISSION_SHARED keeps the buckets in the cache above so all
+# workers share them; that costs a cache increment per read, so it needs a
+# cache with atomic increments such as Redis. The concurrency limit is off by
+# default for single-threaded workers, where a request never waits behind
+# another in the same process (and the threaded development server would
+# otherwise refuse every second concurrent read).
+ADMISSION_CONTROL = config('ADMISSION_CONTROL', default=True, cast=bool)
+ADMISSION_SHARED = config('ADMISSION_SHARED', default=False, cast=bool)
+if ADMISSION_SHARED and CACHES['default']['BACKEND'].endswith('DatabaseCache'):
+    raise ImproperlyConfigured(
+        'ADMISSION_SHARED needs a cache with atomic increments such as Redis, not DatabaseCache'
+    )
+ADMISSION_USER_RATE = config('ADMISSION_USER_RATE', default=10, cast=float)
+ADMISSION_USER_BURST = config('ADMISSION_USER_BURST', default=40, cast=int)
+ADMISSION_DEPARTMENT_RATE = config('ADMISSION_DEPARTMENT_RATE', default=100, cast=float)
+ADMISSION_DEPARTMENT_BURST = config('ADMISSION_DEPARTMENT_BURST', default=300, cast=int)
+ADMISSION_CONCURRENCY = {
+    name.strip(): int(limit)
+    for name, limit in (
+        item.split('=') for item in config(
+            'ADMISSION_CONCURRENCY',
+            default=f'read={GUNICORN_THREADS - 1},poll={max(GUNICORN_THREADS // 2, 1)}' if GUNICORN_THREADS > 1 else ''
+        ).split(',') if item.strip()
+    )
+}
+
+# Responses to writes sent with an Idempotency-Key are replayed to retries
+# for IDEMPOTENCY_KEY_TTL seconds. A key whose request is still running (or
+# whose worker died) is held for at most IDEMPOTENCY_LOCK_SECONDS.
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+IDEMPOTENCY_LOCK_SECONDS = config('IDEMPOTENCY_LOCK_SECONDS', default=60, cast=int)
+
+# Background tasks (`manage.py run_tasks`). Failed tasks are retried after
+# TASK_RETRY_BASE_SECONDS * 2^(attempt - 1), capped at TASK_RETRY_MAX_SECONDS;
+# workers renew the lock on running tasks every TASK_HEARTBEAT_SECONDS (also
+# how often they look for lost tasks), and tasks whose lock is older than
+# TASK_LOCK_TIMEOUT are assumed lost and requeued. Workers serving the
+# maintenance queue purge old finished tasks every TASK_PURGE_INTERVAL seconds.
+TASK_MAX_ATTEMPTS = config('TASK_MAX_ATTEMPTS', default=5, cast=int)
+TASK_RETRY_BASE_SECONDS = config('TASK_RETRY_BASE_SECONDS', default=10, cast=int)
+TASK_RETRY_MAX_SECONDS = config('TASK_RETRY_MAX_SECONDS', default=3600, cast=int)
+TASK_LOCK_TIMEOUT = config('TASK_LOCK_TIMEOUT', default=600, cast=int)
+TASK_HEARTBEAT_SECONDS = config('TASK_HEARTBEAT_SECONDS', default=60, cast=int)
+TASK_PURGE_INTERVAL = config('TASK_PURGE_INTERVAL', default=3600, cast=int)
+# Queues (NAME=CONCURRENCY) a worker serves when started without --queue.
+TASK_WORKER_QUEUES = config('TASK_WORKER_QUEUES', default='default=4,stat=2,notifications=1,maintenance=1').split(',')
+
+# Consult notifications. STAT consults are sent immediately; other events are
+# collected into one digest per recipient every NOTIFICATION_DIGEST_SECONDS.
+# Channels are dotted paths to consults.notifications.Channel subclasses.
+NOTIFICATION_CHANNELS = config('NOTIFICATION_CHANNELS', default='consults.notifications.FileChannel').split(',')
+NOTIFICATION_FILE = config('NOTIFICATION_FILE', default=str(BASE_DIR / 'notifications.log'))
+NOTIFICATION_DIGEST_SECONDS = config('NOTIFICATION_DIGEST_SECONDS', default=60, cast=int)
+NOTIFICATION_BATCH_SIZE = config('NOTIFICATION_BATCH_SIZE', default=1000, cast=int)
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='consults@localhost')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -162,10 +336,29 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'consults.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'consults.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 50,
 }
 
+# List endpoints render through precompiled serializers over .values() rows
+# (consults.compiled); disable to fall back to the DRF serializers.
+COMPILED_SERIALIZERS = config('COMPILED_SERIALIZERS', default=True, cast=bool)
+
+# MessagePack is offered to internal integrations (Accept: application/msgpack)
+# when the optional msgpack package is installed.
+if find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('consults.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('consults.renderers.MessagePackParser')
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=24),
@@ -10,6 +10,7 @@ echo "PostgreSQL is ready!"
 # Run migrations
 echo "Running migrations..."
 python manage.py migrate --noinput
+python manage.py createcachetable
 
 # Create superuser if it doesn't exist and seed data
 echo "Seeding initial data..."
@@ -24,5 +25,5 @@ echo "Starting server..."
 if [ "$DJANGO_DEBUG" = "True" ]; then
     python manage.py runserver 0.0.0.0:8000
 else
-    gunicorn core.wsgi:application --bind 0.0.0.0:8000 --workers 3
+    gunicorn core.wsgi:application --bind 0.0.0.0:8000 --workers ${WEB_CONCURRENCY:-3} --threads ${GUNICORN_THREADS:-1}
 fi
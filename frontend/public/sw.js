@@ -0,0 +1,64 @@
+// Service worker for ward terminals.
+//
+// Keeps the app itself (index.html and the built, content-hashed assets)
+// available offline. API data is not cached here: the page keeps it in
+// IndexedDB (src/services/offlineStore.ts). Background Sync events wake the
+// open page so it can send the changes queued while offline.
+
+const CACHE = 'consults-shell-v1';
+const SYNC_TAG = 'consults-outbox';
+
+self.addEventListener('install', (event) => {
+  event.waitUntil(caches.open(CACHE).then((cache) => cache.addAll(['/index.html'])));
+  self.skipWaiting();
+});
+
+self.addEventListener('activate', (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then((keys) => Promise.all(keys.filter((key) => key !== CACHE).map((key) => caches.delete(key))))
+      .then(() => self.clients.claim())
+  );
+});
+
+const remember = (request, response) => {
+  if (response.ok) {
+    const copy = response.clone();
+    caches.open(CACHE).then((cache) => cache.put(request, copy));
+  }
+  return response;
+};
+
+self.addEventListener('fetch', (event) => {
+  const { request } = event;
+  const url = new URL(request.url);
+  if (request.method !== 'GET' || url.origin !== self.location.origin || url.pathname.startsWith('/api/')) {
+    return;
+  }
+
+  if (request.mode === 'navigate') {
+    // Network first, so a new deployment shows up at once; the last copy
+    // of the app when offline (every route is served by index.html).
+    event.respondWith(
+      fetch(request)
+        .then((response) => remember('/index.html', response))
+        .catch(() => caches.match('/index.html'))
+    );
+  } else if (url.pathname.startsWith('/assets/')) {
+    // File names change with their content, so a cached asset is never stale.
+    event.respondWith(
+      caches.match(request).then((cached) => cached || fetch(request).then((response) => remember(request, response)))
+    );
+  }
+});
+
+self.addEventListener('sync', (event) => {
+  if (event.tag !== SYNC_TAG) {
+    return;
+  }
+  event.waitUntil(
+    self.clients.matchAll({ type: 'window' }).then((clients) => {
+      clients.forEach((client) => client.postMessage({ type: SYNC_TAG }));
+    })
+  );
+});
@@ -1,29 +1,35 @@
-import React from 'react';
+import React, { Suspense } from 'react';
 import { BrowserRouter as Router, Routes, Route, Navigate } from 'react-router-dom';
 import { AuthProvider, useAuth } from './contexts/AuthContext';
+import SyncStatus from './components/SyncStatus';
 import LoginPage from './pages/LoginPage';
-import DashboardPage from './pages/DashboardPage';
-import NewConsultPage from './pages/NewConsultPage';
-import ConsultDetailPage from './pages/ConsultDetailPage';
+import { DashboardPage, NewConsultPage, ConsultDetailPage } from './routes';
+
+const PageLoading: React.FC = () => (
+  <div className="min-h-screen flex items-center justify-center">
+    <div className="text-gray-500">Loading...</div>
+  </div>
+);
 
 const ProtectedRoute: React.FC<{ children: React.ReactNode }> = ({ children }) => {
   const { isAuthenticated, loading } = useAuth();
 
   if (loading) {
-    return (
-      <div className="min-h-screen flex items-center justify-center">
-        <div className="text-gray-500">Loading...</div>
-      </div>
-    );
+    return <PageLoading />;
   }
 
-  return isAuthenticated ? <>{children}</> : <Navigate to="/login" replace />;
+  return isAuthenticated ? (
+    <Suspense fallback={<PageLoading />}>{children}</Suspense>
+  ) : (
+    <Navigate to="/login" replace />
+  );
 };
 
 function App() {
   return (
     <AuthProvider>
       <Router>
+        <SyncStatus />
         <Routes>
           <Route path="/login" element={<LoginPage />} />
           <Route
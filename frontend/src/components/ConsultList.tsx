@@ -1,19 +1,90 @@
-import React, { useEffect, useState } from 'react';
+import React, { memo, useCallback, useEffect, useRef, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { consultsAPI } from '../services/api';
+import { useConsultPages } from '../services/queries';
 import type { ConsultRequest } from '../types';
 
 interface ConsultListProps {
   role: 'incoming' | 'outgoing';
 }
 
+// Only the rows in view (plus OVERSCAN either side) are in the DOM, so every
+// row must have the same height.
+const ROW_HEIGHT = 73;
+const OVERSCAN = 8;
+// Fetch the next page when the user scrolls within this many rows of the end.
+const LOAD_MORE_THRESHOLD = 20;
+
+const getPriorityColor = (priority: string) => {
+  switch (priority) {
+    case 'stat':
+      return 'bg-red-100 text-red-800';
+    case 'urgent':
+      return 'bg-orange-100 text-orange-800';
+    default:
+      return 'bg-green-100 text-green-800';
+  }
+};
+
+const getStatusColor = (status: string) => {
+  switch (status) {
+    case 'completed':
+      return 'bg-blue-100 text-blue-800';
+    case 'in_progress':
+      return 'bg-yellow-100 text-yellow-800';
+    case 'cancelled':
+      return 'bg-gray-100 text-gray-800';
+    default:
+      return 'bg-purple-100 text-purple-800';
+  }
+};
+
+// Re-rendered only when its consult changes, not on every scroll.
+const ConsultRow = memo(({ consult, onOpen }: { consult: ConsultRequest; onOpen: (id: number) => void }) => (
+  <tr className="hover:bg-gray-50" style={{ height: ROW_HEIGHT }}>
+    <td className="px-6 py-4 whitespace-nowrap">
+      <div className="text-sm font-medium text-gray-900">
+        {consult.patient_details.name}
+      </div>
+      <div className="text-sm text-gray-500">
+        {consult.patient_details.hospital_id}
+      </div>
+    </td>
+    <td className="px-6 py-4 whitespace-nowrap">
+      <div className="text-sm text-gray-900">
+        {consult.from_department_name} → {consult.to_department_name}
+      </div>
+    </td>
+    <td className="px-6 py-4 whitespace-nowrap">
+      <span className={`px-2 py-1 inline-flex text-xs leading-5 font-semibold rounded-full ${getPriorityColor(consult.priority)}`}>
+        {consult.priority.toUpperCase()}
+      </span>
+    </td>
+    <td className="px-6 py-4 whitespace-nowrap">
+      <span className={`px-2 py-1 inline-flex text-xs leading-5 font-semibold rounded-full ${getStatusColor(consult.status)}`}>
+        {consult.status.replace('_', ' ').toUpperCase()}
+      </span>
+    </td>
+    <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">
+      {new Date(consult.created_at).toLocaleDateString()}
+    </td>
+    <td className="px-6 py-4 whitespace-nowrap text-sm font-medium">
+      <button
+        onClick={() => onOpen(consult.id)}
+        className="text-blue-600 hover:text-blue-900"
+      >
+        View Details
+      </button>
+    </td>
+  </tr>
+));
+
 const ConsultList: React.FC<ConsultListProps> = ({ role }) => {
-  const [consults, setConsults] = useState<ConsultRequest[]>([]);
-  const [loading, setLoading] = useState(true);
-  const [error, setError] = useState('');
   const [statusFilter, setStatusFilter] = useState('');
   const [searchTerm, setSearchTerm] = useState('');
   const [debouncedSearchTerm, setDebouncedSearchTerm] = useState('');
+  const [scrollTop, setScrollTop] = useState(0);
+  const [viewportHeight, setViewportHeight] = useState(600);
+  const scrollRef = useRef<HTMLDivElement>(null);
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -25,71 +96,55 @@ const ConsultList: React.FC<ConsultListProps> = ({ role }) => {
     };
   }, [searchTerm]);
 
+  // Served from the query cache when revisited; a search superseded by the
+  // next keystroke is aborted rather than raced. Further pages load as the
+  // user scrolls.
+  const { items: consults, total, loading, loadingMore, error, hasMore, loadMore } = useConsultPages({
+    role,
+    status: statusFilter || undefined,
+    search: debouncedSearchTerm || undefined,
+  });
+
+  // New filters start at the top of the list.
   useEffect(() => {
-    loadConsults();
+    scrollRef.current?.scrollTo({ top: 0 });
+    setScrollTop(0);
   }, [role, statusFilter, debouncedSearchTerm]);
 
-  const loadConsults = async () => {
-    setLoading(true);
-    setError('');
-    try {
-      const params = {
-        role,
-        status: statusFilter || undefined,
-        search: debouncedSearchTerm || undefined,
-      };
-      const data = await consultsAPI.list(params);
-      setConsults(data.results);
-    } catch (err: any) {
-      setError('Failed to load consults');
-      console.error(err);
-    } finally {
-      setLoading(false);
-    }
-  };
-
-  const getPriorityColor = (priority: string) => {
-    switch (priority) {
-      case 'stat':
-        return 'bg-red-100 text-red-800';
-      case 'urgent':
-        return 'bg-orange-100 text-orange-800';
-      default:
-        return 'bg-green-100 text-green-800';
-    }
-  };
-
-  const getStatusColor = (status: string) => {
-    switch (status) {
-      case 'completed':
-        return 'bg-blue-100 text-blue-800';
-      case 'in_progress':
-        return 'bg-yellow-100 text-yellow-800';
-      case 'cancelled':
-        return 'bg-gray-100 text-gray-800';
-      default:
-        return 'bg-purple-100 text-purple-800';
+  useEffect(() => {
+    const element = scrollRef.current;
+    if (!element) return;
+    const observer = new ResizeObserver(() => setViewportHeight(element.clientHeight));
+    observer.observe(element);
+    return () => observer.disconnect();
+  }, []);
+
+  const first = Math.max(0, Math.floor(scrollTop / ROW_HEIGHT) - OVERSCAN);
+  const last = Math.min(consults.length, Math.ceil((scrollTop + viewportHeight) / ROW_HEIGHT) + OVERSCAN);
+
+  useEffect(() => {
+    if (hasMore && !loadingMore && last >= consults.length - LOAD_MORE_THRESHOLD) {
+      loadMore();
     }
-  };
+  }, [hasMore, loadingMore, last, consults.length, loadMore]);
+
+  const openConsult = useCallback((id: number) => navigate(`/consults/${id}`), [navigate]);
 
+  let placeholder: React.ReactNode = null;
   if (loading) {
-    return (
+    placeholder = (
       <div className="flex justify-center items-center py-12">
         <div className="text-gray-500">Loading consults...</div>
       </div>
     );
-  }
-
-  if (error) {
-    return (
+  } else if (error && consults.length === 0) {
+    placeholder = (
       <div className="bg-red-50 border border-red-200 text-red-700 px-4 py-3 rounded">
-        {error}
+        Failed to load consults
       </div>
     );
-  }
-
-  if (consults.length === 0) {
-    return (
+  } else if (consults.length === 0) {
+    placeholder = (
       <div className="text-center py-12 text-gray-500">
         No {role} consults found
       </div>
@@ -97,9 +152,9 @@ const ConsultList: React.FC<ConsultListProps> = ({ role }) => {
   }
 
   return (
-    <div className="overflow-x-auto">
+    <div>
       {/* Filters */}
-      <div className="mb-4 flex space-x-4">
+      <div className="mb-4 flex space-x-4 items-center">
         {/* Status Filter */}
         <select
           value={statusFilter}
@@ -121,71 +176,60 @@ const ConsultList: React.FC<ConsultListProps> = ({ role }) => {
           placeholder="Search by patient..."
           className="border-gray-300 rounded-md w-64"
         />
+
+        {!placeholder && (
+          <span className="text-sm text-gray-500">
+            Showing {consults.length} of {total}
+          </span>
+        )}
+      </div>
+      <div
+        ref={scrollRef}
+        onScroll={(e) => setScrollTop(e.currentTarget.scrollTop)}
+        className="overflow-auto max-h-[70vh]"
+      >
+        {placeholder ?? (
+          <table className="min-w-full divide-y divide-gray-200">
+            <thead className="bg-gray-50 sticky top-0 z-10">
+              <tr>
+                <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
+                  Patient
+                </th>
+                <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
+                  From → To
+                </th>
+                <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
+                  Priority
+                </th>
+                <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
+                  Status
+                </th>
+                <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
+                  Created
+                </th>
+                <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
+                  Actions
+                </th>
+              </tr>
+            </thead>
+            <tbody className="bg-white divide-y divide-gray-200">
+              {/* Spacers stand in for the rows outside the window. */}
+              {first > 0 && <tr style={{ height: first * ROW_HEIGHT }} />}
+              {consults.slice(first, last).map((consult) => (
+                <ConsultRow key={consult.id} consult={consult} onOpen={openConsult} />
+              ))}
+              {last < consults.length && <tr style={{ height: (consults.length - last) * ROW_HEIGHT }} />}
+              {loadingMore && (
+                <tr>
+                  <td colSpan={6} className="px-6 py-4 text-center text-sm text-gray-500">
+                    Loading more...
+                  </td>
+                </tr>
+              )}
+            </tbody>
+          </table>
+        )}
       </div>
-      <table className="min-w-full divide-y divide-gray-200">
-        <thead className="bg-gray-50">
-          <tr>
-            <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
-              Patient
-            </th>
-            <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
-              From → To
-            </th>
-            <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
-              Priority
-            </th>
-            <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
-              Status
-            </th>
-            <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
-              Created
-            </th>
-            <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
-              Actions
-            </th>
-          </tr>
-        </thead>
-        <tbody className="bg-white divide-y divide-gray-200">
-          {consults.map((consult) => (
-            <tr key={consult.id} className="hover:bg-gray-50">
-              <td className="px-6 py-4 whitespace-nowrap">
-                <div className="text-sm font-medium text-gray-900">
-                  {consult.patient_details.name}
-                </div>
-                <div className="text-sm text-gray-500">
-                  {consult.patient_details.hospital_id}
-                </div>
-              </td>
-              <td className="px-6 py-4 whitespace-nowrap">
-                <div className="text-sm text-gray-900">
-                  {consult.from_department_name} → {consult.to_department_name}
-                </div>
-              </td>
-              <td className="px-6 py-4 whitespace-nowrap">
-                <span className={`px-2 py-1 inline-flex text-xs leading-5 font-semibold rounded-full ${getPriorityColor(consult.priority)}`}>
-                  {consult.priority.toUpperCase()}
-                </span>
-              </td>
-              <td className="px-6 py-4 whitespace-nowrap">
-                <span className={`px-2 py-1 inline-flex text-xs leading-5 font-semibold rounded-full ${getStatusColor(consult.status)}`}>
-                  {consult.status.replace('_', ' ').toUpperCase()}
-                </span>
-              </td>
-              <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">
-                {new Date(consult.created_at).toLocaleDateString()}
-              </td>
-              <td className="px-6 py-4 whitespace-nowrap text-sm font-medium">
-                <button
-                  onClick={() => navigate(`/consults/${consult.id}`)}
-                  className="text-blue-600 hover:text-blue-900"
-                >
-                  View Details
-                </button>
-              </td>
-            </tr>
-          ))}
-        </tbody>
-      </table>
     </div>
   );
 };
@@ -0,0 +1,54 @@
+import React, { useEffect, useState } from 'react';
+import { describeMutation, dismissSyncProblems, useOutbox } from '../services/outbox';
+
+// Connection and offline-sync banner shown above every page.
+const SyncStatus: React.FC = () => {
+  const { pending, syncing, problems } = useOutbox();
+  const [online, setOnline] = useState(navigator.onLine);
+
+  useEffect(() => {
+    const update = () => setOnline(navigator.onLine);
+    window.addEventListener('online', update);
+    window.addEventListener('offline', update);
+    return () => {
+      window.removeEventListener('online', update);
+      window.removeEventListener('offline', update);
+    };
+  }, []);
+
+  if (online && !pending && !problems.length) {
+    return null;
+  }
+
+  return (
+    <div className="text-sm">
+      {(!online || pending > 0) && (
+        <div className="bg-yellow-50 border-b border-yellow-200 text-yellow-800 px-4 py-2 text-center">
+          {!online && 'Offline: showing the last data loaded on this terminal. '}
+          {pending > 0 &&
+            (syncing
+              ? `Sending ${pending} saved change${pending > 1 ? 's' : ''}...`
+              : `${pending} change${pending > 1 ? 's' : ''} will be sent when the connection returns.`)}
+        </div>
+      )}
+      {problems.length > 0 && (
+        <div className="bg-red-50 border-b border-red-200 text-red-700 px-4 py-2">
+          <div className="max-w-7xl mx-auto flex justify-between items-start">
+            <ul>
+              {problems.map((problem, index) => (
+                <li key={index}>
+                  {describeMutation(problem.mutation)} was not applied: {problem.reason}.
+                </li>
+              ))}
+            </ul>
+            <button onClick={dismissSyncProblems} className="ml-4 font-medium hover:text-red-900">
+              Dismiss
+            </button>
+          </div>
+        </div>
+      )}
+    </div>
+  );
+};
+
+export default SyncStatus;
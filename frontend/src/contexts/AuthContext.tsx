@@ -1,5 +1,7 @@
 import React, { createContext, useContext, useState, useEffect, ReactNode } from 'react';
-import { authAPI } from '../services/api';
+import { authAPI, cancelTokenRefresh, scheduleTokenRefresh } from '../services/api';
+import { clearOutbox, syncOutbox } from '../services/outbox';
+import { queryCache } from '../services/queryCache';
 import type { LoginResponse } from '../types';
 
 interface AuthContextType {
@@ -25,6 +27,7 @@ export const AuthProvider: React.FC<{ children: ReactNode }> = ({ children }) =>
     if (token && savedUsername) {
       setIsAuthenticated(true);
       setUsername(savedUsername);
+      scheduleTokenRefresh();
     }
     
     setLoading(false);
@@ -36,6 +39,11 @@ export const AuthProvider: React.FC<{ children: ReactNode }> = ({ children }) =>
       localStorage.setItem('access_token', data.access);
       localStorage.setItem('refresh_token', data.refresh);
       localStorage.setItem('username', username);
+      // Never show one user's cached data to the next on a shared terminal.
+      queryCache.clear();
+      scheduleTokenRefresh();
+      // Changes queued before the session expired can go out now.
+      syncOutbox();
       
       setIsAuthenticated(true);
       setUsername(username);
@@ -49,6 +57,9 @@ export const AuthProvider: React.FC<{ children: ReactNode }> = ({ children }) =>
     localStorage.removeItem('access_token');
     localStorage.removeItem('refresh_token');
     localStorage.removeItem('username');
+    queryCache.clear();
+    clearOutbox();
+    cancelTokenRefresh();
     setIsAuthenticated(false);
     setUsername(null);
   };
@@ -2,6 +2,16 @@ import { StrictMode } from 'react'
 import { createRoot } from 'react-dom/client'
 import './index.css'
 import App from './App.tsx'
+import { startOfflineSync } from './services/outbox'
+
+// The service worker serves the app shell offline; the dev server's modules
+// must not be cached, so it is only registered for production builds.
+if ('serviceWorker' in navigator && import.meta.env.PROD) {
+  window.addEventListener('load', () => {
+    navigator.serviceWorker.register('/sw.js').catch((err) => console.error('Service worker registration failed', err))
+  })
+}
+startOfflineSync()
 
 createRoot(document.getElementById('root')!).render(
   <StrictMode>
@@ -1,47 +1,29 @@
-import React, { useEffect, useState } from 'react';
+import React, { useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import { consultsAPI } from '../services/api';
+import { addConsultComment, updateConsultStatus, useConsult } from '../services/queries';
 import type { ConsultRequest, ConsultComment } from '../types';
 
 const ConsultDetailPage: React.FC = () => {
   const { id } = useParams<{ id: string }>();
   const navigate = useNavigate();
-  const [consult, setConsult] = useState<ConsultRequest | null>(null);
-  const [loading, setLoading] = useState(true);
-  const [error, setError] = useState('');
+  // Rendered straight from the cache when opened from a list, then revalidated.
+  const { data: consult, loading, error } = useConsult(id ? parseInt(id) : null);
   const [commentText, setCommentText] = useState('');
   const [submittingComment, setSubmittingComment] = useState(false);
   const [updatingStatus, setUpdatingStatus] = useState(false);
 
-  useEffect(() => {
-    if (id) {
-      loadConsult();
-    }
-  }, [id]);
-
-  const loadConsult = async () => {
-    setLoading(true);
-    try {
-      const data = await consultsAPI.get(parseInt(id!));
-      setConsult(data);
-    } catch (err: any) {
-      setError('Failed to load consult details');
-      console.error(err);
-    } finally {
-      setLoading(false);
-    }
-  };
-
   const handleAddComment = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!commentText.trim() || !id) return;
 
     setSubmittingComment(true);
+    const message = commentText;
+    setCommentText('');
     try {
-      await consultsAPI.addComment(parseInt(id), commentText);
-      setCommentText('');
-      await loadConsult(); // Reload to get updated comments
+      // Shown immediately; removed again if the server rejects it.
+      await addConsultComment(parseInt(id), message);
     } catch (err: any) {
+      setCommentText(message);
       alert('Failed to add comment');
       console.error(err);
     } finally {
@@ -49,13 +31,12 @@ const ConsultDetailPage: React.FC = () => {
     }
   };
 
-  const handleStatusChange = async (newStatus: string) => {
+  const handleStatusChange = async (newStatus: ConsultRequest['status']) => {
     if (!id) return;
 
     setUpdatingStatus(true);
     try {
-      await consultsAPI.updateStatus(parseInt(id), newStatus);
-      await loadConsult(); // Reload to get updated status
+      await updateConsultStatus(parseInt(id), newStatus);
     } catch (err: any) {
       alert('Failed to update status');
       console.error(err);
@@ -96,12 +77,12 @@ const ConsultDetailPage: React.FC = () => {
     );
   }
 
-  if (error || !consult) {
+  if (!consult) {
     return (
       <div className="min-h-screen bg-gray-100">
         <div className="max-w-7xl mx-auto px-4 py-8">
           <div className="bg-red-50 border border-red-200 text-red-700 px-4 py-3 rounded">
-            {error || 'Consult not found'}
+            {error ? 'Failed to load consult details' : 'Consult not found'}
           </div>
         </div>
       </div>
@@ -276,7 +257,7 @@ const ConsultDetailPage: React.FC = () => {
             <div className="bg-white rounded-lg shadow p-6">
               <h2 className="text-lg font-semibold text-gray-900 mb-4">Update Status</h2>
               <div className="space-y-2">
-                {['pending', 'in_progress', 'completed', 'cancelled'].map((status) => (
+                {(['pending', 'in_progress', 'completed', 'cancelled'] as const).map((status) => (
                   <button
                     key={status}
                     onClick={() => handleStatusChange(status)}
@@ -1,7 +1,9 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
+import { useOutbox } from '../services/outbox';
 import ConsultList from '../components/ConsultList';
+import { ConsultDetailPage, NewConsultPage, preloadWhenIdle } from '../routes';
 
 type TabType = 'incoming' | 'outgoing' | 'new';
 
@@ -9,8 +11,16 @@ const DashboardPage: React.FC = () => {
   const [activeTab, setActiveTab] = useState<TabType>('incoming');
   const { username, logout } = useAuth();
   const navigate = useNavigate();
+  const { pending } = useOutbox();
+
+  useEffect(() => preloadWhenIdle(ConsultDetailPage, NewConsultPage), []);
 
   const handleLogout = () => {
+    if (pending > 0 && !window.confirm(
+      `${pending} change${pending > 1 ? 's' : ''} made offline ha${pending > 1 ? 've' : 's'} not been sent yet and will be lost. Log out anyway?`
+    )) {
+      return;
+    }
     logout();
     navigate('/login');
   };
@@ -68,6 +78,8 @@ const DashboardPage: React.FC = () => {
               <div className="flex-1"></div>
               <button
                 onClick={handleNewConsult}
+                onMouseEnter={NewConsultPage.preload}
+                onFocus={NewConsultPage.preload}
                 className="m-2 px-4 py-2 bg-blue-600 text-white text-sm font-medium rounded-md hover:bg-blue-700"
               >
                 + New Consult
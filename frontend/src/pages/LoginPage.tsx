@@ -1,6 +1,7 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
+import { DashboardPage, preloadWhenIdle } from '../routes';
 
 const LoginPage: React.FC = () => {
   const [username, setUsername] = useState('');
@@ -10,6 +11,9 @@ const LoginPage: React.FC = () => {
   const { login } = useAuth();
   const navigate = useNavigate();
 
+  // Signing in always leads to the dashboard; fetch it while the user types.
+  useEffect(() => preloadWhenIdle(DashboardPage), []);
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     setError('');
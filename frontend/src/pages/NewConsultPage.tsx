@@ -1,13 +1,15 @@
-import React, { useState, useEffect } from 'react';
-import { useNavigate } from 'react-router-dom';
-import { consultsAPI, departmentsAPI } from '../services/api';
-import type { Department } from '../types';
+import React, { useState } from 'react';
+import { Link, useNavigate } from 'react-router-dom';
+import { createConsult, useDepartments } from '../services/queries';
 
 const NewConsultPage: React.FC = () => {
   const navigate = useNavigate();
-  const [departments, setDepartments] = useState<Department[]>([]);
+  // Cached across visits; departments are only refetched after ten minutes.
+  const { data: departments = [] } = useDepartments();
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
+  // Open consult the patient already has with the chosen department, if any.
+  const [existingId, setExistingId] = useState<number | null>(null);
 
   // Form fields
   const [hospitalId, setHospitalId] = useState('');
@@ -20,22 +22,10 @@ const NewConsultPage: React.FC = () => {
   const [clinicalSummary, setClinicalSummary] = useState('');
   const [consultQuestion, setConsultQuestion] = useState('');
 
-  useEffect(() => {
-    loadDepartments();
-  }, []);
-
-  const loadDepartments = async () => {
-    try {
-      const data = await departmentsAPI.list();
-      setDepartments(data);
-    } catch (err) {
-      console.error('Failed to load departments', err);
-    }
-  };
-
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     setError('');
+    setExistingId(null);
     setLoading(true);
 
     try {
@@ -53,10 +43,15 @@ const NewConsultPage: React.FC = () => {
         consult_question: consultQuestion,
       };
 
-      await consultsAPI.create(consultData);
-      navigate('/dashboard');
+      const created = await createConsult(consultData);
+      // The patient already had an open consult with that department: show it.
+      navigate(created?.existing ? `/consults/${created.consult.id}` : '/dashboard');
     } catch (err: any) {
-      setError(err.response?.data?.detail || 'Failed to create consult');
+      const data = err.response?.data;
+      // 409 means the patient has an open consult with that department that
+      // our department can't see; only its id is returned.
+      if (err.response?.status === 409 && data?.id) setExistingId(data.id);
+      setError(data?.error || data?.detail || 'Failed to create consult');
     } finally {
       setLoading(false);
     }
@@ -85,6 +80,14 @@ const NewConsultPage: React.FC = () => {
           {error && (
             <div className="mb-4 p-3 bg-red-100 border border-red-400 text-red-700 rounded">
               {error}
+              {existingId !== null && (
+                <>
+                  {' '}
+                  <Link to={`/consults/${existingId}`} className="underline font-medium">
+                    Consult #{existingId}
+                  </Link>
+                </>
+              )}
             </div>
           )}
 
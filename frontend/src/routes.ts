@@ -0,0 +1,33 @@
+import { lazy } from 'react';
+import type { ComponentType } from 'react';
+
+// Pages behind the login screen are split into their own chunks, so the
+// login page only has to download and parse what it needs itself.
+
+// eslint-disable-next-line @typescript-eslint/no-explicit-any
+const lazyPage = <T extends ComponentType<any>>(load: () => Promise<{ default: T }>) => {
+  let loading: Promise<{ default: T }> | undefined;
+  // Fetch the chunk ahead of navigation; a failed fetch (e.g. a Wi-Fi drop)
+  // is retried on the next attempt.
+  const preload = () =>
+    (loading ??= load().catch((err) => {
+      loading = undefined;
+      throw err;
+    }));
+  return Object.assign(lazy(preload), { preload });
+};
+
+export const DashboardPage = lazyPage(() => import('./pages/DashboardPage'));
+export const NewConsultPage = lazyPage(() => import('./pages/NewConsultPage'));
+export const ConsultDetailPage = lazyPage(() => import('./pages/ConsultDetailPage'));
+
+/** Preload pages the user is likely to open next, once the browser is idle. */
+export const preloadWhenIdle = (...pages: { preload: () => unknown }[]) => {
+  const run = () => pages.forEach((page) => page.preload());
+  if (typeof window.requestIdleCallback === 'function') {
+    const handle = window.requestIdleCallback(run, { timeout: 3000 });
+    return () => window.cancelIdleCallback(handle);
+  }
+  const timer = setTimeout(run, 1000);
+  return () => clearTimeout(timer);
+};
@@ -17,10 +17,90 @@ const api = axios.create({
   },
 });
 
+// Refresh access tokens this long before they expire, spread over a window so
+// terminals that logged in together at shift start don't all refresh at once.
+const REFRESH_MARGIN_MS = 5 * 60 * 1000;
+const REFRESH_JITTER_MS = 4 * 60 * 1000;
+
+// Expiry of a JWT in epoch milliseconds, or null if it can't be read.
+const tokenExpiry = (token: string): number | null => {
+  try {
+    const payload = token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/');
+    const { exp } = JSON.parse(atob(payload));
+    return typeof exp === 'number' ? exp * 1000 : null;
+  } catch {
+    return null;
+  }
+};
+
+const expiresWithin = (token: string, ms: number) => {
+  const expiry = tokenExpiry(token);
+  return expiry !== null && expiry - Date.now() < ms;
+};
+
+let refreshing: Promise<string> | null = null;
+let refreshTimer: ReturnType<typeof setTimeout> | undefined;
+
+/**
+ * Get a new access token. Concurrent callers share one request to
+ * /api/auth/refresh/, so a burst of 401s causes a single refresh. `rejected`
+ * is the token the server just refused, if that's why we're refreshing.
+ */
+export const refreshAccessToken = (rejected?: string): Promise<string> => {
+  if (!refreshing) {
+    refreshing = (async () => {
+      // Another tab (or an earlier burst) may already have refreshed. The
+      // early-refresh timer fires anywhere in the jittered window, so only a
+      // token expiring after that whole window counts as already refreshed.
+      const current = localStorage.getItem('access_token');
+      if (current && (rejected ? current !== rejected : !expiresWithin(current, REFRESH_MARGIN_MS + REFRESH_JITTER_MS))) {
+        scheduleTokenRefresh();
+        return current;
+      }
+      const refreshToken = localStorage.getItem('refresh_token');
+      if (!refreshToken) {
+        throw new Error('No refresh token');
+      }
+      const response = await axios.post(`${API_BASE_URL}/api/auth/refresh/`, {
+        refresh: refreshToken,
+      });
+      const { access } = response.data;
+      localStorage.setItem('access_token', access);
+      scheduleTokenRefresh();
+      return access as string;
+    })().finally(() => {
+      refreshing = null;
+    });
+  }
+  return refreshing;
+};
+
+/** Refresh the stored access token shortly before it expires; call after login. */
+export const scheduleTokenRefresh = () => {
+  clearTimeout(refreshTimer);
+  const token = localStorage.getItem('access_token');
+  const expiry = token ? tokenExpiry(token) : null;
+  if (expiry === null) return;
+  const delay = expiry - REFRESH_MARGIN_MS - Math.random() * REFRESH_JITTER_MS - Date.now();
+  refreshTimer = setTimeout(() => {
+    // Failures are left to the next request's 401 handling.
+    refreshAccessToken().catch(() => undefined);
+  }, Math.max(delay, 0));
+};
+
+export const cancelTokenRefresh = () => {
+  clearTimeout(refreshTimer);
+};
+
 // Request interceptor to add auth token
 api.interceptors.request.use(
-  (config) => {
-    const token = localStorage.getItem('access_token');
+  async (config) => {
+    let token = localStorage.getItem('access_token');
+    // The timer may not have fired (e.g. the terminal was asleep); refresh
+    // before sending rather than waiting for a 401.
+    if (token && expiresWithin(token, REFRESH_MARGIN_MS / 5)) {
+      token = await refreshAccessToken().catch(() => token);
+    }
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
@@ -31,31 +111,52 @@ api.interceptors.request.use(
   }
 );
 
+// Longest Retry-After a shed read waits for before retrying once.
+const MAX_SHED_RETRY_MS = 5000;
+
+const sleep = (ms: number, signal?: AbortSignal) =>
+  new Promise<void>((resolve) => {
+    const timer = setTimeout(resolve, ms);
+    signal?.addEventListener('abort', () => {
+      clearTimeout(timer);
+      resolve();
+    });
+  });
+
 // Response interceptor to handle token refresh
 api.interceptors.response.use(
   (response) => response,
   async (error) => {
     const originalRequest = error.config;
 
-    if (error.response?.status === 401 && !originalRequest._retry) {
+    // Reads shed by the server's admission control (429) are retried once
+    // after the Retry-After it asked for, spread out so they don't return together.
+    if (error.response?.status === 429 && originalRequest?.method === 'get' && !originalRequest._shedRetry) {
+      const retryAfter = Number(error.response.headers['retry-after']) * 1000 || 1000;
+      if (retryAfter <= MAX_SHED_RETRY_MS) {
+        originalRequest._shedRetry = true;
+        await sleep(retryAfter + Math.random() * 1000, originalRequest.signal);
+        return api(originalRequest);
+      }
+    }
+
+    if (error.response?.status === 401 && originalRequest && !originalRequest._retry) {
       originalRequest._retry = true;
 
       try {
-        const refreshToken = localStorage.getItem('refresh_token');
-        if (refreshToken) {
-          const response = await axios.post(`${API_BASE_URL}/api/auth/refresh/`, {
-            refresh: refreshToken,
-          });
-          const { access } = response.data;
-          localStorage.setItem('access_token', access);
-          originalRequest.headers.Authorization = `Bearer ${access}`;
-          return api(originalRequest);
-        }
+        // Every request failing at the same time waits for the same refresh.
+        const rejected = String(originalRequest.headers?.Authorization ?? '').replace('Bearer ', '');
+        const access = await refreshAccessToken(rejected);
+        originalRequest.headers.Authorization = `Bearer ${access}`;
+        return api(originalRequest);
       } catch (refreshError) {
         // If refresh fails, clear tokens and redirect to login
+        cancelTokenRefresh();
         localStorage.removeItem('access_token');
         localStorage.removeItem('refresh_token');
-        window.location.href = '/login';
+        if (window.location.pathname !== '/login') {
+          window.location.href = '/login';
+        }
         return Promise.reject(refreshError);
       }
     }
@@ -64,6 +165,19 @@ api.interceptors.response.use(
   }
 );
 
+/**
+ * A fresh Idempotency-Key for a write. Send the same key when retrying the
+ * write (e.g. from the offline outbox) so the server answers with the
+ * original response instead of creating a duplicate.
+ */
+export const newIdempotencyKey = (): string =>
+  // randomUUID is only available on secure (HTTPS or localhost) origins.
+  typeof crypto.randomUUID === 'function'
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+
+const idempotencyHeaders = (key?: string) => (key ? { 'Idempotency-Key': key } : undefined);
+
 // Auth API
 export const authAPI = {
   login: async (username: string, password: string): Promise<LoginResponse> => {
@@ -77,17 +191,21 @@ export const authAPI = {
 
 // Departments API
 export const departmentsAPI = {
-  list: async (): Promise<Department[]> => {
-    const response = await api.get<Department[]>('/api/departments/');
-    return response.data;
+  list: async (signal?: AbortSignal): Promise<Department[]> => {
+    const response = await api.get<Department[] | PaginatedResponse<Department>>('/api/departments/', {
+      signal,
+    });
+    // The endpoint is paginated like every list; departments fit on one page.
+    return Array.isArray(response.data) ? response.data : response.data.results;
   },
 };
 
 // Patients API
 export const patientsAPI = {
-  list: async (search?: string): Promise<PaginatedResponse<Patient>> => {
+  list: async (search?: string, signal?: AbortSignal): Promise<PaginatedResponse<Patient>> => {
     const response = await api.get<PaginatedResponse<Patient>>('/api/patients/', {
       params: { search },
+      signal,
     });
     return response.data;
   },
@@ -95,8 +213,8 @@ export const patientsAPI = {
     const response = await api.post<Patient>('/api/patients/', patient);
     return response.data;
   },
-  get: async (id: number): Promise<Patient> => {
-    const response = await api.get<Patient>(`/api/patients/${id}/`);
+  get: async (id: number, signal?: AbortSignal): Promise<Patient> => {
+    const response = await api.get<Patient>(`/api/patients/${id}/`, { signal });
     return response.data;
   },
 };
@@ -107,9 +225,20 @@ export const consultsAPI = {
     role?: 'incoming' | 'outgoing';
     status?: string;
     search?: string;
-  }): Promise<PaginatedResponse<ConsultRequest>> => {
+    page?: number;
+  }, signal?: AbortSignal): Promise<PaginatedResponse<ConsultRequest>> => {
     const response = await api.get<PaginatedResponse<ConsultRequest>>('/api/consults/', {
       params,
+      signal,
+    });
+    return response.data;
+  },
+  
+  // Open incoming consults, most urgent first (ordered by the server)
+  worklist: async (params?: { page?: number }, signal?: AbortSignal): Promise<PaginatedResponse<ConsultRequest>> => {
+    const response = await api.get<PaginatedResponse<ConsultRequest>>('/api/consults/worklist/', {
+      params,
+      signal,
     });
     return response.data;
   },
@@ -121,26 +250,35 @@ export const consultsAPI = {
     priority: string;
     clinical_summary: string;
     consult_question: string;
-  }): Promise<ConsultRequest> => {
-    const response = await api.post<ConsultRequest>('/api/consults/', data);
-    return response.data;
+  }, idempotencyKey?: string): Promise<{ consult: ConsultRequest; existing: boolean }> => {
+    const response = await api.post<ConsultRequest>('/api/consults/', data, {
+      headers: idempotencyHeaders(idempotencyKey),
+    });
+    // 200 rather than 201: the patient's open consult with that department,
+    // returned instead of opening a second one.
+    return { consult: response.data, existing: response.status === 200 };
   },
   
-  get: async (id: number): Promise<ConsultRequest> => {
-    const response = await api.get<ConsultRequest>(`/api/consults/${id}/`);
+  get: async (id: number, signal?: AbortSignal): Promise<ConsultRequest> => {
+    const response = await api.get<ConsultRequest>(`/api/consults/${id}/`, { signal });
     return response.data;
   },
   
-  updateStatus: async (id: number, status: string): Promise<ConsultRequest> => {
+  // Pass the consult's updated_at as last seen to refuse the change (409) if
+  // it has been modified since, e.g. when replaying changes made offline.
+  updateStatus: async (id: number, status: string, updatedAt?: string): Promise<ConsultRequest> => {
     const response = await api.patch<ConsultRequest>(`/api/consults/${id}/update_status/`, {
       status,
+      updated_at: updatedAt,
     });
     return response.data;
   },
   
-  addComment: async (id: number, message: string): Promise<ConsultComment> => {
+  addComment: async (id: number, message: string, idempotencyKey?: string): Promise<ConsultComment> => {
     const response = await api.post<ConsultComment>(`/api/consults/${id}/add_comment/`, {
       message,
+    }, {
+      headers: idempotencyHeaders(idempotencyKey),
     });
     return response.data;
   },
@@ -0,0 +1,63 @@
+/**
+ * IndexedDB storage backing offline use on ward terminals.
+ *
+ * `queries` keeps the last response of persisted queries (consult lists and
+ * details with their comments, departments) so pages render from disk while
+ * the network is down or slow; `outbox` holds mutations made offline until
+ * they can be sent.
+ */
+
+const DB_NAME = 'consults-offline';
+const DB_VERSION = 1;
+
+export interface StoredQuery {
+  data: unknown;
+  fetchedAt: number;
+}
+
+let opening: Promise<IDBDatabase> | null = null;
+
+const open = (): Promise<IDBDatabase> => {
+  if (!opening) {
+    opening = new Promise((resolve, reject) => {
+      const request = indexedDB.open(DB_NAME, DB_VERSION);
+      request.onupgradeneeded = () => {
+        request.result.createObjectStore('queries');
+        request.result.createObjectStore('outbox', { keyPath: 'id', autoIncrement: true });
+      };
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => {
+        opening = null;
+        reject(request.error);
+      };
+    });
+  }
+  return opening;
+};
+
+const run = async <T>(
+  store: string,
+  mode: IDBTransactionMode,
+  operation: (objects: IDBObjectStore) => IDBRequest<T>
+): Promise<T> => {
+  const db = await open();
+  return new Promise((resolve, reject) => {
+    const request = operation(db.transaction(store, mode).objectStore(store));
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+};
+
+export const offlineStore = {
+  getQuery: (key: string) => run<StoredQuery | undefined>('queries', 'readonly', (objects) => objects.get(key)),
+
+  putQuery: (key: string, value: StoredQuery) => run('queries', 'readwrite', (objects) => objects.put(value, key)),
+
+  add: <T>(store: 'outbox', value: T) => run<IDBValidKey>(store, 'readwrite', (objects) => objects.add(value)),
+
+  getAll: <T>(store: 'outbox') => run<T[]>(store, 'readonly', (objects) => objects.getAll()),
+
+  delete: (store: 'outbox', key: IDBValidKey) => run(store, 'readwrite', (objects) => objects.delete(key)),
+
+  clear: (store: 'queries' | 'outbox') => run(store, 'readwrite', (objects) => objects.clear()),
+};
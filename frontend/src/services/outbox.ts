@@ -0,0 +1,211 @@
+import axios from 'axios';
+import { useSyncExternalStore } from 'react';
+import { consultsAPI } from './api';
+import { offlineStore } from './offlineStore';
+import { queryCache } from './queryCache';
+import type { ConsultRequest } from '../types';
+
+/**
+ * Changes made while offline.
+ *
+ * Comments, status changes and new consults that can't reach the server are
+ * kept in the IndexedDB outbox (their optimistic effect stays on screen) and
+ * replayed in order when the connection returns: on the browser's `online`
+ * event, when the service worker's background sync fires, and at start-up.
+ * Status changes carry the `updated_at` the user saw; if someone else changed
+ * the consult in the meantime the server refuses it (409) and the conflict
+ * is reported instead of silently overwriting their change. Comments and new
+ * consults are replayed with the Idempotency-Key of the original attempt, so
+ * one that reached the server before the connection dropped isn't duplicated.
+ */
+
+export const SYNC_TAG = 'consults-outbox';
+
+export type Mutation =
+  | { kind: 'comment'; consultId: number; message: string; idempotencyKey?: string }
+  | { kind: 'status'; consultId: number; status: ConsultRequest['status']; updatedAt: string }
+  | { kind: 'create'; data: Parameters<typeof consultsAPI.create>[0]; idempotencyKey?: string };
+
+interface QueuedMutation {
+  id?: number;
+  username: string;
+  queuedAt: string;
+  mutation: Mutation;
+}
+
+export interface SyncProblem {
+  mutation: Mutation;
+  reason: string;
+}
+
+interface OutboxState {
+  pending: number;
+  syncing: boolean;
+  problems: SyncProblem[];
+}
+
+let state: OutboxState = { pending: 0, syncing: false, problems: [] };
+const listeners = new Set<() => void>();
+
+const setState = (changes: Partial<OutboxState>) => {
+  state = { ...state, ...changes };
+  listeners.forEach((listener) => listener());
+};
+
+const subscribe = (listener: () => void) => {
+  listeners.add(listener);
+  return () => {
+    listeners.delete(listener);
+  };
+};
+
+export const useOutbox = () => useSyncExternalStore(subscribe, () => state);
+
+/** True if a request failed for lack of a connection rather than being answered. */
+export const isConnectionError = (err: unknown) =>
+  !navigator.onLine || (axios.isAxiosError(err) && !err.response && err.code !== 'ERR_CANCELED');
+
+export const describeMutation = (mutation: Mutation) => {
+  switch (mutation.kind) {
+    case 'comment':
+      return `Comment on consult #${mutation.consultId}`;
+    case 'status':
+      return `Status change to ${mutation.status.replace('_', ' ')} on consult #${mutation.consultId}`;
+    default:
+      return 'New consult';
+  }
+};
+
+const requestBackgroundSync = async () => {
+  // Where supported, the service worker wakes an open page once the
+  // connection is back, even if the browser never fires `online`.
+  try {
+    const registration = await navigator.serviceWorker?.getRegistration();
+    const sync = (registration as { sync?: { register: (tag: string) => Promise<void> } } | undefined)?.sync;
+    await sync?.register(SYNC_TAG);
+  } catch {
+    // Background Sync unavailable; the online event and start-up still sync.
+  }
+};
+
+export const queueMutation = async (mutation: Mutation) => {
+  const queued = await offlineStore.getAll<QueuedMutation>('outbox');
+  if (mutation.kind === 'status') {
+    // Successive offline status changes collapse into one, checked against
+    // the version the first of them was based on.
+    const earlier = queued.find(
+      (item) => item.mutation.kind === 'status' && item.mutation.consultId === mutation.consultId
+    );
+    if (earlier?.mutation.kind === 'status') {
+      await offlineStore.delete('outbox', earlier.id!);
+      mutation = { ...mutation, updatedAt: earlier.mutation.updatedAt };
+    }
+  }
+  await offlineStore.add('outbox', {
+    username: localStorage.getItem('username') || '',
+    queuedAt: new Date().toISOString(),
+    mutation,
+  });
+  setState({ pending: (await offlineStore.getAll('outbox')).length });
+  requestBackgroundSync();
+};
+
+const send = async (mutation: Mutation) => {
+  switch (mutation.kind) {
+    case 'comment':
+      return consultsAPI.addComment(mutation.consultId, mutation.message, mutation.idempotencyKey);
+    case 'status':
+      return consultsAPI.updateStatus(mutation.consultId, mutation.status, mutation.updatedAt);
+    default:
+      return consultsAPI.create(mutation.data, mutation.idempotencyKey);
+  }
+};
+
+const rejectionReason = (err: unknown) => {
+  if (axios.isAxiosError(err) && err.response) {
+    const { status, data } = err.response;
+    if (status === 409 && data?.consult) {
+      queryCache.setEntity('consult', data.consult as ConsultRequest);
+      return 'the consult was changed by someone else in the meantime';
+    }
+    return data?.error || data?.detail || `rejected by the server (HTTP ${status})`;
+  }
+  return String(err);
+};
+
+// Returns how many queued changes were settled (sent or refused).
+const flush = async () => {
+  const username = localStorage.getItem('username');
+  if (!username || !localStorage.getItem('access_token')) return 0;
+  const queued = await offlineStore.getAll<QueuedMutation>('outbox');
+  if (!queued.length) return 0;
+
+  setState({ syncing: true });
+  const problems: SyncProblem[] = [];
+  let settled = 0;
+  try {
+    // In order: a comment may refer to a status change queued before it.
+    for (const item of queued) {
+      if (item.username !== username) {
+        // Never send one user's changes with another user's session.
+        problems.push({ mutation: item.mutation, reason: `queued by ${item.username}, who is no longer signed in` });
+      } else {
+        try {
+          await send(item.mutation);
+        } catch (err) {
+          // Still offline (or signed out): keep this and everything after it.
+          if (isConnectionError(err) || (axios.isAxiosError(err) && err.response?.status === 401)) break;
+          problems.push({ mutation: item.mutation, reason: rejectionReason(err) });
+        }
+      }
+      await offlineStore.delete('outbox', item.id!);
+      settled += 1;
+    }
+  } finally {
+    setState({
+      syncing: false,
+      pending: (await offlineStore.getAll('outbox')).length,
+      problems: [...state.problems, ...problems],
+    });
+  }
+  return settled;
+};
+
+let flushing: Promise<void> | null = null;
+
+/** Send queued changes; what's on screen is refetched if anything was sent, or if `refresh`. */
+export const syncOutbox = (refresh = false) => {
+  if (!flushing) {
+    flushing = flush()
+      .then((settled) => {
+        if (settled || refresh) queryCache.invalidate('');
+      })
+      .catch((err) => console.error('Failed to sync offline changes', err))
+      .finally(() => {
+        flushing = null;
+      });
+  }
+  return flushing;
+};
+
+export const dismissSyncProblems = () => setState({ problems: [] });
+
+/** Drop queued changes, e.g. when the user logs out. */
+export const clearOutbox = async () => {
+  await offlineStore.clear('outbox').catch(() => undefined);
+  setState({ pending: 0, problems: [] });
+};
+
+export const startOfflineSync = () => {
+  // Back online: send what was queued and replace data loaded from disk.
+  window.addEventListener('online', () => {
+    syncOutbox(true);
+  });
+  navigator.serviceWorker?.addEventListener('message', (event) => {
+    if (event.data?.type === SYNC_TAG) syncOutbox();
+  });
+  offlineStore.getAll('outbox')
+    .then((items) => setState({ pending: items.length }))
+    .catch(() => undefined);
+  if (navigator.onLine) syncOutbox();
+};
@@ -0,0 +1,126 @@
+import { consultsAPI, departmentsAPI, newIdempotencyKey, patientsAPI } from './api';
+import { isConnectionError, queueMutation } from './outbox';
+import { queryCache, queryKey, usePagedQuery, useQuery } from './queryCache';
+import type { ConsultComment, ConsultRequest, Department, PaginatedResponse, Patient } from '../types';
+
+// Cached reads and optimistic writes on top of the plain API functions.
+// Writes that fail for lack of a connection are queued in the outbox and
+// keep their optimistic effect; they resolve to null.
+
+type ConsultListParams = {
+  role?: 'incoming' | 'outgoing';
+  status?: string;
+  search?: string;
+};
+
+export const useConsults = (params: ConsultListParams) =>
+  useQuery<PaginatedResponse<ConsultRequest>>(
+    queryKey('consults', params),
+    (signal) => consultsAPI.list(params, signal),
+    { entity: 'consult' }
+  );
+
+// Every page of a consult list, fetched as the user scrolls.
+export const useConsultPages = (params: ConsultListParams) =>
+  usePagedQuery<ConsultRequest>(
+    queryKey('consults', params),
+    (page, signal) => consultsAPI.list({ ...params, page }, signal),
+    // Searches are too many and too short-lived to keep offline.
+    { entity: 'consult', persist: !params.search }
+  );
+
+export const useConsult = (id: number | null) => {
+  const query = useQuery<ConsultRequest>(
+    id === null ? null : `consult/${id}`,
+    (signal) => consultsAPI.get(id!, signal),
+    { entity: 'consult', persist: true }
+  );
+  // Opened from a list: show the consult already cached while it revalidates.
+  const cached = id === null ? undefined : queryCache.getEntity<ConsultRequest>('consult', id);
+  const data = query.data ?? (cached?.comments ? cached : undefined);
+  return { ...query, data, loading: query.loading && !data };
+};
+
+// Departments hardly ever change.
+export const useDepartments = () =>
+  useQuery<Department[]>('departments', (signal) => departmentsAPI.list(signal), {
+    staleTime: 10 * 60_000,
+    persist: true,
+  });
+
+export const usePatients = (search?: string) =>
+  useQuery<PaginatedResponse<Patient>>(
+    queryKey('patients', { search }),
+    (signal) => patientsAPI.list(search, signal),
+    { entity: 'patient' }
+  );
+
+export const createConsult = async (data: Parameters<typeof consultsAPI.create>[0]) => {
+  const idempotencyKey = newIdempotencyKey();
+  try {
+    const created = await consultsAPI.create(data, idempotencyKey);
+    queryCache.invalidate('consults');
+    return created;
+  } catch (err) {
+    if (!isConnectionError(err)) throw err;
+    await queueMutation({ kind: 'create', data, idempotencyKey });
+    return null;
+  }
+};
+
+export const updateConsultStatus = async (id: number, status: ConsultRequest['status']) => {
+  const previous = queryCache.updateEntity<ConsultRequest>('consult', id, (consult) => ({ ...consult, status }));
+  try {
+    const consult = await consultsAPI.updateStatus(id, status);
+    queryCache.setEntity('consult', consult);
+    return consult;
+  } catch (err) {
+    if (previous && isConnectionError(err)) {
+      await queueMutation({ kind: 'status', consultId: id, status, updatedAt: previous.updated_at });
+      return null;
+    }
+    if (previous) queryCache.setEntity('consult', previous);
+    throw err;
+  } finally {
+    // Lists filtered by status may gain or lose the consult.
+    queryCache.invalidate('consults');
+  }
+};
+
+export const addConsultComment = async (id: number, message: string) => {
+  const username = localStorage.getItem('username') || '';
+  const pending: ConsultComment = {
+    id: -Date.now(),
+    consult: id,
+    author: 0,
+    author_name: username,
+    author_username: username,
+    message,
+    created_at: new Date().toISOString(),
+  };
+  const withComment = (comment: ConsultComment, replacing?: number) => (consult: ConsultRequest) => ({
+    ...consult,
+    comments: [...(consult.comments ?? []).filter((item) => item.id !== replacing), comment],
+    comment_count: consult.comment_count + (replacing === undefined ? 1 : 0),
+  });
+
+  queryCache.updateEntity<ConsultRequest>('consult', id, withComment(pending));
+  const idempotencyKey = newIdempotencyKey();
+  try {
+    const comment = await consultsAPI.addComment(id, message, idempotencyKey);
+    queryCache.updateEntity<ConsultRequest>('consult', id, withComment(comment, pending.id));
+    return comment;
+  } catch (err) {
+    if (isConnectionError(err)) {
+      // The pending comment stays on screen until the outbox has sent it.
+      await queueMutation({ kind: 'comment', consultId: id, message, idempotencyKey });
+      return null;
+    }
+    queryCache.updateEntity<ConsultRequest>('consult', id, (consult) => ({
+      ...consult,
+      comments: (consult.comments ?? []).filter((item) => item.id !== pending.id),
+      comment_count: consult.comment_count - 1,
+    }));
+    throw err;
+  }
+};
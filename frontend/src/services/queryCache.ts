@@ -0,0 +1,336 @@
+import { useEffect, useMemo, useState, useSyncExternalStore } from 'react';
+import { offlineStore } from './offlineStore';
+
+/**
+ * Client-side query cache shared by every page.
+ *
+ * - Concurrent requests for the same key share one HTTP request.
+ * - Revisited queries render from memory straight away and are revalidated
+ *   in the background once older than their staleTime (stale-while-revalidate).
+ * - A request nobody is waiting for any more (e.g. a superseded search) is
+ *   aborted.
+ * - Records with an `id` are normalized into one table per entity type, so
+ *   an update to a record (including an optimistic one) shows up in every
+ *   list and detail view that contains it.
+ * - Queries marked `persist` are also kept in IndexedDB and rendered from
+ *   there first, so pages open (with the last known data) while offline.
+ */
+
+export type Fetcher<T> = (signal: AbortSignal) => Promise<T>;
+
+export interface QueryOptions {
+  // Milliseconds after which cached data is revalidated when next used.
+  staleTime?: number;
+  // Entity type of the records in the response (a record, an array or a page of them).
+  entity?: string;
+  // Keep the last response in the offline store.
+  persist?: boolean;
+}
+
+export interface QueryState<T> {
+  data: T | undefined;
+  error: unknown;
+  loading: boolean;
+  refreshing: boolean;
+}
+
+type Entity = { id: number };
+
+interface Entry {
+  data?: unknown;
+  error?: unknown;
+  fetchedAt: number;
+  users: number;
+  promise?: Promise<unknown>;
+  controller?: AbortController;
+  fetcher?: Fetcher<unknown>;
+  options: QueryOptions;
+  hydrated?: boolean;
+}
+
+const DEFAULT_STALE_TIME = 30_000;
+
+const isEntity = (value: unknown): value is Entity =>
+  typeof value === 'object' && value !== null && typeof (value as Entity).id === 'number';
+
+// The records making up a response: the response itself, its items, or its page's results.
+const recordsOf = (data: unknown): Entity[] => {
+  if (Array.isArray(data)) return data.filter(isEntity);
+  if (isEntity(data)) return [data];
+  const results = (data as { results?: unknown } | null)?.results;
+  return Array.isArray(results) ? results.filter(isEntity) : [];
+};
+
+export class QueryCache {
+  private entries = new Map<string, Entry>();
+  private entities = new Map<string, Entity>();
+  private listeners = new Set<() => void>();
+  private version = 0;
+
+  subscribe = (listener: () => void) => {
+    this.listeners.add(listener);
+    return () => {
+      this.listeners.delete(listener);
+    };
+  };
+
+  getVersion = () => this.version;
+
+  private notify() {
+    this.version += 1;
+    this.listeners.forEach((listener) => listener());
+  }
+
+  private entry(key: string): Entry {
+    let entry = this.entries.get(key);
+    if (!entry) {
+      entry = { fetchedAt: 0, users: 0, options: {} };
+      this.entries.set(key, entry);
+    }
+    return entry;
+  }
+
+  /** Fetch a query, joining the request already in flight for the same key. */
+  fetch<T>(key: string, fetcher: Fetcher<T>, options: QueryOptions = {}): Promise<T> {
+    const entry = this.entry(key);
+    entry.fetcher = fetcher;
+    entry.options = options;
+    if (entry.promise) return entry.promise as Promise<T>;
+
+    const controller = new AbortController();
+    entry.controller = controller;
+    entry.promise = fetcher(controller.signal)
+      .then((data) => {
+        if (options.entity) this.store(options.entity, recordsOf(data));
+        entry.data = data;
+        entry.error = undefined;
+        entry.fetchedAt = Date.now();
+        if (options.persist) {
+          offlineStore.putQuery(key, { data, fetchedAt: entry.fetchedAt }).catch(() => undefined);
+        }
+        return data;
+      }, (error) => {
+        if (!controller.signal.aborted) entry.error = error;
+        throw error;
+      })
+      .finally(() => {
+        if (entry.controller === controller) {
+          entry.promise = undefined;
+          entry.controller = undefined;
+        }
+        this.notify();
+      });
+    this.notify();
+    return entry.promise as Promise<T>;
+  }
+
+  /** Fetch a query unless fresh data is cached. */
+  load<T>(key: string, fetcher: Fetcher<T>, options: QueryOptions = {}) {
+    const entry = this.entry(key);
+    if (options.persist && entry.data === undefined && !entry.hydrated) {
+      entry.hydrated = true;
+      this.hydrate(key, entry, options);
+    }
+    const staleTime = options.staleTime ?? DEFAULT_STALE_TIME;
+    if (entry.data === undefined || Date.now() - entry.fetchedAt > staleTime) {
+      // Failures are kept on the entry and rendered from there.
+      this.fetch(key, fetcher, options).catch(() => undefined);
+    }
+  }
+
+  // Render the stored response until (unless) the network answers first.
+  private async hydrate(key: string, entry: Entry, options: QueryOptions) {
+    const stored = await offlineStore.getQuery(key).catch(() => undefined);
+    if (!stored || entry.data !== undefined) return;
+    if (options.entity) this.store(options.entity, recordsOf(stored.data), false);
+    entry.data = stored.data;
+    entry.fetchedAt = stored.fetchedAt;
+    this.notify();
+  }
+
+  retain(key: string) {
+    this.entry(key).users += 1;
+  }
+
+  release(key: string) {
+    const entry = this.entry(key);
+    entry.users -= 1;
+    // Deferred, so a component re-mounting straight away (StrictMode, a
+    // re-render with the same key) keeps its request.
+    setTimeout(() => {
+      if (entry.users === 0 && entry.controller) {
+        entry.controller.abort();
+      }
+    }, 0);
+  }
+
+  read<T>(key: string): QueryState<T> {
+    const entry = this.entries.get(key);
+    if (!entry) return { data: undefined, error: undefined, loading: true, refreshing: false };
+    const fetching = entry.promise !== undefined;
+    return {
+      data: this.denormalize(entry) as T | undefined,
+      error: entry.error,
+      loading: entry.data === undefined && (fetching || entry.error === undefined),
+      refreshing: entry.data !== undefined && fetching,
+    };
+  }
+
+  private denormalize(entry: Entry): unknown {
+    const { data, options } = entry;
+    if (!options.entity || data === undefined) return data;
+    const current = <R>(record: R): R =>
+      isEntity(record) ? ((this.entities.get(`${options.entity}:${record.id}`) as R) ?? record) : record;
+    if (Array.isArray(data)) return data.map(current);
+    if (isEntity(data)) return current(data);
+    const page = data as { results?: unknown };
+    return Array.isArray(page.results) ? { ...page, results: page.results.map(current) } : data;
+  }
+
+  private store(type: string, records: Entity[], overwrite = true) {
+    records.forEach((record) => {
+      const key = `${type}:${record.id}`;
+      if (!overwrite && this.entities.has(key)) return;
+      // Merged, so a response with fewer fields doesn't drop the others.
+      this.entities.set(key, { ...this.entities.get(key), ...record });
+    });
+  }
+
+  getEntity<T extends Entity>(type: string, id: number): T | undefined {
+    return this.entities.get(`${type}:${id}`) as T | undefined;
+  }
+
+  /** Replace a record everywhere it is displayed. */
+  setEntity<T extends Entity>(type: string, record: T) {
+    this.entities.set(`${type}:${record.id}`, record);
+    this.notify();
+  }
+
+  /** Apply a change to a cached record; returns the record as it was, for rollback. */
+  updateEntity<T extends Entity>(type: string, id: number, update: (record: T) => T): T | undefined {
+    const previous = this.getEntity<T>(type, id);
+    if (previous) this.setEntity(type, update(previous));
+    return previous;
+  }
+
+  /** Mark matching queries stale; those on screen are refetched now, the rest when next used. */
+  invalidate(prefix: string) {
+    this.entries.forEach((entry, key) => {
+      if (!key.startsWith(prefix)) return;
+      entry.fetchedAt = 0;
+      if (entry.users > 0 && entry.fetcher) {
+        this.fetch(key, entry.fetcher, entry.options).catch(() => undefined);
+      }
+    });
+  }
+
+  /** Drop everything, e.g. when another user logs in on the same terminal. */
+  clear() {
+    this.entries.forEach((entry) => entry.controller?.abort());
+    this.entries.clear();
+    this.entities.clear();
+    offlineStore.clear('queries').catch(() => undefined);
+    this.notify();
+  }
+}
+
+export const queryCache = new QueryCache();
+
+/** Build a cache key from a name and parameters, ignoring unset parameters. */
+export const queryKey = (name: string, params: Record<string, unknown> = {}) => {
+  const defined = Object.entries(params)
+    .filter(([, value]) => value !== undefined && value !== '')
+    .sort(([a], [b]) => a.localeCompare(b));
+  return defined.length ? `${name}?${new URLSearchParams(defined.map(([k, v]) => [k, String(v)]))}` : name;
+};
+
+/**
+ * Subscribe a component to a query; a null key means "nothing to fetch yet".
+ * The fetcher is taken from the first render for each key.
+ */
+export function useQuery<T>(key: string | null, fetcher: Fetcher<T>, options: QueryOptions = {}) {
+  const version = useSyncExternalStore(queryCache.subscribe, queryCache.getVersion);
+
+  useEffect(() => {
+    if (key === null) return;
+    queryCache.retain(key);
+    queryCache.load(key, fetcher, options);
+    return () => queryCache.release(key);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [key]);
+
+  const state = useMemo(
+    () => (key === null
+      ? { data: undefined, error: undefined, loading: false, refreshing: false }
+      : queryCache.read<T>(key)),
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+    [key, version]
+  );
+  return {
+    ...state,
+    refetch: () => (key === null ? Promise.resolve(undefined) : queryCache.fetch(key, fetcher, options)),
+  };
+}
+
+interface Page<T> {
+  next: string | null;
+  count: number;
+  results: T[];
+}
+
+/**
+ * Subscribe a component to a paginated list, one cached query per page.
+ * Pages are added with loadMore() and start again from the first page
+ * whenever the key changes.
+ */
+export function usePagedQuery<T extends { id: number }>(
+  key: string | null,
+  fetchPage: (page: number, signal: AbortSignal) => Promise<Page<T>>,
+  options: QueryOptions = {}
+) {
+  const version = useSyncExternalStore(queryCache.subscribe, queryCache.getVersion);
+  const [pages, setPages] = useState({ key, count: 1 });
+  const pageCount = pages.key === key ? pages.count : 1;
+  const pageKeys = useMemo(
+    () => (key === null
+      ? []
+      : Array.from({ length: pageCount }, (_, index) =>
+          index === 0 ? key : `${key}${key.includes('?') ? '&' : '?'}page=${index + 1}`)),
+    [key, pageCount]
+  );
+
+  useEffect(() => {
+    pageKeys.forEach((pageKey, index) => {
+      queryCache.retain(pageKey);
+      queryCache.load(pageKey, (signal) => fetchPage(index + 1, signal), options);
+    });
+    return () => pageKeys.forEach((pageKey) => queryCache.release(pageKey));
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [pageKeys]);
+
+  return useMemo(() => {
+    const states = pageKeys.map((pageKey) => queryCache.read<Page<T>>(pageKey));
+    const loaded = states.filter((state) => state.data !== undefined);
+    // Rows can shift between pages while they load; show each record once.
+    const seen = new Set<number>();
+    const items = loaded.flatMap((state) => state.data!.results).filter((item) => {
+      if (seen.has(item.id)) return false;
+      seen.add(item.id);
+      return true;
+    });
+    const last = states[states.length - 1];
+    const hasMore = last?.data !== undefined && last.data.next !== null;
+    return {
+      items,
+      total: loaded[0]?.data?.count ?? 0,
+      loading: states[0]?.loading ?? false,
+      loadingMore: states.length > 1 && last.loading,
+      error: states.find((state) => state.error)?.error,
+      hasMore,
+      loadMore: () => {
+        if (hasMore) setPages({ key, count: pageCount + 1 });
+      },
+    };
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [pageKeys, version]);
+}
@@ -52,6 +52,7 @@ export interface ConsultRequest {
   consult_question: string;
   created_at: string;
   updated_at: string;
+  escalated_at: string | null;
   comments: ConsultComment[];
   comment_count: number;
 }
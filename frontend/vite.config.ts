@@ -1,7 +1,90 @@
-import { defineConfig } from 'vite'
+import { gzipSync } from 'node:zlib'
+import { defineConfig, type Logger, type Plugin } from 'vite'
 import react from '@vitejs/plugin-react'
 
+// Gzipped size budgets in kB: `initial` covers everything the login page
+// downloads (the entry chunk and every chunk it imports statically), `chunk`
+// any single chunk. Set BUNDLE_BUDGET_STRICT=1 to fail the build when over.
+const budgets = {
+  initial: Number(process.env.BUNDLE_BUDGET_INITIAL_KB ?? 120),
+  chunk: Number(process.env.BUNDLE_BUDGET_CHUNK_KB ?? 80),
+}
+
+// Prints the size of every chunk after `vite build`, checks the budgets and
+// writes the numbers to dist/bundle-report.json.
+function bundleBudget(): Plugin {
+  let logger: Logger
+  return {
+    name: 'bundle-budget',
+    apply: 'build',
+    configResolved(config) {
+      logger = config.logger
+    },
+    generateBundle(_options, bundle) {
+      const chunks = Object.values(bundle).flatMap((item) => (item.type === 'chunk' ? [item] : []))
+      const sizes = new Map(chunks.map((chunk) => [chunk.fileName, gzipSync(chunk.code).length / 1024]))
+
+      const initial = new Set<string>()
+      const visit = (fileName: string) => {
+        const chunk = bundle[fileName]
+        if (initial.has(fileName) || chunk?.type !== 'chunk') return
+        initial.add(fileName)
+        chunk.imports.forEach(visit)
+      }
+      chunks.filter((chunk) => chunk.isEntry).forEach((chunk) => visit(chunk.fileName))
+      const initialSize = [...initial].reduce((total, fileName) => total + (sizes.get(fileName) ?? 0), 0)
+
+      const problems: string[] = []
+      logger.info('\nBundle sizes (gzip):')
+      for (const [fileName, size] of [...sizes].sort((a, b) => b[1] - a[1])) {
+        const over = size > budgets.chunk
+        if (over) problems.push(`${fileName} is ${size.toFixed(1)} kB (budget ${budgets.chunk} kB)`)
+        logger.info(
+          `  ${fileName.padEnd(44)}${size.toFixed(1).padStart(8)} kB${initial.has(fileName) ? '  initial' : ''}${over ? '  OVER BUDGET' : ''}`
+        )
+      }
+      logger.info(`  ${'initial load'.padEnd(44)}${initialSize.toFixed(1).padStart(8)} kB  (budget ${budgets.initial} kB)\n`)
+      if (initialSize > budgets.initial) {
+        problems.push(`initial load is ${initialSize.toFixed(1)} kB (budget ${budgets.initial} kB)`)
+      }
+
+      this.emitFile({
+        type: 'asset',
+        fileName: 'bundle-report.json',
+        source: JSON.stringify({
+          budgets,
+          initialKb: Number(initialSize.toFixed(1)),
+          chunks: Object.fromEntries([...sizes].map(([fileName, size]) => [fileName, {
+            gzipKb: Number(size.toFixed(1)),
+            initial: initial.has(fileName),
+          }])),
+        }, null, 2),
+      })
+
+      if (problems.length) {
+        const message = `Bundle budget exceeded: ${problems.join('; ')}`
+        if (process.env.BUNDLE_BUDGET_STRICT) this.error(message)
+        this.warn(message)
+      }
+    },
+  }
+}
+
 // https://vite.dev/config/
 export default defineConfig({
-  plugins: [react()],
+  plugins: [react(), bundleBudget()],
+  build: {
+    rollupOptions: {
+      output: {
+        // Libraries change far less often than the app, so keep them in
+        // their own long-cached chunks.
+        manualChunks(id) {
+          if (!id.includes('node_modules')) return
+          if (/node_modules\/(react|react-dom|scheduler)\//.test(id)) return 'react'
+          if (id.includes('node_modules/react-router')) return 'router'
+          return 'vendor'
+        },
+      },
+    },
+  },
 })